@@ -0,0 +1,173 @@
+import asyncio
+import json
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, Optional
+
+
+class Overloaded(Exception):
+    """Work refused to protect the server; status_code is 429 (client over its share) or 503"""
+
+    def __init__(self, message: str, reason: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, round(self.retry_after)))}
+
+
+class ConcurrencyLimit:
+    """Global and per-client caps on concurrent work of one kind (0 = no cap)"""
+
+    def __init__(self, name: str, limit: int = 0, per_client: int = 0, retry_after: float = 1.0):
+        self.name = name
+        self.limit = limit
+        self.per_client = per_client
+        self.retry_after = retry_after
+        self.active = 0
+        self._by_client: Dict[str, int] = defaultdict(int)
+        self.admitted = 0
+        self.shed: Dict[str, int] = defaultdict(int)
+
+    def acquire(self, client: str):
+        """Take a slot for client or raise Overloaded (503 when the server is full, 429 for the client's cap)"""
+        if self.limit and self.active >= self.limit:
+            self.shed["global"] += 1
+            raise Overloaded(f"Too many concurrent {self.name}", "global", 503, self.retry_after)
+        if self.per_client and self._by_client[client] >= self.per_client:
+            self.shed["per_client"] += 1
+            raise Overloaded(f"Too many concurrent {self.name} from this client", "per_client", 429,
+                             self.retry_after)
+        self.active += 1
+        self._by_client[client] += 1
+        self.admitted += 1
+
+    def release(self, client: str):
+        self.active -= 1
+        self._by_client[client] -= 1
+        if self._by_client[client] <= 0:
+            del self._by_client[client]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "per_client": self.per_client,
+            "clients": len(self._by_client),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
+
+
+class AnalysisGate:
+    """Bounded queue in front of the analysis executor.
+
+    At most `capacity` analyses run at once and at most `max_waiting` wait
+    for a slot, each for no longer than its deadline. Work beyond that is
+    refused immediately, so a burst costs a fast rejection instead of
+    memory for frames that would be stale by the time they are analyzed.
+    Slots are handed to waiters in arrival order.
+    """
+
+    def __init__(self, capacity: int, max_waiting: int, retry_after: float = 1.0):
+        self.capacity = max(1, capacity)
+        self.max_waiting = max(0, max_waiting)
+        self.retry_after = retry_after
+        self.running = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.shed: Dict[str, int] = defaultdict(int)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: Optional[float] = None):
+        """Wait up to timeout seconds for a slot; raises Overloaded when the queue is full or time runs out"""
+        if self.running < self.capacity and not self._waiters:
+            self.running += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self.shed["queue_full"] += 1
+            raise Overloaded("Analysis queue is full", "queue_full", 503, self.retry_after)
+        if timeout is not None and timeout <= 0:
+            self.shed["deadline"] += 1
+            raise Overloaded("Deadline passed before analysis could start", "deadline", 503, self.retry_after)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self.shed["deadline"] += 1
+            raise Overloaded("Deadline passed before analysis could start", "deadline", 503, self.retry_after)
+        except asyncio.CancelledError:
+            # A slot handed over just before the caller went away goes to the next waiter
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self.admitted += 1
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes straight to the waiter, running stays the same
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "capacity": self.capacity,
+            "max_waiting": self.max_waiting,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
+
+
+class UploadAdmissionMiddleware:
+    """ASGI middleware holding a ConcurrencyLimit slot for each request to the given paths.
+
+    Over-limit requests are answered before their body is read. The slot is
+    held until the response (including a streamed one) is complete.
+    `on_shed` is called with the path and reason of every rejection.
+    """
+
+    def __init__(self, app, limit: ConcurrencyLimit, paths: Iterable[str],
+                 on_shed: Optional[Callable[[str, str], None]] = None):
+        self.app = app
+        self.limit = limit
+        self.paths = set(paths)
+        self.on_shed = on_shed
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        try:
+            self.limit.acquire(client)
+        except Overloaded as e:
+            if self.on_shed is not None:
+                self.on_shed(scope["path"], e.reason)
+            body = json.dumps({"detail": str(e)}).encode()
+            headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            headers += [(name.lower().encode(), value.encode()) for name, value in e.headers.items()]
+            await send({"type": "http.response.start", "status": e.status_code, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limit.release(client)
@@ -0,0 +1,102 @@
+"""Micro-benchmark: legacy PIL decode path vs. the DecodedImage decode stage.
+
+Run from the backend directory:
+
+    python -m benchmarks.decode_benchmark [--repeat 20] [--max-dim 960]
+"""
+import argparse
+import io
+import json
+import time
+from typing import Callable, Dict, List
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from decoding import DecodedImage
+
+SIZES = [(640, 480), (1920, 1080), (4032, 3024)]
+
+
+def make_jpeg(width: int, height: int, quality: int = 90) -> bytes:
+    """Smooth gradient with noise so the JPEG has realistic entropy"""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (x + y) / 2
+    image = np.stack([base, base * 0.8, 255 - base], axis=-1)
+    image += rng.normal(0, 12, image.shape)
+    ok, encoded = cv2.imencode(".jpg", np.clip(image, 0, 255).astype(np.uint8),
+                               [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+def legacy_decode(data: bytes):
+    """The original endpoint path: PIL -> ndarray -> BGR -> gray"""
+    image = Image.open(io.BytesIO(data))
+    frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame, gray
+
+
+def color_first(data: bytes):
+    """DecodedImage without reduced decoding: one imdecode to BGR, gray derived from it"""
+    image = DecodedImage(data, 0)
+    return image.gray, image.color()
+
+
+def decoded_image_no_faces(data: bytes, max_dim: int):
+    return DecodedImage(data, max_dim).gray
+
+
+def decoded_image_with_faces(data: bytes, max_dim: int):
+    image = DecodedImage(data, max_dim)
+    return image.gray, image.color()
+
+
+def time_call(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    fn()  # warm up
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "min_ms": round(samples[0], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-dim", type=int, default=960)
+    args = parser.parse_args()
+
+    report = []
+    for width, height in SIZES:
+        data = make_jpeg(width, height)
+        legacy = time_call(lambda: legacy_decode(data), args.repeat)
+        color = time_call(lambda: color_first(data), args.repeat)
+        gray_only = time_call(lambda: decoded_image_no_faces(data, args.max_dim), args.repeat)
+        with_faces = time_call(lambda: decoded_image_with_faces(data, args.max_dim), args.repeat)
+        report.append({
+            "size": f"{width}x{height}",
+            "bytes": len(data),
+            "legacy": legacy,
+            "color_first": color,
+            "decoded_no_faces": gray_only,
+            "decoded_with_faces": with_faces,
+            "speedup_color_first": round(legacy["mean_ms"] / color["mean_ms"], 2),
+            "speedup_no_faces": round(legacy["mean_ms"] / gray_only["mean_ms"], 2),
+            "speedup_with_faces": round(legacy["mean_ms"] / with_faces["mean_ms"], 2),
+        })
+
+    print(json.dumps({"max_dim": args.max_dim, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Micro-benchmark: pickled frames vs. the shared-memory frame ring for process workers.
+
+Measures the round trip of a job that only reads the frame (its mean), so
+the difference is the cost of getting the frame to the worker.
+
+Run from the backend directory:
+
+    python -m benchmarks.handoff_benchmark [--repeat 50] [--workers 2]
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from executor import AnalysisExecutor
+from framering import FrameRef, SharedFrameRing, attach_frame
+
+SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def frame_mean(frame: np.ndarray) -> float:
+    return float(frame.mean())
+
+
+def shared_frame_mean(ref: FrameRef) -> float:
+    return float(attach_frame(ref).mean())
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    values = np.asarray(samples)
+    return {"mean_ms": round(float(values.mean()), 3), "p95_ms": round(float(np.percentile(values, 95)), 3)}
+
+
+async def run(args) -> List[Dict]:
+    executor = AnalysisExecutor("process", max_workers=args.workers)
+    ring = SharedFrameRing(2 * args.workers, 8 * 1024 * 1024)
+    executor.start()
+    ring.start()
+    report = []
+    try:
+        # Spin up the workers before timing anything
+        await asyncio.gather(*(executor.run(frame_mean, np.zeros(1)) for _ in range(args.workers)))
+        for width, height in SIZES:
+            frame = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+            pickled, shared = [], []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                await executor.run(frame_mean, frame)
+                pickled.append((time.perf_counter() - started) * 1000)
+
+                started = time.perf_counter()
+                slot, ref = await ring.put(frame)
+                try:
+                    await executor.run(shared_frame_mean, ref)
+                finally:
+                    ring.release(slot)
+                shared.append((time.perf_counter() - started) * 1000)
+            report.append({
+                "size": f"{width}x{height}",
+                "bytes": frame.nbytes,
+                "pickled": summarize(pickled),
+                "shared_ring": summarize(shared),
+                "speedup": round(np.mean(pickled) / np.mean(shared), 2),
+            })
+    finally:
+        executor.shutdown()
+        ring.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    print(json.dumps({"workers": args.workers, "results": asyncio.run(run(args))}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+"""Offline load test for the scan pipeline.
+
+Starts the API in-process on a local port with the in-memory store (no
+MongoDB or network access needed), then drives concurrent /api/ws/scan
+sessions and /api/analyze/image uploads from a fixture corpus. Reports
+throughput, per-stage latency percentiles (client round trips plus the
+server's own stage breakdown), CPU time and RSS as JSON.
+
+Run from the backend directory:
+
+    python -m benchmarks.loadtest --sessions 8 --uploads 4 --duration 20 \\
+        --output results.json [--baseline previous.json] [--corpus DIR]
+
+Without --corpus a synthetic corpus is generated; point --corpus at a
+directory of real face photos (JPEG/PNG) to exercise detection end to end.
+
+To measure a multi-worker deployment, start it separately (e.g.
+API_WORKERS=4 STORAGE_BACKEND=sqlite python server.py) and pass
+--url http://127.0.0.1:8001; the server's settings are then read from
+/api/health and resource usage isn't reported.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+CORPUS_SIZES = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def draw_face(image: np.ndarray, skin: int):
+    """Schematic frontal face (eyes, brows, nose bridge, mouth) that the Haar cascade detects"""
+    import cv2
+
+    height, width = image.shape[:2]
+    cx, cy, fw, fh = width // 2, height // 2, width // 8, height // 5
+    eye_x, eye_y, eye_r = fw * 2 // 5, cy - fh // 5, max(2, fw // 6)
+    dark, light = (max(0, skin - 120),) * 3, (min(255, skin + 30),) * 3
+    cv2.ellipse(image, (cx, cy), (fw, fh), 0, 0, 360, (skin,) * 3, -1)
+    for side in (-1, 1):
+        cv2.ellipse(image, (cx + side * eye_x, eye_y), (eye_r * 2, eye_r), 0, 0, 360, dark, -1)
+        cv2.line(image, (cx + side * eye_x - eye_r * 2, eye_y - eye_r * 3),
+                 (cx + side * eye_x + eye_r * 2, eye_y - eye_r * 3), dark, max(2, eye_r // 2))
+    cv2.line(image, (cx, eye_y), (cx, cy + fh // 5), light, max(2, eye_r))
+    cv2.ellipse(image, (cx, cy + fh // 2), (fw // 3, eye_r), 0, 0, 180, dark, -1)
+
+
+def make_corpus(corpus_dir: Optional[str]) -> List[bytes]:
+    """Encoded images from corpus_dir, or a small synthetic corpus of schematic faces"""
+    if corpus_dir:
+        paths = sorted(p for p in Path(corpus_dir).iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png", ".webp"))
+        if not paths:
+            raise SystemExit(f"No images found in {corpus_dir}")
+        return [p.read_bytes() for p in paths]
+
+    import cv2
+
+    rng = np.random.default_rng(0)
+    corpus = []
+    for width, height in CORPUS_SIZES:
+        # Dark, mid and bright faces fall in different emotion bands
+        for skin, background in ((110, 30), (180, 90), (240, 120)):
+            image = np.full((height, width, 3), background, dtype=np.float32)
+            draw_face(image, skin)
+            image = cv2.GaussianBlur(image, (0, 0), max(1.0, width / 200))
+            image += rng.normal(0, 8, image.shape)
+            ok, encoded = cv2.imencode(".jpg", np.clip(image, 0, 255).astype(np.uint8),
+                                       [cv2.IMWRITE_JPEG_QUALITY, 80])
+            corpus.append(encoded.tobytes())
+    return corpus
+
+
+def remote_config(base_url: str, probes: int = 20) -> Dict[str, Any]:
+    """Settings of an already running server, and how many API workers answered the probes"""
+    import requests
+
+    health = [requests.get(base_url + "/api/health", timeout=10).json() for _ in range(probes)]
+    return {
+        "executor": health[0]["analysis"]["mode"],
+        "workers": health[0]["analysis"]["workers"],
+        "storage": health[0]["storage"]["backend"],
+        "api_workers_seen": len({h["worker"] for h in health}),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerThread:
+    """Runs the app under uvicorn on a background thread with its own event loop"""
+
+    def __init__(self, app, port: int):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def wait_ready(base_url: str, timeout: float = 120.0) -> Dict[str, Any]:
+    """Poll /api/ready until the analyzer is warm; returns its readiness report plus time_to_ready_s"""
+    import requests
+
+    started = time.perf_counter()
+    while True:
+        response = requests.get(base_url + "/api/ready", timeout=10)
+        if response.status_code == 200:
+            return dict(response.json(), time_to_ready_s=round(time.perf_counter() - started, 3))
+        if response.json().get("error"):
+            raise SystemExit(f"Analyzer failed to start: {response.json()['error']}")
+        if time.perf_counter() - started > timeout:
+            raise SystemExit("Timed out waiting for /api/ready")
+        time.sleep(0.05)
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    def record(self, stage: str, ms: float):
+        self.samples[stage].append(ms)
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] += n
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        summary = {}
+        for stage, samples in sorted(self.samples.items()):
+            values = np.asarray(samples)
+            summary[stage] = {
+                "count": int(values.size),
+                "mean_ms": round(float(values.mean()), 3),
+                "p50_ms": round(float(np.percentile(values, 50)), 3),
+                "p95_ms": round(float(np.percentile(values, 95)), 3),
+                "p99_ms": round(float(np.percentile(values, 99)), 3),
+                "max_ms": round(float(values.max()), 3),
+            }
+        return summary
+
+
+def record_server_stages(recorder: LatencyRecorder, prefix: str, message: Dict[str, Any]):
+    detection = message.get("detection") or {}
+    if "time_ms" in detection:
+        recorder.record(f"{prefix}.server_detection", detection["time_ms"])
+    for stage, ms in (message.get("timings") or {}).items():
+        recorder.record(f"{prefix}.server.{stage}", ms)
+
+
+async def scan_session(url: str, corpus: List[bytes], deadline: float, recorder: LatencyRecorder, index: int):
+    """One closed-loop scan client: waits for the server's ready credit before each frame"""
+    import websockets
+
+    from protocol import pack_binary_frame
+
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({"type": "hello", "credits": True, "timings": True}))
+        sequence = 0
+        while time.perf_counter() < deadline:
+            message = json.loads(await ws.recv())
+            if message["type"] != "ready":
+                continue
+            sequence += 1
+            frame = corpus[(index + sequence) % len(corpus)]
+            sent = time.perf_counter()
+            await ws.send(pack_binary_frame(frame, sequence, int(time.time() * 1000)))
+            while True:
+                message = json.loads(await ws.recv())
+                if message["type"] in ("analysis_result", "frame_unchanged", "frame_shed", "error"):
+                    break
+            recorder.record("scan.round_trip", (time.perf_counter() - sent) * 1000)
+            if message["type"] == "frame_shed":
+                recorder.count("scan.shed")
+                continue
+            if message["type"] == "frame_unchanged":
+                recorder.count("scan.unchanged")
+                continue
+            if message["type"] == "error":
+                recorder.count("scan.errors")
+                continue
+            recorder.count("scan.frames")
+            recorder.count("scan.faces", message.get("faces_detected", 0))
+            record_server_stages(recorder, "scan", message)
+
+
+async def upload_worker(url: str, corpus: List[bytes], deadline: float, recorder: LatencyRecorder, index: int):
+    import requests
+
+    session = requests.Session()
+    n = 0
+    while time.perf_counter() < deadline:
+        n += 1
+        image = corpus[(index + n) % len(corpus)]
+        sent = time.perf_counter()
+        response = await asyncio.to_thread(
+            session.post, url, params={"timings": "true"},
+            files={"file": ("fixture.jpg", image, "image/jpeg")}, timeout=60
+        )
+        recorder.record("upload.round_trip", (time.perf_counter() - sent) * 1000)
+        if response.status_code in (429, 503):
+            recorder.count("upload.shed")
+            continue
+        if response.status_code != 200:
+            recorder.count("upload.errors")
+            continue
+        body = response.json()
+        recorder.count("upload.requests")
+        recorder.count("upload.faces", body.get("faces_detected", 0))
+        record_server_stages(recorder, "upload", body)
+    session.close()
+
+
+def process_usage() -> Dict[str, float]:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    rss_mb = usage.ru_maxrss / 1024 if sys.platform != "darwin" else usage.ru_maxrss / (1024 * 1024)
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    rss_mb = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return {"cpu_s": usage.ru_utime + usage.ru_stime, "rss_mb": rss_mb, "max_rss_mb": usage.ru_maxrss / 1024}
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """Relative change of throughput and latency percentiles against a previous run"""
+    def ratio(new, old):
+        return round(new / old, 3) if old else None
+
+    delta: Dict[str, Any] = {"throughput": {}, "latency": {}}
+    for key, value in current["throughput"].items():
+        if key in baseline.get("throughput", {}):
+            delta["throughput"][key] = ratio(value, baseline["throughput"][key])
+    for stage, stats in current["latency"].items():
+        old = baseline.get("latency", {}).get(stage)
+        if old:
+            delta["latency"][stage] = {p: ratio(stats[p], old[p]) for p in ("p50_ms", "p95_ms", "p99_ms")}
+    return delta
+
+
+async def drive(base_url: str, corpus: List[bytes], args, recorder: LatencyRecorder) -> float:
+    ws_url = base_url.replace("http://", "ws://") + "/api/ws/scan"
+    upload_url = base_url + "/api/analyze/image"
+    started = time.perf_counter()
+    deadline = started + args.duration
+    tasks = [scan_session(ws_url, corpus, deadline, recorder, i) for i in range(args.sessions)]
+    tasks += [upload_worker(upload_url, corpus, deadline, recorder, i) for i in range(args.uploads)]
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the scan pipeline")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent /api/ws/scan sessions")
+    parser.add_argument("--uploads", type=int, default=2, help="concurrent /api/analyze/image clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to drive load")
+    parser.add_argument("--corpus", help="directory of fixture images (default: synthetic)")
+    parser.add_argument("--executor", choices=("inline", "thread", "process"), help="sets ANALYSIS_EXECUTOR")
+    parser.add_argument("--workers", type=int, help="sets ANALYSIS_WORKERS")
+    parser.add_argument("--storage", choices=("memory", "sqlite"), default="memory",
+                        help="sets STORAGE_BACKEND (sqlite writes to a temporary file)")
+    parser.add_argument("--url", help="drive an already running server instead of starting one in-process")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    args = parser.parse_args()
+
+    if args.executor:
+        os.environ["ANALYSIS_EXECUTOR"] = args.executor
+    if args.workers:
+        os.environ["ANALYSIS_WORKERS"] = str(args.workers)
+    os.environ["STORAGE_BACKEND"] = args.storage
+    # Every simulated client connects from 127.0.0.1
+    os.environ.setdefault("MAX_SCAN_CONNECTIONS_PER_CLIENT", "0")
+    os.environ.setdefault("MAX_UPLOADS_PER_CLIENT", "0")
+    # The corpus is small and reused, so cached analyses would hide decode and detection costs
+    os.environ.setdefault("RESULT_CACHE_SIZE", "0")
+    if args.storage == "sqlite":
+        os.environ.setdefault("SQLITE_PATH", os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "readings.db"))
+
+    corpus = make_corpus(args.corpus)
+    recorder = LatencyRecorder()
+
+    if args.url:
+        base_url = args.url.rstrip("/")
+        startup = wait_ready(base_url)
+        server_config = remote_config(base_url)
+        elapsed = asyncio.run(drive(base_url, corpus, args, recorder))
+        readings_written = None
+    else:
+        import server
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        with ServerThread(server.app, port):
+            startup = wait_ready(base_url)
+            usage_before = process_usage()
+            elapsed = asyncio.run(drive(base_url, corpus, args, recorder))
+            usage_after = process_usage()
+        server_config = {
+            "executor": server.executor.mode,
+            "workers": server.executor.max_workers,
+            "storage": server.store.name,
+        }
+        readings_written = server.readings_buffer.written
+
+    report = {
+        "config": dict({
+            "sessions": args.sessions,
+            "uploads": args.uploads,
+            "duration_s": round(elapsed, 3),
+            "corpus_images": len(corpus),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+        }, **server_config),
+        "throughput": {
+            "scan_frames_per_s": round(recorder.counts["scan.frames"] / elapsed, 2),
+            "uploads_per_s": round(recorder.counts["upload.requests"] / elapsed, 2),
+        },
+        "startup": {
+            "time_to_ready_s": startup["time_to_ready_s"],
+            "warm_up_ms": startup["warm_up_ms"],
+            "worker_warm_up_ms": startup["worker_warm_up_ms"],
+        },
+        "counts": dict(recorder.counts, readings_written=readings_written),
+        "latency": recorder.summary(),
+    }
+    if not args.url:
+        cpu_s = usage_after["cpu_s"] - usage_before["cpu_s"]
+        report["resources"] = {
+            "cpu_s": round(cpu_s, 3),
+            "cpu_utilization": round(cpu_s / elapsed, 3),
+            "rss_mb": round(usage_after["rss_mb"], 1),
+            "max_rss_mb": round(usage_after["max_rss_mb"], 1),
+        }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if not recorder.counts["scan.faces"] and not recorder.counts["upload.faces"]:
+        # Emotion analysis, metrics, persistence and fan-out were never exercised
+        raise SystemExit("No faces were detected in any frame; check the corpus (--corpus) and the face cascade")
+
+
+if __name__ == "__main__":
+    main()
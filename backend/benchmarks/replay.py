@@ -0,0 +1,239 @@
+"""Replay recorded scan sessions through the scan pipeline.
+
+Recordings are written by the server when SCAN_RECORDING_DIR is set (see
+recording.py). The API is started in-process with the in-memory store, the
+settings stored in the first recording and a seeded metrics RNG, and each
+recording is sent to /api/ws/scan in turn:
+
+    --speed original   frames are sent at their recorded arrival times, so the
+                       scheduler drops frames the way it did live
+    --speed max        each frame is sent as soon as the previous one has been
+                       answered (ready credits): every frame is analyzed and
+                       results are reproducible for a given seed
+
+Run from the backend directory:
+
+    python -m benchmarks.replay recordings/*.scanrec --speed max --seed 0 \\
+        --output replay.json [--baseline previous.json]
+
+Reports throughput, latency percentiles (client round trips plus the
+server's stage breakdown) and the per-frame results. With --baseline,
+latency and throughput are compared and results are diffed frame by frame
+(ids and timestamps are left out); the exit status is 1 if any differ.
+Environment variables override the recorded settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.loadtest import LatencyRecorder, ServerThread, compare, free_port, record_server_stages, wait_ready
+
+# Messages answering a frame, by sequence number
+REPLY_TYPES = ("analysis_result", "frame_unchanged", "frame_shed", "error")
+# Result fields that only depend on the frames and the seed
+RESULT_FIELDS = ("emotion", "confidence", "stress_level", "anxiety_score", "depression_score",
+                 "glucose_simulation", "face_coordinates")
+
+
+def apply_settings(settings: Dict[str, Any]):
+    for name, value in settings.items():
+        os.environ.setdefault(name, str(value).lower() if isinstance(value, bool) else str(value))
+
+
+def summarize(frame: int, message: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if message is None:
+        return {"frame": frame, "type": "dropped"}
+    summary: Dict[str, Any] = {"frame": frame, "type": message["type"]}
+    if message["type"] == "analysis_result":
+        summary["results"] = [{field: result[field] for field in RESULT_FIELDS} for result in message["results"]]
+        if "reused" in message:
+            summary["reused"] = message["reused"]
+    return summary
+
+
+async def replay_session(url: str, recording, speed: str, recorder: LatencyRecorder,
+                         timeout: float = 60.0) -> Dict[str, Any]:
+    """Send one recording's frames over a scan socket; returns its per-frame results and timing"""
+    import websockets
+
+    from protocol import pack_binary_frame
+
+    total = len(recording)
+    replies: Dict[int, Dict[str, Any]] = {}
+    sent_at: Dict[int, float] = {}
+    credit = asyncio.Event()
+    finished = asyncio.Event()
+
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({"type": "hello", "credits": speed == "max", "timings": True}))
+
+        async def receive():
+            async for raw in ws:
+                message = json.loads(raw)
+                if message["type"] == "ready":
+                    credit.set()
+                    continue
+                sequence = message.get("sequence")
+                if message["type"] not in REPLY_TYPES or sequence not in sent_at:
+                    continue
+                replies[sequence] = message
+                recorder.record("replay.round_trip", (time.perf_counter() - sent_at[sequence]) * 1000)
+                record_server_stages(recorder, "replay", message)
+                if sequence == total:
+                    finished.set()
+                    return
+
+        receiver = asyncio.create_task(receive())
+        started = time.perf_counter()
+        first_arrival = recording[0].received_at if total else 0.0
+        for sequence, frame in enumerate(recording, 1):
+            if speed == "max":
+                await asyncio.wait_for(credit.wait(), timeout)
+                credit.clear()
+            else:
+                await asyncio.sleep(max(0.0, started + frame.received_at - first_arrival - time.perf_counter()))
+            sent_at[sequence] = time.perf_counter()
+            if isinstance(frame.payload, str):
+                await ws.send(json.dumps({"frame": frame.payload, "sequence": sequence,
+                                          "timestamp": int(time.time() * 1000)}))
+            else:
+                await ws.send(pack_binary_frame(bytes(frame.payload), sequence, int(time.time() * 1000)))
+        if total:
+            await asyncio.wait_for(finished.wait(), timeout)
+        elapsed = time.perf_counter() - started
+        receiver.cancel()
+
+    frames = [summarize(sequence, replies.get(sequence)) for sequence in range(1, total + 1)]
+    last = replies.get(total, {}).get("frames", {})
+    return {
+        "frames": frames,
+        "recorded_s": round(recording.duration, 3),
+        "replay_s": round(elapsed, 3),
+        "dropped": last.get("dropped", 0),
+    }
+
+
+def values_match(a: Any, b: Any, tolerance: float) -> bool:
+    if isinstance(a, float) or isinstance(b, float):
+        return isinstance(a, (int, float)) and isinstance(b, (int, float)) and abs(a - b) <= tolerance
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(values_match(a[k], b[k], tolerance) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(values_match(x, y, tolerance) for x, y in zip(a, b))
+    return a == b
+
+
+def diff_results(current: Dict[str, List[Dict[str, Any]]], baseline: Dict[str, List[Dict[str, Any]]],
+                 tolerance: float = 1e-6, limit: int = 20) -> Dict[str, Any]:
+    """Frame-by-frame differences between two replays of the same recordings"""
+    compared = mismatched = 0
+    missing = []
+    examples = []
+    for name, frames in current.items():
+        old_frames = baseline.get(name)
+        if old_frames is None:
+            missing.append(name)
+            continue
+        if len(frames) != len(old_frames):
+            mismatched += abs(len(frames) - len(old_frames))
+        for new, old in zip(frames, old_frames):
+            compared += 1
+            if not values_match(new, old, tolerance):
+                mismatched += 1
+                if len(examples) < limit:
+                    examples.append({"recording": name, "frame": new["frame"], "baseline": old, "current": new})
+    return {"compared": compared, "mismatched": mismatched, "not_in_baseline": missing, "examples": examples}
+
+
+async def replay_all(base_url: str, recordings, speed: str, recorder: LatencyRecorder) -> Dict[str, Dict[str, Any]]:
+    ws_url = base_url.replace("http://", "ws://") + "/api/ws/scan"
+    # One at a time, so the seeded RNG is drawn in the same order on every run
+    return {os.path.basename(r.path): await replay_session(ws_url, r, speed, recorder) for r in recordings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded scan sessions through the scan pipeline")
+    parser.add_argument("recordings", nargs="+", help=".scanrec files written with SCAN_RECORDING_DIR")
+    parser.add_argument("--speed", choices=("original", "max"), default="max",
+                        help="recorded arrival times, or each frame as soon as the last is answered")
+    parser.add_argument("--seed", type=int, default=0, help="sets ANALYSIS_SEED")
+    parser.add_argument("--executor", choices=("inline", "thread", "process"), help="sets ANALYSIS_EXECUTOR")
+    parser.add_argument("--workers", type=int, help="sets ANALYSIS_WORKERS")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="previous JSON report to compare against")
+    args = parser.parse_args()
+
+    from recording import Recording
+
+    recordings = [Recording(path) for path in args.recordings]
+    if args.executor:
+        os.environ["ANALYSIS_EXECUTOR"] = args.executor
+    if args.workers:
+        os.environ["ANALYSIS_WORKERS"] = str(args.workers)
+    os.environ["ANALYSIS_SEED"] = str(args.seed)
+    os.environ["STORAGE_BACKEND"] = "memory"
+    # Don't record the replay itself, and don't let admission control interfere with it
+    os.environ["SCAN_RECORDING_DIR"] = ""
+    os.environ.setdefault("MAX_SCAN_CONNECTIONS_PER_CLIENT", "0")
+    os.environ.setdefault("DEGRADE_SCAN_CONNECTIONS", "0")
+    apply_settings(recordings[0].metadata.get("settings", {}))
+
+    import server
+
+    recorder = LatencyRecorder()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    with ServerThread(server.app, port):
+        wait_ready(base_url)
+        started = time.perf_counter()
+        sessions = asyncio.run(replay_all(base_url, recordings, args.speed, recorder))
+        elapsed = time.perf_counter() - started
+    for recording in recordings:
+        recording.close()
+
+    frames = [frame for session in sessions.values() for frame in session["frames"]]
+    counts = {"sent": len(frames)}
+    for frame in frames:
+        counts[frame["type"]] = counts.get(frame["type"], 0) + 1
+    report = {
+        "config": {
+            "recordings": len(recordings),
+            "speed": args.speed,
+            "seed": args.seed,
+            "executor": server.executor.mode,
+            "workers": server.executor.max_workers,
+            "settings": {name: os.environ.get(name) for name in recordings[0].metadata.get("settings", {})},
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "throughput": {
+            "frames_per_s": round(len(frames) / elapsed, 2) if elapsed else None,
+            "analyzed_per_s": round(counts.get("analysis_result", 0) / elapsed, 2) if elapsed else None,
+        },
+        "counts": counts,
+        "latency": recorder.summary(),
+        "sessions": {name: {k: v for k, v in session.items() if k != "frames"} for name, session in sessions.items()},
+        "results": {name: session["frames"] for name, session in sessions.items()},
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["vs_baseline"] = dict(compare(report, baseline),
+                                     results=diff_results(report["results"], baseline.get("results", {})))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if args.baseline and report["vs_baseline"]["results"]["mismatched"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""Message broker shared by the API worker processes.
+
+Workers publish results to channels and keep small pieces of session state
+(with expiry) in the broker. LocalBroker serves a single process;
+SocketBroker speaks the Redis protocol (RESP), so it works against Redis
+itself or against BrokerServer, a minimal stand-in implementing the
+commands used here. Run the stand-in on its own with:
+
+    python -m broker --listen unix:///tmp/health-broker.sock
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[Dict[str, Any]], None]
+
+
+class BrokerError(Exception):
+    pass
+
+
+def encode_command(*args: Union[str, bytes, int, float]) -> bytes:
+    """RESP array of bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one RESP value; error replies are returned as BrokerError instances, not raised"""
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Broker connection closed")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode()
+    if prefix == b"-":
+        return BrokerError(rest.decode())
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise BrokerError(f"Unexpected reply {line!r}")
+
+
+def parse_address(url: str) -> Tuple[Optional[str], Optional[str], int]:
+    """(unix socket path, host, port) from unix:///path or redis://host:port"""
+    parsed = urlparse(url)
+    if parsed.scheme == "unix":
+        return parsed.path, None, 0
+    if parsed.scheme in ("redis", "tcp"):
+        return None, parsed.hostname or "127.0.0.1", parsed.port or 6379
+    raise ValueError(f"Unsupported broker URL '{url}', expected unix:///path or redis://host:port")
+
+
+class Broker(ABC):
+    """Pub/sub channels plus a key/value store with expiry.
+
+    `shared` is True when other processes see the same channels and keys,
+    i.e. when per-process state has to be synchronized through the broker.
+    """
+
+    shared = False
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @abstractmethod
+    def publish(self, channel: str, message: Dict[str, Any]):
+        """Send message to every subscriber of channel, in every worker; doesn't wait"""
+
+    @abstractmethod
+    async def subscribe(self, channel: str, handler: MessageHandler):
+        """Call handler with every message published to channel, from any worker"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Value of key, or None if it is unset or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: Union[str, bytes], ttl: Optional[float] = None):
+        """Store value (expiring after ttl seconds)"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "shared": self.shared}
+
+
+class LocalBroker(Broker):
+    """In-process broker for a single worker: handlers are called directly"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[MessageHandler]] = {}
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+        self.published = 0
+
+    def publish(self, channel, message):
+        self.published += 1
+        for handler in self._handlers.get(channel, ()):
+            handler(message)
+
+    async def subscribe(self, channel, handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def get(self, key):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    async def set(self, key, value, ttl=None):
+        data = value if isinstance(value, bytes) else value.encode()
+        self._values[key] = (data, time.monotonic() + ttl if ttl else None)
+
+    def stats(self):
+        return dict(super().stats(), published=self.published, keys=len(self._values))
+
+
+class SocketBroker(Broker):
+    """Redis-protocol client over TCP or a unix socket.
+
+    Commands are pipelined on one connection and matched to replies in
+    order, so publish() only has to write its command. Subscriptions use a
+    second connection, as RESP requires; messages are JSON and are handed to
+    the channel's handlers on the event loop.
+
+    When a connection drops, its pending commands fail and it is reopened in
+    the background (subscriptions are renewed); until then commands fail
+    immediately and messages published meanwhile are missed. get/set give
+    up after `timeout` seconds; error replies raise BrokerError.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, timeout: float = 1.0, retry_interval: float = 0.5):
+        self.url = url
+        self.path, self.host, self.port = parse_address(url)
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Deque[asyncio.Future] = deque()
+        self._replies: Optional[asyncio.Task] = None
+        self._sub_writer: Optional[asyncio.StreamWriter] = None
+        self._messages: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, List[MessageHandler]] = {}
+        self._reconnecting: Optional[asyncio.Task] = None
+        self._resubscribing: Optional[asyncio.Task] = None
+        self._closed = False
+        self.published = 0
+        self.received = 0
+        self.failed = 0
+        self.reconnects = 0
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self.path is not None:
+            return await asyncio.open_unix_connection(self.path)
+        return await asyncio.open_connection(self.host, self.port)
+
+    async def start(self):
+        self._closed = False
+        if self._writer is None:
+            await self._connect()
+
+    async def _connect(self):
+        reader, self._writer = await self._open()
+        self._replies = asyncio.create_task(self._read_replies(reader))
+        logger.info(f"Connected to broker at {self.url}")
+
+    async def _connect_subscriber(self):
+        reader, self._sub_writer = await self._open()
+        self._messages = asyncio.create_task(self._read_messages(reader))
+        if self._handlers:
+            self._sub_writer.write(encode_command("SUBSCRIBE", *self._handlers))
+            await self._sub_writer.drain()
+
+    async def _retry(self, connect: Callable[[], Awaitable[None]]):
+        """Call connect until it succeeds (or the broker is closed), backing off between attempts"""
+        delay = self.retry_interval
+        while not self._closed:
+            await asyncio.sleep(delay)
+            try:
+                await connect()
+                self.reconnects += 1
+                return
+            except OSError as e:
+                logger.warning(f"Reconnecting to broker at {self.url} failed: {e}")
+                delay = min(delay * 2, 10.0)
+
+    async def close(self):
+        self._closed = True
+        for task in (self._replies, self._messages, self._reconnecting, self._resubscribing):
+            if task is not None:
+                task.cancel()
+        for writer in (self._writer, self._sub_writer):
+            if writer is not None:
+                writer.close()
+        self._writer = self._sub_writer = None
+        self._replies = self._messages = self._reconnecting = self._resubscribing = None
+        self._fail_pending()
+
+    def _fail_pending(self):
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError("Broker connection lost"))
+
+    async def _read_replies(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                reply = await read_reply(reader)
+                future = self._pending.popleft()
+                if future.done():
+                    continue
+                if isinstance(reply, BrokerError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except Exception as e:
+            logger.error(f"Broker connection lost: {e!r}")
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = None
+            self._fail_pending()
+            if not self._closed:
+                self._reconnecting = asyncio.create_task(self._retry(self._connect))
+
+    def _command(self, *args) -> asyncio.Future:
+        if self._writer is None or self._writer.is_closing():
+            raise ConnectionError("Broker is not connected")
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        self._writer.write(encode_command(*args))
+        return future
+
+    async def _call(self, *args) -> Any:
+        try:
+            return await asyncio.wait_for(self._command(*args), self.timeout)
+        except (ConnectionError, asyncio.TimeoutError, BrokerError):
+            self.failed += 1
+            raise
+
+    def _publish_done(self, future: asyncio.Future):
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+
+    def publish(self, channel, message):
+        try:
+            future = self._command("PUBLISH", channel, json.dumps(message, separators=(",", ":")))
+        except ConnectionError as e:
+            self.failed += 1
+            logger.error(f"Broker publish failed: {e}")
+            return
+        future.add_done_callback(self._publish_done)
+        self.published += 1
+
+    async def subscribe(self, channel, handler):
+        first = channel not in self._handlers
+        self._handlers.setdefault(channel, []).append(handler)
+        if not first:
+            return
+        if self._sub_writer is None:
+            if self._resubscribing is None or self._resubscribing.done():
+                # Subscribes to every channel with handlers, this one included
+                await self._connect_subscriber()
+            return
+        self._sub_writer.write(encode_command("SUBSCRIBE", channel))
+        await self._sub_writer.drain()
+
+    async def _read_messages(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                reply = await read_reply(reader)
+                # Pushes are ["message", channel, data]; subscribe confirmations are ignored
+                if not isinstance(reply, list) or len(reply) != 3 or reply[0] != b"message":
+                    continue
+                self.received += 1
+                message = json.loads(reply[2])
+                for handler in self._handlers.get(reply[1].decode(), ()):
+                    try:
+                        handler(message)
+                    except Exception as e:
+                        logger.error(f"Broker message handler failed: {e}")
+        except Exception as e:
+            logger.error(f"Broker subscription lost: {e!r}")
+            if self._sub_writer is not None:
+                self._sub_writer.close()
+            self._sub_writer = None
+            if not self._closed:
+                self._resubscribing = asyncio.create_task(self._retry(self._connect_subscriber))
+
+    async def get(self, key):
+        return await self._call("GET", key)
+
+    async def set(self, key, value, ttl=None):
+        args: List[Any] = ["SET", key, value]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        await self._call(*args)
+
+    def stats(self):
+        return dict(super().stats(), url=self.url, published=self.published, received=self.received,
+                    failed=self.failed, pending=len(self._pending), reconnects=self.reconnects,
+                    connected=self._writer is not None and (self._sub_writer is not None or not self._handlers))
+
+
+class BrokerServer:
+    """Minimal single-process server for the RESP commands SocketBroker uses.
+
+    Supports PING, GET, SET (PX/EX), PUBLISH and SUBSCRIBE, with
+    the same reply shapes as Redis. Keys expire lazily when read. Meant for
+    running several workers on one host without a Redis install. close()
+    also drops the clients' connections, like a stopped Redis would.
+    """
+
+    def __init__(self):
+        self._values: Dict[bytes, Tuple[bytes, Optional[float]]] = {}
+        self._subscribers: Dict[bytes, List[asyncio.StreamWriter]] = {}
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, url: str):
+        path, host, port = parse_address(url)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._serve, path)
+        else:
+            self._server = await asyncio.start_server(self._serve, host, port)
+        logger.info(f"Broker listening on {url}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires is not None and expires <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    @staticmethod
+    def _bulk(value: Optional[bytes]) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _execute(self, command: List[bytes], writer: asyncio.StreamWriter) -> Optional[bytes]:
+        name, args = command[0].upper(), command[1:]
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"GET":
+            return self._bulk(self._get(args[0]))
+        if name == b"SET":
+            key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+            expires = None
+            for unit, scale in ((b"PX", 1000), (b"EX", 1)):
+                if unit in options:
+                    expires = time.monotonic() + int(options[options.index(unit) + 1]) / scale
+            self._values[key] = (value, expires)
+            return b"+OK\r\n"
+        if name == b"PUBLISH":
+            channel, data = args
+            receivers = self._subscribers.get(channel, [])
+            message = encode_command(b"message", channel, data)
+            for receiver in receivers:
+                receiver.write(message)
+            return b":%d\r\n" % len(receivers)
+        if name == b"SUBSCRIBE":
+            for i, channel in enumerate(args, start=1):
+                self._subscribers.setdefault(channel, []).append(writer)
+                writer.write(encode_command(b"subscribe", channel, b"%d" % i))
+            return None
+        return b"-ERR unknown command '%s'\r\n" % name
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    break
+                try:
+                    reply = self._execute(command, writer)
+                except (ValueError, IndexError):
+                    reply = b"-ERR syntax error\r\n"
+                if reply is not None:
+                    writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Broker client error: {e}")
+        finally:
+            self._clients.discard(writer)
+            for subscribers in self._subscribers.values():
+                if writer in subscribers:
+                    subscribers.remove(writer)
+            writer.close()
+
+
+def create_broker(url: str, timeout: float = 1.0) -> Broker:
+    """SocketBroker for a unix:// or redis:// URL, LocalBroker when url is empty"""
+    return SocketBroker(url, timeout) if url else LocalBroker()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in broker for multi-worker deployments")
+    parser.add_argument("--listen", default="unix:///tmp/health-broker.sock",
+                        help="unix:///path or tcp://host:port")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    async def serve():
+        server = BrokerServer()
+        await server.start(args.listen)
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Sequence
+
+
+@dataclass(frozen=True)
+class CaptureSettings:
+    max_dim: int              # longest side of captured frames, in pixels
+    jpeg_quality: float       # 0-1, as taken by canvas.toBlob / toDataURL
+    frame_interval_ms: int    # minimum time between frames sent by the client
+
+
+# Cheapest last; the client's built-in default (640px, 0.8) is the middle level
+CAPTURE_LEVELS = (
+    CaptureSettings(1280, 0.9, 100),
+    CaptureSettings(960, 0.85, 150),
+    CaptureSettings(640, 0.8, 250),
+    CaptureSettings(480, 0.7, 500),
+    CaptureSettings(320, 0.6, 1000),
+)
+
+
+class CaptureController:
+    """Per-session capture targets driven by how fast the server keeps up.
+
+    After every analyzed frame the session's smoothed processing latency,
+    the executor backlog and the frames dropped by the scheduler are
+    checked. While overloaded (latency above `target_ms`, a backlog, or new
+    drops) the session steps down one level at a time, at most every
+    `hold_frames` frames; once latency has stayed under half the target for
+    `upgrade_after` frames it steps back up. Each change yields a
+    capture_settings message for the client to apply to its next captures.
+    """
+
+    def __init__(self, target_ms: float = 200.0, levels: Sequence[CaptureSettings] = CAPTURE_LEVELS,
+                 start_level: int = 2, smoothing: float = 0.3, hold_frames: int = 5, upgrade_after: int = 20):
+        self.target_ms = target_ms
+        self.levels = list(levels)
+        self.level = min(max(0, start_level), len(self.levels) - 1)
+        self.smoothing = smoothing
+        self.hold_frames = max(1, hold_frames)
+        self.upgrade_after = max(1, upgrade_after)
+        self.latency_ms: Optional[float] = None
+        self.frames_since_change = 0
+        self.calm_frames = 0
+        self.last_dropped = 0
+        self.downgrades = 0
+        self.upgrades = 0
+
+    @property
+    def settings(self) -> CaptureSettings:
+        return self.levels[self.level]
+
+    def message(self, reason: str) -> Dict[str, Any]:
+        return dict(asdict(self.settings), type="capture_settings", level=self.level, reason=reason)
+
+    def observe(self, latency_ms: float, queue_depth: int, dropped: int) -> Optional[Dict[str, Any]]:
+        """Record an analyzed frame (dropped is the scheduler's running total); returns a message on change"""
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+        new_drops = dropped > self.last_dropped
+        self.last_dropped = dropped
+        self.frames_since_change += 1
+
+        if self.latency_ms > self.target_ms or queue_depth > 0 or new_drops:
+            self.calm_frames = 0
+            if self.level < len(self.levels) - 1 and self.frames_since_change >= self.hold_frames:
+                self.level += 1
+                self.downgrades += 1
+                self.frames_since_change = 0
+                return self.message("overloaded")
+            return None
+
+        self.calm_frames = self.calm_frames + 1 if self.latency_ms < self.target_ms / 2 else 0
+        if self.level > 0 and self.calm_frames >= self.upgrade_after:
+            self.level -= 1
+            self.upgrades += 1
+            self.calm_frames = 0
+            self.frames_since_change = 0
+            return self.message("recovered")
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "level": self.level,
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            "downgrades": self.downgrades,
+            "upgrades": self.upgrades,
+        }
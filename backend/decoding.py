@@ -0,0 +1,133 @@
+import io
+from typing import Optional, Tuple
+
+import numpy as np
+
+# OpenCV and Pillow are imported on first use so importing the API doesn't pay for them
+
+JPEG_MAGIC = b"\xff\xd8"
+
+# libjpeg can decode straight to 1/2, 1/4 or 1/8 size using DCT scaling (cv2 flag names)
+REDUCED_GRAYSCALE = {
+    2: "IMREAD_REDUCED_GRAYSCALE_2",
+    4: "IMREAD_REDUCED_GRAYSCALE_4",
+    8: "IMREAD_REDUCED_GRAYSCALE_8",
+}
+
+
+def image_size(data: bytes) -> Tuple[int, int]:
+    """(width, height) read from the image header without decoding pixels"""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        return image.size
+
+
+def reduction_factor(size: Tuple[int, int], max_dim: int) -> int:
+    """Largest JPEG reduced-decode factor that keeps the longest side >= max_dim"""
+    longest = max(size)
+    if max_dim <= 0:
+        return 1
+    for factor in (8, 4, 2):
+        if longest // factor >= max_dim:
+            return factor
+    return 1
+
+
+def decode_color(data: bytes) -> np.ndarray:
+    """Decode image bytes to a full-resolution BGR frame (handles RGBA, palette and grayscale input)"""
+    import cv2
+
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Unable to decode image")
+    return frame
+
+
+class DecodedImage:
+    """Encoded image decoded into the layouts the analysis pipeline needs.
+
+    `gray` is the detection input. For JPEGs much larger than the detection
+    resolution it is decoded directly at reduced size, and the full-resolution
+    color frame is only decoded if `color()` is called (i.e. faces were found).
+    Otherwise the color frame is decoded once and `gray` is derived from it.
+    """
+
+    def __init__(self, data: bytes, detection_max_dim: int = 0):
+        import cv2
+
+        self.data = data
+        self._color: Optional[np.ndarray] = None
+        self.reduction = 1
+
+        if data[:2] == JPEG_MAGIC and detection_max_dim > 0:
+            self.width, self.height = image_size(data)
+            self.reduction = reduction_factor((self.width, self.height), detection_max_dim)
+
+        if self.reduction > 1:
+            gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), getattr(cv2, REDUCED_GRAYSCALE[self.reduction]))
+            if gray is None:
+                raise ValueError("Unable to decode image")
+            # EXIF orientation may have swapped the axes, trust the decoded shape
+            if (gray.shape[1] > gray.shape[0]) != (self.width > self.height):
+                self.width, self.height = self.height, self.width
+            self.gray = gray
+        else:
+            self._color = decode_color(data)
+            self.height, self.width = self._color.shape[:2]
+            self.gray = cv2.cvtColor(self._color, cv2.COLOR_BGR2GRAY)
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (self.height, self.width)
+
+    def color(self) -> np.ndarray:
+        if self._color is None:
+            self._color = decode_color(self.data)
+            self.height, self.width = self._color.shape[:2]
+        return self._color
+
+
+class VideoFrameSampler:
+    """Decodes a video file incrementally, keeping only sampled frames.
+
+    Frames between samples are grabbed without being decoded to BGR, and only
+    the current frame is held in memory, whatever the length of the video.
+    Reads block, so call them off the event loop.
+    """
+
+    DEFAULT_FPS = 30.0
+
+    def __init__(self, path: str, sample_fps: float = 0.0):
+        import cv2
+
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            self.capture.release()
+            raise ValueError("Unable to open video")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or self.DEFAULT_FPS
+        self.frame_count = max(0, int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+        # Every frame when sample_fps is 0 or not below the source rate
+        self.step = max(1, int(round(self.fps / sample_fps))) if sample_fps > 0 else 1
+        self.index = 0
+
+    @property
+    def samples_estimate(self) -> int:
+        """Expected number of sampled frames (from the container's frame count, may be 0 if unknown)"""
+        return (self.frame_count + self.step - 1) // self.step
+
+    def read(self) -> Optional[Tuple[int, float, np.ndarray]]:
+        """Next sampled frame as (frame index, position in seconds, BGR frame); None at the end"""
+        while self.index % self.step:
+            if not self.capture.grab():
+                return None
+            self.index += 1
+        ok, frame = self.capture.read()
+        if not ok:
+            return None
+        index = self.index
+        self.index += 1
+        return index, index / self.fps, frame
+
+    def release(self):
+        self.capture.release()
@@ -0,0 +1,103 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from tracking import Box, Region, region_to_box
+
+FULL_FRAME: Region = (0.0, 0.0, 1.0, 1.0)
+
+# (reference signature or None, regions it covers, threshold) shipped to analysis workers
+ChangeCheck = Tuple[Optional[np.ndarray], List[Region], float]
+
+
+def frame_signature(gray: np.ndarray, regions: Sequence[Region], size: int = 16) -> np.ndarray:
+    """Downsampled grayscale thumbnails (size x size) of each relative region of the frame"""
+    import cv2
+
+    height, width = gray.shape[:2]
+    thumbnails = []
+    for region in regions:
+        x, y, w, h = region_to_box(region, width, height)
+        crop = gray[y:y+h, x:x+w]
+        if crop.size == 0:
+            thumbnails.append(np.zeros((size, size), dtype=np.float32))
+            continue
+        thumbnails.append(cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32))
+    return np.stack(thumbnails)
+
+
+def signature_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Largest per-region mean absolute difference, in gray levels"""
+    if a.shape != b.shape:
+        return float("inf")
+    return float(np.abs(a - b).reshape(len(a), -1).mean(axis=1).max())
+
+
+def is_unchanged(gray: np.ndarray, check: ChangeCheck) -> bool:
+    """Whether the frame is within threshold of the reference signature (worker side)"""
+    reference, regions, threshold = check
+    if reference is None:
+        return False
+    return signature_distance(frame_signature(gray, regions), reference) <= threshold
+
+
+def reference_signature(gray: np.ndarray, boxes: List[Box],
+                        frame_shape: Tuple[int, int]) -> Tuple[np.ndarray, List[Region]]:
+    """Signature of an analyzed frame over the whole frame and each face (pixel boxes in frame coordinates)"""
+    frame_h, frame_w = frame_shape
+    regions = [FULL_FRAME] + [(x / frame_w, y / frame_h, w / frame_w, h / frame_h) for x, y, w, h in boxes]
+    return frame_signature(gray, regions), regions
+
+
+class FrameChangeDetector:
+    """Per-session check for frames that are nearly identical to the last analyzed one.
+
+    Frames are compared on downsampled grayscale thumbnails of the whole frame
+    and of each face found in the last analyzed frame, so small expression
+    changes register even when the rest of the image is still. A frame is
+    unchanged when no thumbnail differs by more than `threshold` gray levels
+    on average; its analysis is skipped and the previous results are reused.
+
+    Comparisons are always against the last analyzed frame, so slow drift
+    accumulates until it crosses the threshold, and at most `max_reuse`
+    consecutive frames are skipped before a fresh analysis is forced.
+    """
+
+    def __init__(self, threshold: float = 3.0, max_reuse: int = 30):
+        self.threshold = threshold
+        self.max_reuse = max(0, max_reuse)
+        self.signature: Optional[np.ndarray] = None
+        self.regions: List[Region] = [FULL_FRAME]
+        self.results: List[Any] = []
+        self.detection: Dict[str, Any] = {}
+        self.consecutive_reuse = 0
+        self.checked = 0
+        self.reused = 0
+
+    def check_args(self) -> ChangeCheck:
+        """What the worker needs to compare the next frame; a None signature forces analysis"""
+        if self.consecutive_reuse >= self.max_reuse:
+            return (None, self.regions, self.threshold)
+        return (self.signature, self.regions, self.threshold)
+
+    def record_analyzed(self, signature: np.ndarray, regions: List[Region], results: List[Any],
+                        detection: Dict[str, Any]):
+        """Remember a fully analyzed frame (signature taken over its own face regions) as the reference"""
+        self.checked += 1
+        self.consecutive_reuse = 0
+        self.signature = signature
+        self.regions = regions
+        self.results = results
+        self.detection = detection
+
+    def record_reused(self):
+        self.checked += 1
+        self.reused += 1
+        self.consecutive_reuse += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "checked": self.checked,
+            "reused": self.reused,
+            "skip_rate": round(self.reused / self.checked, 4) if self.checked else 0.0,
+        }
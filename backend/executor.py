@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisExecutor:
+    """Runs CPU-bound frame analysis off the event loop.
+
+    Modes:
+      inline  - run on the calling (event loop) thread, as before
+      thread  - shared ThreadPoolExecutor; OpenCV releases the GIL in detectMultiScale
+      process - ProcessPoolExecutor; callables must be picklable module-level functions
+    """
+
+    MODES = ("inline", "thread", "process")
+
+    def __init__(
+        self,
+        mode: str = "thread",
+        max_workers: Optional[int] = None,
+        initializer: Optional[Callable[..., None]] = None,
+        initargs: Tuple[Any, ...] = (),
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown analysis executor mode '{mode}', expected one of {self.MODES}")
+        self.mode = mode
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.initializer = initializer
+        self.initargs = initargs
+        self._pool: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.mode == "process":
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.max_workers,
+                            initializer=self.initializer,
+                            initargs=self.initargs,
+                        )
+                    else:
+                        self._pool = ThreadPoolExecutor(
+                            max_workers=self.max_workers,
+                            thread_name_prefix="analysis",
+                            initializer=self.initializer,
+                            initargs=self.initargs,
+                        )
+                    logger.info(f"Analysis executor started: mode={self.mode} workers={self.max_workers}")
+        return self._pool
+
+    def start(self):
+        """Create the worker pool eagerly so the first frame doesn't pay for it"""
+        if self.mode != "inline":
+            self._get_pool()
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+            logger.info("Analysis executor stopped")
+
+    @property
+    def queue_depth(self) -> int:
+        """Jobs submitted but not yet picked up by a worker"""
+        if self.mode == "inline":
+            return 0
+        return max(0, self.in_flight - self.max_workers)
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run fn(*args) according to the configured mode and await its result"""
+        self.submitted += 1
+        self.in_flight += 1
+        try:
+            if self.mode == "inline":
+                result = fn(*args)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(self._get_pool(), fn, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.max_workers if self.mode != "inline" else 0,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
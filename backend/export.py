@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Sequence
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _csv_value(value: Any) -> Any:
+    # Tuples/lists (face_coordinates, recommendations) become JSON inside the cell
+    if isinstance(value, (list, tuple, dict)):
+        return json.dumps(value)
+    return value
+
+
+async def export_chunks(readings, export_format: str, fields: Sequence[str],
+                        chunk_size: int = 1000) -> AsyncIterator[str]:
+    """Serialize documents from an async iterable as NDJSON or CSV text chunks
+
+    At most chunk_size documents are held at a time, so memory use doesn't
+    grow with the size of the export.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{export_format}'")
+
+    buffer = io.StringIO()
+    writer = None
+    if export_format == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+
+    pending = 0
+    async for document in readings:
+        if writer is None:
+            buffer.write(json.dumps(document, separators=(",", ":"), default=str))
+            buffer.write("\n")
+        else:
+            writer.writerow([_csv_value(document.get(field)) for field in fields])
+        pending += 1
+        if pending >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
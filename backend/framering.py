@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# (shared memory block name, byte offset, shape, dtype) - all a worker needs to view a frame
+FrameRef = Tuple[str, int, Tuple[int, ...], str]
+
+# Blocks attached by this (worker) process, by name
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def attach_frame(ref: FrameRef) -> np.ndarray:
+    """Read-only NumPy view of a frame in a shared ring slot (worker side, no copy)
+
+    The view is only valid until the job returns and the slot is released,
+    so results must not keep references into it.
+    """
+    name, offset, shape, dtype = ref
+    block = _attached.get(name)
+    if block is None:
+        block = _attached[name] = shared_memory.SharedMemory(name=name)
+    frame = np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=offset)
+    frame.flags.writeable = False
+    return frame
+
+
+class SharedFrameRing:
+    """Fixed set of shared-memory frame slots for handing frames to process workers.
+
+    Instead of pickling a frame into the job, the event loop copies it into a
+    free slot and sends the slot's FrameRef; the worker views it in place.
+    Slots are recycled once the job's result is back. When every slot is in
+    use, acquiring waits, which bounds the frames in flight. Frames larger
+    than a slot aren't handled here; callers fall back to pickling them.
+    """
+
+    def __init__(self, slots: int, slot_bytes: int):
+        self.slots = max(1, slots)
+        self.slot_bytes = slot_bytes
+        self._block: Optional[shared_memory.SharedMemory] = None
+        self._free: Optional[asyncio.Queue] = None
+        self.handoffs = 0
+        self.oversized = 0
+
+    def start(self):
+        """Allocate the shared block (call on the event loop)"""
+        if self._block is None:
+            self._block = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+            self._free = asyncio.Queue()
+            for slot in range(self.slots):
+                self._free.put_nowait(slot)
+            logger.info(f"Shared frame ring started: {self.slots} slots x {self.slot_bytes // (1024 * 1024)} MiB")
+
+    def close(self):
+        if self._block is None:
+            return
+        block, self._block = self._block, None
+        try:
+            block.close()
+        except BufferError:
+            # A frame view is still referenced somewhere; the mapping goes away with the process
+            logger.warning("Shared frame ring closed with frames still in use")
+        block.unlink()
+
+    def fits(self, frame: np.ndarray) -> bool:
+        return self._block is not None and frame.nbytes <= self.slot_bytes
+
+    async def put(self, frame: np.ndarray) -> Tuple[int, FrameRef]:
+        """Copy frame into a free slot (waiting for one if needed); returns the slot and its FrameRef"""
+        slot = await self._free.get()
+        offset = slot * self.slot_bytes
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._block.buf, offset=offset)
+        np.copyto(view, frame)
+        del view
+        self.handoffs += 1
+        return slot, (self._block.name, offset, frame.shape, frame.dtype.str)
+
+    def release(self, slot: int):
+        self._free.put_nowait(slot)
+
+    @property
+    def in_use(self) -> int:
+        return self.slots - self._free.qsize() if self._free is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "slot_bytes": self.slot_bytes,
+            "in_use": self.in_use,
+            "handoffs": self.handoffs,
+            "oversized": self.oversized,
+        }
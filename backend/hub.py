@@ -0,0 +1,122 @@
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Set
+
+# Topic of subscribers that want results from every session
+ALL_SESSIONS = "*"
+
+
+class Subscriber:
+    """One dashboard connection's bounded queue of pushed messages.
+
+    Publishing never waits on a subscriber. When a slow consumer's queue is
+    full its backlog is discarded and, on its next read, it gets a snapshot
+    of the latest result of each session it follows instead.
+    """
+
+    def __init__(self, hub: "ResultHub", max_queue: int = 32):
+        self.hub = hub
+        self.max_queue = max(1, max_queue)
+        self.topics: Set[str] = set()
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.lagged = False
+        self.delivered = 0
+        self.skipped = 0
+
+    def offer(self, message: Dict[str, Any]):
+        if self.lagged:
+            # The pending snapshot will include this
+            self.skipped += 1
+        elif len(self._queue) >= self.max_queue:
+            self.skipped += len(self._queue) + 1
+            self._queue.clear()
+            self.lagged = True
+        else:
+            self._queue.append(message)
+        self._ready.set()
+
+    async def next_message(self) -> Optional[Dict[str, Any]]:
+        """Wait for the next message to send; returns None once closed"""
+        while not self._queue and not self.lagged:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        self.delivered += 1
+        if self.lagged:
+            self.lagged = False
+            return self.hub.snapshot(self.topics, skipped=self.skipped)
+        return self._queue.popleft()
+
+    def close(self):
+        self._closed = True
+        self._ready.set()
+
+
+class ResultHub:
+    """Publish/subscribe fan-out of analysis results to dashboard connections.
+
+    Subscribers follow session ids or ALL_SESSIONS; publishing a session's
+    results looks up both topics in a dict, so its cost depends on the
+    number of interested subscribers only. The latest message of the
+    `max_snapshots` most recently active sessions is kept for snapshots.
+    """
+
+    def __init__(self, max_queue: int = 32, max_snapshots: int = 1000):
+        self.max_queue = max_queue
+        self.max_snapshots = max(1, max_snapshots)
+        self._topics: Dict[str, Set[Subscriber]] = {}
+        self._latest: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.subscribers = 0
+        self.published = 0
+
+    def connect(self) -> Subscriber:
+        self.subscribers += 1
+        return Subscriber(self, self.max_queue)
+
+    def disconnect(self, subscriber: Subscriber):
+        for topic in list(subscriber.topics):
+            self.unsubscribe(subscriber, topic)
+        subscriber.close()
+        self.subscribers -= 1
+
+    def subscribe(self, subscriber: Subscriber, topic: str):
+        self._topics.setdefault(topic, set()).add(subscriber)
+        subscriber.topics.add(topic)
+
+    def unsubscribe(self, subscriber: Subscriber, topic: str):
+        followers = self._topics.get(topic)
+        if followers is not None:
+            followers.discard(subscriber)
+            if not followers:
+                del self._topics[topic]
+        subscriber.topics.discard(topic)
+
+    def publish(self, topic: str, message: Dict[str, Any]):
+        """Push message to the topic's and ALL_SESSIONS' subscribers without waiting on any of them"""
+        self.published += 1
+        self._latest[topic] = message
+        self._latest.move_to_end(topic)
+        if len(self._latest) > self.max_snapshots:
+            self._latest.popitem(last=False)
+        followers = self._topics.get(topic, set()) | self._topics.get(ALL_SESSIONS, set())
+        for subscriber in followers:
+            subscriber.offer(message)
+
+    def snapshot(self, topics: Set[str], skipped: int = 0) -> Dict[str, Any]:
+        """Latest message of each followed session, oldest first"""
+        if ALL_SESSIONS in topics:
+            latest: List[Dict[str, Any]] = list(self._latest.values())
+        else:
+            latest = [message for topic, message in self._latest.items() if topic in topics]
+        return {"type": "snapshot", "latest": latest, "skipped": skipped}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": self.subscribers,
+            "topics": len(self._topics),
+            "published": self.published,
+            "snapshots": len(self._latest),
+        }
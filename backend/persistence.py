@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Bounded in-process buffer that persists documents to a store with insert_many.
+
+    Documents are flushed when `batch_size` are waiting or `flush_interval`
+    seconds after the first one arrived, whichever comes first.
+
+    Durability modes:
+      async - write() returns immediately (fire-and-forget); when the buffer
+              is full new documents are dropped and counted
+      ack   - write() waits until its documents are committed, so callers can
+              acknowledge only persisted data; a full buffer applies backpressure
+
+    `on_flush` is awaited with every successfully inserted batch, e.g. to
+    maintain derived data such as rollups. `observe_flush` is called with the
+    duration of every insert_many in seconds.
+
+    Once close() has begun, writes are refused until start() is called
+    again: async writes are counted as rejected, ack writes raise.
+    """
+
+    MODES = ("async", "ack")
+
+    def __init__(
+        self,
+        store,
+        mode: str = "async",
+        batch_size: int = 100,
+        flush_interval: float = 0.2,
+        max_buffer: int = 10000,
+        on_flush: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None,
+        observe_flush: Optional[Callable[[float], None]] = None,
+    ):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown persistence mode '{mode}', expected one of {self.MODES}")
+        self.store = store
+        self.mode = mode
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self.on_flush = on_flush
+        self.observe_flush = observe_flush
+        self._buffer: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]] = []
+        self._has_items: Optional[asyncio.Event] = None
+        self._batch_ready: Optional[asyncio.Event] = None
+        self._space_available: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        """Start the flush task on the running event loop"""
+        if self._task is None:
+            self._closing = False
+            self._has_items = asyncio.Event()
+            self._batch_ready = asyncio.Event()
+            self._space_available = asyncio.Event()
+            if self._buffer:
+                self._has_items.set()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Flush everything still buffered and stop the background task"""
+        self._closing = True
+        if self._task is None:
+            return
+        self._has_items.set()
+        self._batch_ready.set()
+        await self._task
+        self._task = None
+        logger.info(f"Write-behind buffer drained ({self.written} written, {self.dropped} dropped, {self.failed} failed)")
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    async def write(self, documents: List[Dict[str, Any]]):
+        if not documents:
+            return
+        if self._closing:
+            # Shutting down: the store may already be closed, so don't restart the flush task
+            if self.mode == "ack":
+                raise RuntimeError("Write-behind buffer is closed")
+            self.rejected += len(documents)
+            logger.warning(f"Write-behind buffer closed, rejected {len(documents)} readings")
+            return
+        self.start()
+
+        if self.mode == "async":
+            room = self.max_buffer - len(self._buffer)
+            if room < len(documents):
+                self.dropped += len(documents) - max(room, 0)
+                documents = documents[:max(room, 0)]
+                logger.warning(f"Write-behind buffer full, dropped readings ({self.dropped} total)")
+            self._enqueue([(document, None) for document in documents])
+            return
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for document in documents:
+            while len(self._buffer) >= self.max_buffer:
+                self._space_available.clear()
+                await self._space_available.wait()
+            future = loop.create_future()
+            futures.append(future)
+            self._enqueue([(document, future)])
+        await asyncio.gather(*futures)
+
+    def _enqueue(self, items: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]]):
+        if not items:
+            return
+        self._buffer.extend(items)
+        self._has_items.set()
+        if len(self._buffer) >= self.batch_size:
+            self._batch_ready.set()
+
+    async def _run(self):
+        while True:
+            if not self._buffer:
+                if self._closing:
+                    return
+                self._has_items.clear()
+                await self._has_items.wait()
+                continue
+
+            if len(self._buffer) < self.batch_size and not self._closing:
+                self._batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._flush()
+
+    async def _flush(self):
+        batch, self._buffer = self._buffer[:self.batch_size], self._buffer[self.batch_size:]
+        self._space_available.set()
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        documents = [document for document, _ in batch]
+        try:
+            await self.store.insert_many(documents)
+            if self.observe_flush is not None:
+                self.observe_flush(time.perf_counter() - started)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to persist {len(batch)} readings: {e}")
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_exception(e)
+        else:
+            self.written += len(batch)
+            for _, future in batch:
+                if future is not None and not future.done():
+                    future.set_result(None)
+            if self.on_flush is not None:
+                try:
+                    await self.on_flush(documents)
+                except Exception as e:
+                    logger.error(f"Post-flush hook failed: {e}")
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.batches += 1
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self._total_flush_ms += elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "depth": self.depth,
+            "capacity": self.max_buffer,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.batches, 2) if self.batches else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
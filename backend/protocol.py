@@ -0,0 +1,82 @@
+import json
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack results are only offered when the package is installed
+    msgpack = None
+
+PROTOCOL_VERSION = 1
+
+# Binary frame layout (network byte order), followed by the encoded image bytes:
+#   version   uint8
+#   format    uint8   (see FRAME_FORMATS)
+#   reserved  uint16
+#   sequence  uint32
+#   timestamp uint64  (client capture time, ms since epoch)
+FRAME_HEADER = struct.Struct("!BBHIQ")
+
+FRAME_FORMATS = {0: "jpeg", 1: "webp", 2: "png"}
+
+RESULT_ENCODINGS = ("json", "msgpack")
+
+
+@dataclass
+class FrameHeader:
+    version: int
+    format: str
+    sequence: int
+    timestamp: int
+
+
+def parse_binary_frame(data: bytes) -> Tuple[FrameHeader, bytes]:
+    """Split a binary WebSocket message into its header and image payload"""
+    if len(data) <= FRAME_HEADER.size:
+        raise ValueError("Binary frame too short")
+    version, fmt, _, sequence, timestamp = FRAME_HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ValueError(f"Unsupported frame protocol version {version}")
+    if fmt not in FRAME_FORMATS:
+        raise ValueError(f"Unknown frame format {fmt}")
+    return FrameHeader(version, FRAME_FORMATS[fmt], sequence, timestamp), data[FRAME_HEADER.size:]
+
+
+def pack_binary_frame(image_data: bytes, sequence: int, timestamp: int, fmt: str = "jpeg") -> bytes:
+    """Build a binary frame message (used by tooling and tests on the client side)"""
+    codes = {name: code for code, name in FRAME_FORMATS.items()}
+    return FRAME_HEADER.pack(PROTOCOL_VERSION, codes[fmt], 0, sequence, timestamp) + image_data
+
+
+def negotiate_result_encoding(requested: Optional[str]) -> str:
+    """Pick the result encoding for a session, falling back to JSON"""
+    if requested == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+
+def hello_ack(result_encoding: str, credits: bool = False, capture_control: bool = False,
+              min_frame_interval_ms: int = 0) -> Dict[str, Any]:
+    # A non-zero min_frame_interval_ms means the server is running the session degraded
+    # and analyzes at most one frame per interval
+    return {
+        "type": "hello_ack",
+        "protocol_version": PROTOCOL_VERSION,
+        "binary_frames": True,
+        "frame_header": FRAME_HEADER.format,
+        "frame_formats": list(FRAME_FORMATS.values()),
+        "result_encoding": result_encoding,
+        "result_encodings": [e for e in RESULT_ENCODINGS if e == "json" or msgpack is not None],
+        "credits": credits,
+        "capture_control": capture_control,
+        "degraded": min_frame_interval_ms > 0,
+        "min_frame_interval_ms": min_frame_interval_ms,
+    }
+
+
+def encode_message(message: Dict[str, Any], encoding: str = "json") -> Union[str, bytes]:
+    """Serialize an outgoing message; msgpack yields bytes, JSON yields text"""
+    if encoding == "msgpack":
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message)
@@ -0,0 +1,196 @@
+"""On-disk recordings of scan sessions, for replaying real frame sequences.
+
+A recording is a file header, a length-prefixed JSON metadata block and
+one length-prefixed record per incoming frame:
+
+    file header    b"HTSR", version (u16), metadata length (u32)
+    metadata       JSON: session id, start time, the server settings that shape analysis
+    record header  payload length (u32), kind (u8), received_at (f64, epoch seconds),
+                   sequence (i64, -1 = none), client timestamp (f64, NaN = none)
+    payload        raw image bytes (binary frames) or the data URL (legacy JSON frames)
+
+All integers are little-endian. Records are appended as frames arrive, so
+a recording cut short by a crash is readable up to its last whole record.
+Recordings are read through mmap: payloads are views into the mapping and
+only touch the pages of the frames actually replayed.
+"""
+import json
+import logging
+import math
+import mmap
+import os
+import queue
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+from scheduler import PendingFrame
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"HTSR"
+VERSION = 1
+FILE_HEADER = struct.Struct("<4sHI")
+RECORD_HEADER = struct.Struct("<IBdqd")
+
+KIND_BINARY = 0
+KIND_DATA_URL = 1
+
+I64_MIN, I64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def record_sequence(value: Any) -> int:
+    """The client's sequence number as stored (-1 if missing or not an integer that fits)"""
+    if isinstance(value, bool) or not isinstance(value, int) or not I64_MIN <= value <= I64_MAX:
+        return -1
+    return value
+
+
+def record_timestamp(value: Any) -> float:
+    """The client's timestamp as stored (NaN if missing or not a number)"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    try:
+        return float(value)
+    except OverflowError:
+        return math.nan
+
+
+@dataclass
+class RecordedFrame:
+    payload: Union[memoryview, str]
+    received_at: float
+    sequence: Optional[int] = None
+    client_timestamp: Optional[float] = None
+
+
+class SessionRecorder:
+    """Appends a scan session's incoming frames to a recording file.
+
+    Records are handed to a writer thread, so the event loop never waits
+    on the disk. Sequence numbers and timestamps come from the client and
+    are stored as "none" when they don't fit the record format. Once
+    `max_bytes` have been queued further frames are skipped (and counted)
+    rather than growing the file.
+    """
+
+    def __init__(self, path: str, metadata: Dict[str, Any], max_bytes: int = 0):
+        self.path = path
+        self.max_bytes = max_bytes
+        meta = json.dumps(metadata).encode()
+        self._file: Optional[BinaryIO] = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, len(meta)))
+        self._file.write(meta)
+        self.bytes_written = FILE_HEADER.size + len(meta)
+        self.frames = 0
+        self.skipped = 0
+        self.failed = False
+        self._pending: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_records, name=f"recorder-{os.path.basename(path)}",
+                                        daemon=True)
+        self._writer.start()
+
+    def _write_records(self):
+        while True:
+            chunk = self._pending.get()
+            if chunk is None:
+                break
+            if self.failed:
+                continue
+            try:
+                self._file.write(chunk)
+            except OSError as e:
+                # Keep draining so close() doesn't hang; the file stays readable up to the last whole record
+                logger.error(f"Recording to {self.path} failed: {e}")
+                self.failed = True
+        self._file.close()
+
+    def record(self, frame: PendingFrame):
+        if self._file is None or self.failed:
+            return
+        if isinstance(frame.payload, str):
+            kind, payload = KIND_DATA_URL, frame.payload.encode()
+        else:
+            kind, payload = KIND_BINARY, frame.payload
+        size = RECORD_HEADER.size + len(payload)
+        if self.max_bytes and self.bytes_written + size > self.max_bytes:
+            self.skipped += 1
+            return
+        header = RECORD_HEADER.pack(len(payload), kind, frame.received_at, record_sequence(frame.sequence),
+                                    record_timestamp(frame.client_timestamp))
+        self._pending.put(header)
+        self._pending.put(payload)
+        self.bytes_written += size
+        self.frames += 1
+
+    def close(self):
+        """Flush queued records and close the file (blocks until the writer thread is done)"""
+        if self._file is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._file = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "frames": self.frames, "skipped": self.skipped, "bytes": self.bytes_written,
+                "failed": self.failed}
+
+
+class Recording:
+    """Read-only, memory-mapped view of a recording file (binary payloads are valid until close())"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < FILE_HEADER.size:
+                raise ValueError(f"{path} is not a scan recording")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, version, meta_size = FILE_HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a scan recording")
+        if version != VERSION:
+            raise ValueError(f"Unsupported recording version {version}")
+        offset = FILE_HEADER.size
+        self.metadata: Dict[str, Any] = json.loads(bytes(self._view[offset:offset + meta_size]))
+        offset += meta_size
+
+        # Index record offsets up front; a torn last record is ignored
+        self._offsets: List[int] = []
+        while offset + RECORD_HEADER.size <= size:
+            length = RECORD_HEADER.unpack_from(self._map, offset)[0]
+            if offset + RECORD_HEADER.size + length > size:
+                break
+            self._offsets.append(offset)
+            offset += RECORD_HEADER.size + length
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> RecordedFrame:
+        offset = self._offsets[index]
+        length, kind, received_at, sequence, client_timestamp = RECORD_HEADER.unpack_from(self._map, offset)
+        start = offset + RECORD_HEADER.size
+        payload = self._view[start:start + length]
+        return RecordedFrame(
+            payload=bytes(payload).decode() if kind == KIND_DATA_URL else payload,
+            received_at=received_at,
+            sequence=sequence if sequence >= 0 else None,
+            client_timestamp=client_timestamp if not math.isnan(client_timestamp) else None,
+        )
+
+    def __iter__(self) -> Iterator[RecordedFrame]:
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def duration(self) -> float:
+        """Seconds between the first and last frame's arrival"""
+        if len(self) < 2:
+            return 0.0
+        return self[-1].received_at - self[0].received_at
+
+    def close(self):
+        self._view.release()
+        self._map.close()
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+def content_key(data: bytes, *params: Any) -> str:
+    """Fast hash of an upload's bytes plus whatever else its analysis depends on"""
+    digest = hashlib.blake2b(data, digest_size=16)
+    for param in params:
+        digest.update(repr(param).encode())
+    return digest.hexdigest()
+
+
+class TTLCache:
+    """Bounded least-recently-used cache whose entries also expire after `ttl` seconds (0 entries = disabled)"""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max(0, max_entries)
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        if not self.max_entries:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "capacity": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+class IdempotencyConflict(ValueError):
+    """An Idempotency-Key was reused for a different request"""
+
+
+class IdempotentResponses:
+    """Responses to requests that carried an Idempotency-Key, replayed to retries of the same request.
+
+    A retry that arrives while the original is still being served waits for
+    it instead of running again. Failed requests are not stored, so their
+    retries run normally. Each key is bound to the fingerprint (content
+    hash) of its first request; reusing it for anything else is a conflict.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0):
+        self.responses = TTLCache(max_entries, ttl)
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+        self.replayed = 0
+        self.conflicts = 0
+
+    async def begin(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """The stored response for key, or None when the caller should serve the request and finish() it"""
+        while True:
+            stored = self.responses.get(key)
+            if stored is not None:
+                self._check(fingerprint, stored[0])
+                self.replayed += 1
+                return stored[1]
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self._check(fingerprint, inflight[0])
+            await asyncio.shield(inflight[1])
+        self._inflight[key] = (fingerprint, asyncio.get_running_loop().create_future())
+        return None
+
+    def finish(self, key: str, response: Optional[Dict[str, Any]]):
+        """Store the response to key's request (None if it failed) and wake retries waiting on it"""
+        fingerprint, done = self._inflight.pop(key)
+        if response is not None:
+            self.responses.put(key, (fingerprint, response))
+        done.set_result(None)
+
+    def _check(self, fingerprint: str, expected: str):
+        if fingerprint != expected:
+            self.conflicts += 1
+            raise IdempotencyConflict("Idempotency-Key was already used for a different image")
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.responses.stats(), inflight=len(self._inflight), replayed=self.replayed,
+                    conflicts=self.conflicts)
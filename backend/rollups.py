@@ -0,0 +1,89 @@
+import logging
+import math
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+from storage import AGGREGATE_METRICS as ROLLUP_METRICS, Bucket, HealthStore, bucket_start
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+def format_bucket(start: int, count: int, sums: Dict[str, float]) -> Dict[str, Any]:
+    """Public representation of a bucket: reading count and per-metric averages"""
+    bucket = {"start": start, "count": count}
+    for metric in ROLLUP_METRICS:
+        bucket[f"avg_{metric}"] = round(sums.get(metric, 0.0) / count, 4) if count else None
+    return bucket
+
+
+class RollupStore:
+    """Per-minute/hour/day aggregates of health readings.
+
+    Rollups hold a reading count and per-metric sums, so they can be
+    maintained with increments as readings are written and averaged at
+    query time. Arbitrary ranges can also be computed directly from the raw
+    readings, and rollups for a range can be rebuilt from them. Both live in
+    the configured HealthStore.
+    """
+
+    def __init__(self, store: HealthStore):
+        self.store = store
+        self.updates = 0
+        self.failed = 0
+
+    async def apply(self, readings: List[Dict[str, Any]]):
+        """Fold newly written readings into every granularity's rollups"""
+        totals: Dict[Tuple[str, int], List[float]] = defaultdict(lambda: [0] + [0.0] * len(ROLLUP_METRICS))
+        for reading in readings:
+            timestamp = reading.get("timestamp")
+            if timestamp is None:
+                continue
+            for granularity, size in GRANULARITIES.items():
+                total = totals[(granularity, bucket_start(timestamp, size))]
+                total[0] += 1
+                for i, metric in enumerate(ROLLUP_METRICS, start=1):
+                    total[i] += float(reading.get(metric) or 0.0)
+
+        if not totals:
+            return
+        increments = {
+            key: (int(total[0]), {metric: total[i] for i, metric in enumerate(ROLLUP_METRICS, start=1)})
+            for key, total in totals.items()
+        }
+        try:
+            await self.store.increment_rollups(increments)
+            self.updates += len(increments)
+        except Exception as e:
+            self.failed += len(increments)
+            logger.error(f"Rollup update failed: {e}")
+
+    async def query(self, granularity: str, start: float, end: float) -> List[Dict[str, Any]]:
+        """Buckets from the maintained rollups, covering [start, end)"""
+        size = GRANULARITIES[granularity]
+        buckets = await self.store.find_rollups(granularity, bucket_start(start, size), end)
+        return [format_bucket(*bucket) for bucket in buckets]
+
+    async def compute(self, granularity: str, start: float, end: float) -> List[Dict[str, Any]]:
+        """Buckets aggregated on demand from the raw readings in [start, end)"""
+        return [format_bucket(*bucket) for bucket in await self._aggregate_readings(granularity, start, end)]
+
+    async def rebuild(self, granularity: str, start: float, end: float) -> int:
+        """Recompute the rollups of whole buckets in [start, end) from raw readings
+
+        Readings inserted while the rebuild runs may be missing from the
+        rebuilt buckets; rebuild ranges that are no longer being written to.
+        """
+        size = GRANULARITIES[granularity]
+        start = bucket_start(start, size)
+        end = int(math.ceil(end / size)) * size
+        buckets = await self._aggregate_readings(granularity, start, end)
+        await self.store.replace_rollups(granularity, start, end, buckets)
+        return len(buckets)
+
+    async def _aggregate_readings(self, granularity: str, start: float, end: float) -> List[Bucket]:
+        return await self.store.aggregate(GRANULARITIES[granularity], start, end)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"updates": self.updates, "failed": self.failed}
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Union
+
+
+@dataclass
+class PendingFrame:
+    # Raw bytes for binary frames, the data URL string for legacy JSON frames.
+    # Decoding is deferred so frames that get dropped never pay for it.
+    payload: Union[bytes, str]
+    sequence: Optional[int] = None
+    client_timestamp: Optional[float] = None
+    received_at: float = field(default_factory=time.time)
+
+
+class LatestFrameScheduler:
+    """Per-connection frame slot where the newest frame wins.
+
+    The receive loop submits every incoming frame; the processing loop takes
+    whatever is newest when it becomes free. Frames that are replaced before
+    being picked up are counted as dropped, so result latency stays bounded by
+    one analysis instead of growing with the socket backlog.
+    """
+
+    def __init__(self):
+        self._pending: Optional[PendingFrame] = None
+        self._available = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errored = 0
+        self.shed = 0
+
+    def submit(self, frame: PendingFrame) -> bool:
+        """Make frame the pending one; returns True if it replaced (dropped) an older frame"""
+        self.received += 1
+        replaced = self._pending is not None
+        if replaced:
+            self.dropped += 1
+        self._pending = frame
+        self._available.set()
+        return replaced
+
+    async def next_frame(self) -> Optional[PendingFrame]:
+        """Wait for the newest pending frame; returns None once closed"""
+        while self._pending is None:
+            if self._closed:
+                return None
+            self._available.clear()
+            await self._available.wait()
+        frame, self._pending = self._pending, None
+        return frame
+
+    def mark_processed(self):
+        self.processed += 1
+
+    def mark_errored(self):
+        self.errored += 1
+
+    def mark_shed(self):
+        self.shed += 1
+
+    def close(self):
+        self._closed = True
+        self._available.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errored": self.errored,
+            "shed": self.shed,
+        }
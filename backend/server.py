@@ -1,47 +1,195 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Header
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import cv2
 import numpy as np
 import json
 import asyncio
+import atexit
 import base64
-import io
-from PIL import Image
+import copy
 import logging
+import multiprocessing
+import random
+import socket
 import time
-from typing import List, Dict, Any, Optional, Tuple
+from typing import AsyncIterator, BinaryIO, Callable, List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
-from collections import deque
 import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime
 import uuid
 
+from admission import AnalysisGate, ConcurrencyLimit, Overloaded, UploadAdmissionMiddleware
+from broker import BrokerError, BrokerServer, create_broker
+from capture import CAPTURE_LEVELS, CaptureController
+from decoding import DecodedImage, VideoFrameSampler
+from dedup import ChangeCheck, FrameChangeDetector, is_unchanged, reference_signature
+from executor import AnalysisExecutor
+from export import EXPORT_FORMATS, export_chunks
+from framering import FrameRef, SharedFrameRing, attach_frame
+from hub import ALL_SESSIONS, ResultHub
+from metrics import MetricsRegistry, StageTimer
+from persistence import WriteBehindBuffer
+from rollups import GRANULARITIES, RollupStore
+from recording import SessionRecorder
+from resultcache import IdempotencyConflict, IdempotentResponses, TTLCache, content_key
+from protocol import encode_message, hello_ack, negotiate_result_encoding, parse_binary_frame
+from scheduler import LatestFrameScheduler, PendingFrame
+from storage import create_store
+from sessions import EMOTION_CODES, EMOTIONS, EmotionRing, SessionRegistry, SessionState, emotion_mask
+from tracking import FaceTracker, Region, region_to_box
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_background_workers()
+    try:
+        yield
+    finally:
+        await stop_background_workers()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Health Tracker API",
     description="Face scanning health monitoring for glucose, anxiety and depression",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Database connection
+# Storage for readings and rollups: mongo | memory (in-process, most recent readings only) | sqlite (local WAL file)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URL)
-db = client.health_tracker
+SQLITE_PATH = os.getenv("SQLITE_PATH", "health_tracker.db")
+MEMORY_STORE_CAPACITY = int(os.getenv("MEMORY_STORE_CAPACITY", "100000"))
+store = create_store(STORAGE_BACKEND, MONGO_URL, SQLITE_PATH, MEMORY_STORE_CAPACITY)
+
+# Health readings are written behind the request: async (fire-and-forget) | ack (wait for the write)
+PERSISTENCE_MODE = os.getenv("PERSISTENCE_MODE", "async")
+PERSISTENCE_BATCH_SIZE = int(os.getenv("PERSISTENCE_BATCH_SIZE", "100"))
+PERSISTENCE_FLUSH_INTERVAL_MS = int(os.getenv("PERSISTENCE_FLUSH_INTERVAL_MS", "200"))
+PERSISTENCE_MAX_BUFFER = int(os.getenv("PERSISTENCE_MAX_BUFFER", "10000"))
+
+# /api/health/history page size cap
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "500"))
+
+# /api/health/export cursor batch size (documents fetched and written per chunk)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_MAX_BATCH_SIZE = int(os.getenv("EXPORT_MAX_BATCH_SIZE", "10000"))
+
+# /api/health/aggregates range cap, in buckets
+AGGREGATES_MAX_BUCKETS = int(os.getenv("AGGREGATES_MAX_BUCKETS", "1000"))
+
+# Frame analysis execution: inline | thread | process
+ANALYSIS_EXECUTOR = os.getenv("ANALYSIS_EXECUTOR", "thread")
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "0")) or None
+# Process mode hands decoded frames to workers through shared-memory slots (0 slots = two per worker)
+FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "0"))
+FRAME_RING_SLOT_MB = int(os.getenv("FRAME_RING_SLOT_MB", "8"))
+
+# Face tracking for scan sessions: full detection every N frames, padded search regions in between
+FACE_TRACKING = os.getenv("FACE_TRACKING", "true").lower() in ("1", "true", "yes")
+FACE_REDETECT_INTERVAL = int(os.getenv("FACE_REDETECT_INTERVAL", "10"))
+FACE_TRACK_PADDING = float(os.getenv("FACE_TRACK_PADDING", "0.5"))
+
+# Per-session analysis state (emotion history ring, face tracker)
+SESSION_HISTORY_SIZE = int(os.getenv("SESSION_HISTORY_SIZE", "50"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "10000"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "300"))
+
+# Admission control: concurrent scan sockets and /api/analyze/* uploads, globally and per client address
+# (0 = unlimited). Over-limit uploads get 503 (server full) or 429 (client over its share) with Retry-After.
+MAX_SCAN_CONNECTIONS = int(os.getenv("MAX_SCAN_CONNECTIONS", "500"))
+MAX_SCAN_CONNECTIONS_PER_CLIENT = int(os.getenv("MAX_SCAN_CONNECTIONS_PER_CLIENT", "10"))
+MAX_UPLOADS = int(os.getenv("MAX_UPLOADS", "64"))
+MAX_UPLOADS_PER_CLIENT = int(os.getenv("MAX_UPLOADS_PER_CLIENT", "8"))
+# Scan sockets opened while this many are open run degraded: one analyzed frame per
+# DEGRADED_FRAME_INTERVAL_MS and the cheapest capture settings (0 = never degrade)
+DEGRADE_SCAN_CONNECTIONS = int(os.getenv("DEGRADE_SCAN_CONNECTIONS", "400"))
+DEGRADED_FRAME_INTERVAL_MS = int(os.getenv("DEGRADED_FRAME_INTERVAL_MS", "1000"))
+# Scan frame and single-image analyses running at once (0 = two per executor worker), how many may wait
+# for a slot, and how long a frame (since it arrived) or upload may wait before it is shed
+ANALYSIS_MAX_INFLIGHT = int(os.getenv("ANALYSIS_MAX_INFLIGHT", "0"))
+ANALYSIS_QUEUE_LIMIT = int(os.getenv("ANALYSIS_QUEUE_LIMIT", "64"))
+ANALYSIS_DEADLINE_MS = int(os.getenv("ANALYSIS_DEADLINE_MS", "2000"))
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+# Batch images and video frames have their own, smaller share of the executor (0 = one per executor worker)
+# so bulk work can't crowd out scan frames; they wait without a deadline, up to the queue limit
+BULK_ANALYSIS_MAX_INFLIGHT = int(os.getenv("BULK_ANALYSIS_MAX_INFLIGHT", "0"))
+BULK_ANALYSIS_QUEUE_LIMIT = int(os.getenv("BULK_ANALYSIS_QUEUE_LIMIT", "1024"))
+
+# Multi-worker mode (python server.py): API_WORKERS uvicorn processes share dashboard fan-out and upload
+# session history through the broker at BROKER_URL (unix:///path or redis://host:port; empty = in-process).
+# With several workers and no BROKER_URL, a stand-in broker is started on a local unix socket.
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+BROKER_URL = os.getenv("BROKER_URL", "")
+# Seconds to wait for a broker reply before an upload carries on with this worker's session history
+BROKER_TIMEOUT = float(os.getenv("BROKER_TIMEOUT", "1"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Dashboard fan-out (/api/ws/dashboard): messages queued per subscriber before it is switched to
+# snapshots of the latest results, and sessions whose latest result is kept for those snapshots
+HUB_QUEUE_SIZE = int(os.getenv("HUB_QUEUE_SIZE", "32"))
+HUB_MAX_SNAPSHOTS = int(os.getenv("HUB_MAX_SNAPSHOTS", "1000"))
+
+# Skip analysis of scan frames that barely differ from the session's last analyzed frame:
+# off | reuse (resend the previous results, marked reused) | suppress (send a small frame_unchanged message)
+FRAME_DEDUP = os.getenv("FRAME_DEDUP", "reuse")
+# Mean absolute difference (gray levels) of downsampled frame/face thumbnails below which a frame is unchanged
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "3.0"))
+# Consecutive frames that may reuse a result before a fresh analysis is forced
+DEDUP_MAX_REUSE = int(os.getenv("DEDUP_MAX_REUSE", "30"))
+
+# Server-driven capture quality for scan clients that opt in ("capture_control" in hello): resolution,
+# JPEG quality and frame interval step down while a session's smoothed frame latency exceeds the target
+ADAPTIVE_CAPTURE = os.getenv("ADAPTIVE_CAPTURE", "true").lower() in ("1", "true", "yes")
+CAPTURE_TARGET_MS = float(os.getenv("CAPTURE_TARGET_MS", "200"))
+CAPTURE_START_LEVEL = int(os.getenv("CAPTURE_START_LEVEL", "2"))
+
+# Analyses of uploaded images cached by content hash, so re-sent images skip decoding and detection
+# (entries, 0 = off; seconds). Ids, timestamps and history-dependent metrics are recomputed on every hit.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+# /api/analyze/image responses kept per worker for retries carrying the same Idempotency-Key header
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+
+# Opt-in recording of scan sessions for replay (python -m benchmarks.replay): when set, each session's incoming
+# frames and arrival times are written to <session_id>.scanrec in this directory, up to the size cap (MB).
+# Writes happen on a thread per recorded session, but queued frames are held in memory until written
+SCAN_RECORDING_DIR = os.getenv("SCAN_RECORDING_DIR", "")
+SCAN_RECORDING_MAX_MB = int(os.getenv("SCAN_RECORDING_MAX_MB", "256"))
+
+# Seed for the simulated metrics' noise (empty = unseeded), e.g. for reproducible replays
+ANALYSIS_SEED = int(os.getenv("ANALYSIS_SEED")) if os.getenv("ANALYSIS_SEED") else None
+
+# Haar cascade for face detection: FACE_CASCADE_PATH, else the copy next to this module, else OpenCV's bundled one
+FACE_CASCADE_PATH = os.getenv("FACE_CASCADE_PATH", "")
+FACE_CASCADE_FILE = "haarcascade_frontalface_default.xml"
+
+# Faces are detected on a grayscale copy downscaled to at most this many pixels per side (0 = full resolution)
+DETECTION_MAX_DIM = int(os.getenv("DETECTION_MAX_DIM", "960"))
+# Decode large JPEGs straight to reduced-size grayscale and only decode color when faces are found
+REDUCED_DECODE = os.getenv("REDUCED_DECODE", "true").lower() in ("1", "true", "yes")
+
+# Fraction of responses that carry a per-stage timing breakdown (clients can also ask for one explicitly)
+TIMING_SAMPLE_RATE = float(os.getenv("TIMING_SAMPLE_RATE", "0"))
+
+# /api/analyze/batch limits: images per request (zip members included) and bytes per image
+BATCH_MAX_IMAGES = int(os.getenv("BATCH_MAX_IMAGES", "200"))
+BATCH_MAX_IMAGE_BYTES = int(os.getenv("BATCH_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+BATCH_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp')
+
+# /api/analyze/video: frames analyzed per second of video (0 = every frame), analyzed frame and upload size caps
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "3600"))
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(500 * 1024 * 1024)))
 
 @dataclass
 class HealthResult:
@@ -56,41 +204,118 @@ class HealthResult:
     face_coordinates: Optional[Tuple[int, int, int, int]] = None
     recommendations: List[str] = None
 
+def emotion_score_row(scores: Dict[str, float]) -> np.ndarray:
+    """Emotion scores keyed like simulate_emotion_analysis output, as a row indexed by emotion code"""
+    row = np.zeros(len(EMOTIONS))
+    for emotion, score in scores.items():
+        row[EMOTION_CODES[emotion.lower()]] = score
+    return row
+
+# simulate_emotion_analysis brightness bands as lookup tables for batches: bright, dark, other, empty region
+EMOTION_BANDS = np.array([EMOTION_CODES['happy'], EMOTION_CODES['sad'], EMOTION_CODES['neutral'], EMOTION_CODES['neutral']])
+EMOTION_BAND_SCORES = np.stack([
+    emotion_score_row({'Happy': 75, 'Neutral': 15, 'Surprise': 10}),
+    emotion_score_row({'Sad': 70, 'Neutral': 20, 'Fear': 10}),
+    emotion_score_row({'Neutral': 60, 'Happy': 25, 'Sad': 15}),
+    emotion_score_row({}),
+])
+
+def resolve_cascade_path(configured: str = FACE_CASCADE_PATH) -> str:
+    """Locate the face cascade on disk (never downloads)"""
+    if configured:
+        if not os.path.exists(configured):
+            raise RuntimeError(f"Face cascade not found at FACE_CASCADE_PATH={configured}")
+        return configured
+    
+    bundled = os.path.join(os.path.dirname(os.path.abspath(__file__)), FACE_CASCADE_FILE)
+    if os.path.exists(bundled):
+        return bundled
+    
+    import cv2
+    opencv_data = os.path.join(cv2.data.haarcascades, FACE_CASCADE_FILE)
+    if os.path.exists(opencv_data):
+        return opencv_data
+    raise RuntimeError(f"{FACE_CASCADE_FILE} not found; set FACE_CASCADE_PATH")
+
 class LocalHealthAnalyzer:
-    def __init__(self):
-        self.emotion_history = deque(maxlen=50)
+    def __init__(self, executor: Optional[AnalysisExecutor] = None, detection_max_dim: int = DETECTION_MAX_DIM,
+                 cascade_path: Optional[str] = None, frame_ring: Optional[SharedFrameRing] = None,
+                 result_cache: Optional[TTLCache] = None, seed: Optional[int] = None):
+        self.executor = executor or AnalysisExecutor("inline")
+        # Noise of the simulated glucose metric; seeded, results depend only on the frames analyzed
+        self.rng = np.random.default_rng(seed)
+        self.frame_ring = frame_ring
+        self.result_cache = result_cache
+        self.detection_max_dim = detection_max_dim
         self.stress_emotions = ['angry', 'fear', 'sad', 'disgust']
+        self.stress_mask = emotion_mask(self.stress_emotions)
         self.anxiety_keywords = ['fear', 'surprise', 'angry']
+        self.anxiety_mask = emotion_mask(self.anxiety_keywords)
         self.depression_keywords = ['sad', 'fear', 'disgust']
+        self.depression_mask = emotion_mask(self.depression_keywords)
         
-        # Initialize face cascade
-        cascade_path = '/app/backend/haarcascade_frontalface_default.xml'
-        if not os.path.exists(cascade_path):
-            # Download if not exists
-            import requests
-            url = "https://raw.githubusercontent.com/opencv/opencv/master/data/haarcascades/haarcascade_frontalface_default.xml"
-            response = requests.get(url)
-            with open(cascade_path, 'wb') as f:
-                f.write(response.content)
-        
-        self.face_cascade = cv2.CascadeClassifier(cascade_path)
-        logger.info("Local Health Analyzer initialized")
-
-    def detect_faces(self, frame: np.ndarray) -> List[Tuple[int, int, int, int]]:
-        """Detect faces in the frame"""
+        # The cascade (and OpenCV itself) is loaded lazily by each worker thread, see warm_up()
+        self.cascade_path = cascade_path or resolve_cascade_path()
+        # CascadeClassifier is not safe to share between threads, keep one per worker thread
+        self._local = threading.local()
+        logger.info(f"Local Health Analyzer initialized (cascade {self.cascade_path})")
+
+    @property
+    def face_cascade(self) -> "cv2.CascadeClassifier":
+        cascade = getattr(self._local, "face_cascade", None)
+        if cascade is None:
+            import cv2
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            if cascade.empty():
+                raise RuntimeError(f"Could not load face cascade from {self.cascade_path}")
+            self._local.face_cascade = cascade
+        return cascade
+
+    def warm_up(self, barrier: Optional[Any] = None) -> float:
+        """Load the calling thread's cascade and run one detection; returns the time taken in ms
+
+        With a barrier, the worker then waits for the other workers, so that
+        one warm-up job per worker lands on every worker exactly once.
+        """
+        started = time.perf_counter()
+        self.face_cascade
+        self._detect_multiscale(np.zeros((64, 64), dtype=np.uint8))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if barrier is not None:
+            barrier.wait(WORKER_WARM_UP_TIMEOUT)
+        return elapsed_ms
+
+    def detect_faces(self, frame: np.ndarray,
+                     search_regions: Optional[List[Tuple[int, int, int, int]]] = None) -> List[Tuple[int, int, int, int]]:
+        """Detect faces in the frame (BGR or grayscale), optionally only inside search_regions"""
+        import cv2
         try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = self.face_cascade.detectMultiScale(
-                gray, 
-                scaleFactor=1.1, 
-                minNeighbors=5, 
-                minSize=(30, 30)
-            )
-            return [(x, y, w, h) for x, y, w, h in faces]
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+            if search_regions is None:
+                return self._detect_multiscale(gray)
+            
+            faces = []
+            for rx, ry, rw, rh in search_regions:
+                for x, y, w, h in self._detect_multiscale(gray[ry:ry+rh, rx:rx+rw]):
+                    box = (rx + x, ry + y, w, h)
+                    # Padded regions of nearby faces can overlap, keep one box per face
+                    center_x, center_y = box[0] + w // 2, box[1] + h // 2
+                    if not any(fx <= center_x < fx + fw and fy <= center_y < fy + fh for fx, fy, fw, fh in faces):
+                        faces.append(box)
+            return faces
         except Exception as e:
             logger.error(f"Face detection error: {e}")
             return []
 
+    def _detect_multiscale(self, gray: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        faces = self.face_cascade.detectMultiScale(
+            gray, 
+            scaleFactor=1.1, 
+            minNeighbors=5, 
+            minSize=(30, 30)
+        )
+        return [(int(x), int(y), int(w), int(h)) for x, y, w, h in faces]
+
     def simulate_emotion_analysis(self, face_region: np.ndarray) -> Dict[str, Any]:
         """Simulate emotion analysis (replace with actual DeepFace when installed)"""
         try:
@@ -127,8 +352,9 @@ class LocalHealthAnalyzer:
             logger.error(f"Emotion analysis error: {e}")
             return {"dominant_emotion": "neutral", "emotion_scores": {}, "confidence": 0.0}
 
-    def calculate_health_metrics(self, emotion_data: Dict[str, Any]) -> Dict[str, float]:
-        """Calculate health metrics from emotion data"""
+    def calculate_health_metrics(self, emotion_data: Dict[str, Any],
+                                 emotion_history: Optional[EmotionRing] = None) -> Dict[str, float]:
+        """Calculate health metrics from emotion data and the session's emotion history"""
         current_emotion = emotion_data.get('dominant_emotion', 'neutral')
         emotion_scores = emotion_data.get('emotion_scores', {})
         confidence = emotion_data.get('confidence', 0.0)
@@ -140,9 +366,9 @@ class LocalHealthAnalyzer:
                 stress_score += emotion_scores[emotion.title()] * 0.01
         
         # Add historical pattern analysis
-        if len(self.emotion_history) >= 5:
-            recent_emotions = list(self.emotion_history)[-5:]
-            stress_count = sum(1 for e in recent_emotions if e in self.stress_emotions)
+        if emotion_history is not None and len(emotion_history) >= 5:
+            recent_emotions = emotion_history.recent(5)
+            stress_count = int(self.stress_mask[recent_emotions].sum())
             stress_score += (stress_count / len(recent_emotions)) * 0.5
         
         stress_level = min(stress_score, 1.0)
@@ -169,7 +395,7 @@ class LocalHealthAnalyzer:
         # Based on stress and other factors
         base_glucose = 90  # Normal fasting glucose
         stress_impact = stress_level * 30  # Stress can raise glucose
-        glucose_simulation = base_glucose + stress_impact + np.random.normal(0, 5)
+        glucose_simulation = base_glucose + stress_impact + self.rng.normal(0, 5)
         glucose_simulation = max(70, min(200, glucose_simulation))  # Realistic range
         
         return {
@@ -205,22 +431,192 @@ class LocalHealthAnalyzer:
         
         return recommendations
 
-    async def analyze_frame(self, frame: np.ndarray) -> List[HealthResult]:
-        """Analyze frame for health indicators"""
-        results = []
-        faces = self.detect_faces(frame)
+    def simulate_emotion_analysis_batch(self, brightness: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized simulate_emotion_analysis over the mean brightness of many faces
+
+        Returns emotion codes, confidences and an (n, len(EMOTIONS)) score matrix.
+        NaN brightness marks an empty face region.
+        """
+        empty = np.isnan(brightness)
+        band = np.where(brightness > 150, 0, np.where(brightness < 80, 1, 2))
+        band[empty] = 3
+        confidence = np.where(empty, 0.5, np.clip(brightness / 255.0, 0.3, 0.9))
+        return EMOTION_BANDS[band], confidence, EMOTION_BAND_SCORES[band]
+
+    def calculate_health_metrics_batch(self, codes: np.ndarray, scores: np.ndarray) -> Dict[str, np.ndarray]:
+        """Vectorized calculate_health_metrics for faces without emotion history"""
+        score = lambda emotion: scores[:, EMOTION_CODES[emotion]]
         
-        for x, y, w, h in faces:
-            face_region = frame[y:y+h, x:x+w]
-            
-            # Analyze emotion
-            emotion_data = self.simulate_emotion_analysis(face_region)
+        stress_level = np.minimum((scores[:, self.stress_mask] * 0.01).sum(axis=1), 1.0)
+        
+        anxiety_score = (0.3 * self.anxiety_mask[codes] + 0.4 * (score('fear') > 40)
+                         + 0.3 * (stress_level > 0.7))
+        
+        depression_score = (0.3 * self.depression_mask[codes] + 0.5 * (score('sad') > 50)
+                            + 0.2 * ((score('happy') < 10) & (score('neutral') < 30)))
+        
+        glucose_simulation = 90 + stress_level * 30 + self.rng.normal(0, 5, len(codes))
+        glucose_simulation = np.round(np.clip(glucose_simulation, 70, 200), 1)
+        
+        return {
+            'stress_level': stress_level,
+            'anxiety_score': np.minimum(anxiety_score, 1.0),
+            'depression_score': np.minimum(depression_score, 1.0),
+            'glucose_simulation': glucose_simulation
+        }
+
+    def generate_recommendations_batch(self, health_metrics: Dict[str, np.ndarray],
+                                       codes: np.ndarray) -> List[List[str]]:
+        """generate_recommendations for many faces
+        
+        Recommendations only depend on which thresholds a face crosses, so
+        faces are grouped by that pattern and each pattern is rendered once.
+        """
+        glucose = health_metrics['glucose_simulation']
+        rules = np.stack([
+            health_metrics['stress_level'] > 0.6,
+            health_metrics['anxiety_score'] > 0.5,
+            health_metrics['depression_score'] > 0.5,
+            glucose > 140,
+            glucose < 80,
+            codes == EMOTION_CODES['happy'],
+        ], axis=1)
+        patterns = rules @ (1 << np.arange(rules.shape[1]))
+        rendered = {}
+        for pattern, first in zip(*np.unique(patterns, return_index=True)):
+            metrics = {name: float(values[first]) for name, values in health_metrics.items()}
+            rendered[pattern] = self.generate_recommendations(metrics, EMOTIONS[codes[first]])
+        return [list(rendered[pattern]) for pattern in patterns]
+
+    def extract_face_features(self, frame: np.ndarray,
+                              search_regions: Optional[List[Region]] = None,
+                              detection_max_dim: Optional[int] = None,
+                              change_check: Optional[ChangeCheck] = None) -> Dict[str, Any]:
+        """Detect faces and run per-face emotion analysis on a BGR frame (stateless, safe to run on workers)"""
+        import cv2
+        started = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        timings = {"image_decode": (time.perf_counter() - started) * 1000}
+        return self._extract_face_features(gray, frame.shape[:2], lambda: frame, search_regions,
+                                           detection_max_dim, started, timings, change_check=change_check)
+
+    def extract_face_features_from_bytes(self, data: bytes,
+                                         search_regions: Optional[List[Region]] = None,
+                                         detection_max_dim: Optional[int] = None,
+                                         emotions: bool = True,
+                                         change_check: Optional[ChangeCheck] = None) -> Dict[str, Any]:
+        """Decode an encoded image and run face detection and emotion analysis on it
+
+        Large JPEGs are decoded straight to reduced-size grayscale for detection;
+        the full-resolution color image is only decoded when there are faces to crop.
+        With emotions=False only each face's mean brightness is returned, for
+        batches that run emotion analysis vectorized over all their faces.
+        """
+        started = time.perf_counter()
+        if detection_max_dim is None:
+            detection_max_dim = self.detection_max_dim
+        image = DecodedImage(data, detection_max_dim if REDUCED_DECODE else 0)
+        timings = {"image_decode": (time.perf_counter() - started) * 1000}
+        analysis = self._extract_face_features(image.gray, image.shape, image.color, search_regions,
+                                               detection_max_dim, started, timings, emotions, change_check)
+        if not analysis.get("unchanged"):
+            analysis["detection"]["decode_reduction"] = image.reduction
+        return analysis
+
+    def _extract_face_features(self, gray: np.ndarray, frame_shape: Tuple[int, int],
+                               get_frame: Callable[[], np.ndarray],
+                               search_regions: Optional[List[Region]],
+                               detection_max_dim: Optional[int], started: float,
+                               timings: Dict[str, float], emotions: bool = True,
+                               change_check: Optional[ChangeCheck] = None) -> Dict[str, Any]:
+        """Shared detection/analysis step
+
+        Detection runs on a grayscale image downscaled to detection_max_dim; boxes
+        are mapped back so face crops still come from the full-resolution frame.
+        Stage durations (ms) are added to timings and returned with the analysis.
+        With a change_check, frames too similar to the reference return early as
+        unchanged, and analyzed frames return a signature to compare the next against.
+        """
+        import cv2
+        if detection_max_dim is None:
+            detection_max_dim = self.detection_max_dim
+        frame_h, frame_w = frame_shape
+        target_scale = detection_scale(frame_shape, detection_max_dim)
+        target_w = max(1, int(round(frame_w * target_scale)))
+        target_h = max(1, int(round(frame_h * target_scale)))
+        if gray.shape[1] > target_w:
+            gray = cv2.resize(gray, (target_w, target_h), interpolation=cv2.INTER_AREA)
+        # The gray image may already be reduced by the decoder
+        scale = gray.shape[1] / frame_w
+        
+        if change_check is not None:
+            check_started = time.perf_counter()
+            unchanged = is_unchanged(gray, change_check)
+            timings["change_check"] = (time.perf_counter() - check_started) * 1000
+            if unchanged:
+                return {"unchanged": True, "timings": timings}
+        
+        detect_started = time.perf_counter()
+        full_detection = search_regions is None
+        if not full_detection:
+            search_regions = [region_to_box(region, gray.shape[1], gray.shape[0]) for region in search_regions]
+        faces = self.detect_faces(gray, search_regions)
+        
+        if not full_detection and len(faces) < len(search_regions):
+            # Track lost, fall back to full-frame detection on this frame
+            faces = self.detect_faces(gray)
+            full_detection = True
+        
+        if scale != 1.0:
+            faces = [clip_box(scale_box(face, 1.0 / scale), frame_w, frame_h) for face in faces]
+        timings["detect_faces"] = (time.perf_counter() - detect_started) * 1000
+        detection = {
+            "full_detection": full_detection,
+            "scale": round(scale, 4),
+            "width": gray.shape[1],
+            "height": gray.shape[0],
+            "time_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+        
+        observations = []
+        if faces:
+            decode_started = time.perf_counter()
+            frame = get_frame()
+            emotion_started = time.perf_counter()
+            timings["image_decode"] += (emotion_started - decode_started) * 1000
+            for x, y, w, h in faces:
+                face_region = frame[y:y+h, x:x+w]
+                if not emotions:
+                    brightness = float(np.mean(face_region)) if face_region.size else float("nan")
+                    observations.append({"face_coordinates": (x, y, w, h), "brightness": brightness})
+                    continue
+                observations.append({
+                    "face_coordinates": (x, y, w, h),
+                    "emotion_data": self.simulate_emotion_analysis(face_region)
+                })
+            timings["emotion_analysis"] = (time.perf_counter() - emotion_started) * 1000
+        analysis = {"observations": observations, "detection": detection, "frame_shape": (frame_h, frame_w),
+                    "timings": timings}
+        if change_check is not None:
+            check_started = time.perf_counter()
+            analysis["signature"], analysis["signature_regions"] = reference_signature(gray, faces, (frame_h, frame_w))
+            timings["change_check"] += (time.perf_counter() - check_started) * 1000
+        return analysis
+
+    def build_results(self, observations: List[Dict[str, Any]],
+                      session: Optional[SessionState] = None) -> List[HealthResult]:
+        """Turn face observations into health results, updating the session's emotion history"""
+        emotion_history = session.emotions if session is not None else None
+        results = []
+        for observation in observations:
+            emotion_data = observation['emotion_data']
             
             # Update emotion history
-            self.emotion_history.append(emotion_data['dominant_emotion'])
+            if emotion_history is not None:
+                emotion_history.append(emotion_data['dominant_emotion'])
             
             # Calculate health metrics
-            health_metrics = self.calculate_health_metrics(emotion_data)
+            health_metrics = self.calculate_health_metrics(emotion_data, emotion_history)
             
             # Generate recommendations
             recommendations = self.generate_recommendations(health_metrics, emotion_data['dominant_emotion'])
@@ -234,7 +630,7 @@ class LocalHealthAnalyzer:
                 depression_score=health_metrics['depression_score'],
                 glucose_simulation=health_metrics['glucose_simulation'],
                 timestamp=time.time(),
-                face_coordinates=(x, y, w, h),
+                face_coordinates=observation['face_coordinates'],
                 recommendations=recommendations
             )
             
@@ -242,129 +638,1307 @@ class LocalHealthAnalyzer:
         
         return results
 
-# Global analyzer instance
-analyzer = LocalHealthAnalyzer()
+    def build_results_batch(self, observations: List[Dict[str, Any]]) -> List[HealthResult]:
+        """Health results for brightness-only observations, computed for all faces at once"""
+        if not observations:
+            return []
+        brightness = np.array([observation['brightness'] for observation in observations])
+        codes, confidence, scores = self.simulate_emotion_analysis_batch(brightness)
+        health_metrics = self.calculate_health_metrics_batch(codes, scores)
+        recommendations = self.generate_recommendations_batch(health_metrics, codes)
+        
+        columns = {name: values.tolist() for name, values in health_metrics.items()}
+        confidence = confidence.tolist()
+        timestamp = time.time()
+        return [
+            HealthResult(
+                id=str(uuid.uuid4()),
+                emotion=EMOTIONS[code],
+                confidence=confidence[i],
+                stress_level=columns['stress_level'][i],
+                anxiety_score=columns['anxiety_score'][i],
+                depression_score=columns['depression_score'][i],
+                glucose_simulation=columns['glucose_simulation'][i],
+                timestamp=timestamp,
+                face_coordinates=observation['face_coordinates'],
+                recommendations=recommendations[i]
+            )
+            for i, (code, observation) in enumerate(zip(codes.tolist(), observations))
+        ]
+
+    async def analyze_batch(self, images: List[bytes], detection_max_dim: Optional[int] = None,
+                            gate: Optional[AnalysisGate] = None) -> List[Any]:
+        """Analyze many independent images: per image, a list of results or the exception it raised
+
+        Decoding and detection run on the executor in parallel, each image
+        holding a slot from gate while it does; emotion analysis, metrics and
+        recommendations then run once, vectorized over every face.
+        """
+        # Keep a bounded number of images in flight so big batches don't queue all their bytes at once
+        limit = asyncio.Semaphore(self.executor.max_workers * 2)
+        
+        async def extract(data: bytes) -> Dict[str, Any]:
+            async with limit:
+                if gate is not None:
+                    await gate.acquire()
+                try:
+                    if self.executor.mode == "process":
+                        return await self.executor.run(_extract_face_features_from_bytes_job, data, None,
+                                                       detection_max_dim, False)
+                    return await self.executor.run(self.extract_face_features_from_bytes, data, None,
+                                                   detection_max_dim, False)
+                finally:
+                    if gate is not None:
+                        gate.release()
+        
+        analyses = await asyncio.gather(*(extract(data) for data in images), return_exceptions=True)
+        observations = [o for a in analyses if not isinstance(a, Exception) for o in a["observations"]]
+        results = iter(self.build_results_batch(observations))
+        return [
+            analysis if isinstance(analysis, Exception)
+            else [next(results) for _ in analysis["observations"]]
+            for analysis in analyses
+        ]
+
+    async def analyze(self, frame: np.ndarray, session: Optional[SessionState] = None,
+                      detection_max_dim: Optional[int] = None, timer: Optional[StageTimer] = None,
+                      gate: Optional[AnalysisGate] = None) -> Tuple[List[HealthResult], Dict[str, Any]]:
+        """Analyze frame for health indicators, also returning detection details
+
+        Emotion history and face tracking come from the session, if any. With a
+        tracker, detection is limited to the regions around the faces found in
+        the session's previous frame. Stage durations are recorded on timer.
+        The executor work holds a slot from gate, if given.
+        """
+        search_regions, change_check = self._session_args(session)
+        
+        # Detection and emotion analysis run on the executor; history-dependent
+        # metrics stay on the event loop, which owns all session state
+        started = time.perf_counter()
+        if gate is not None:
+            await gate.acquire()
+            if timer is not None:
+                timer.add("admission_wait", (time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+        try:
+            if self.executor.mode == "process":
+                analysis = await self._run_in_process(frame, search_regions, detection_max_dim, change_check)
+            else:
+                analysis = await self.executor.run(self.extract_face_features, frame, search_regions,
+                                                   detection_max_dim, change_check)
+        finally:
+            if gate is not None:
+                gate.release()
+        return self._finish_analysis(analysis, session, timer, started)
+
+    async def analyze_image_bytes(self, data: bytes, session: Optional[SessionState] = None,
+                                  detection_max_dim: Optional[int] = None,
+                                  timer: Optional[StageTimer] = None, gate: Optional[AnalysisGate] = None,
+                                  deadline: Optional[float] = None) -> Tuple[List[HealthResult], Dict[str, Any]]:
+        """Decode and analyze an encoded image; decoding happens on the executor as well
+
+        With a result cache, images analyzed before (same bytes and detection
+        size) reuse their detection boxes and emotion features without waiting
+        for the gate; only health metrics and recommendations are recomputed.
+        Sessions that track faces or check for unchanged frames bypass the
+        cache, since their analysis depends on the previous frame. Otherwise
+        a slot is taken from gate, waiting at most deadline seconds.
+        """
+        search_regions, change_check = self._session_args(session)
+        
+        started = time.perf_counter()
+        cache_key = None
+        if self.result_cache is not None and search_regions is None and change_check is None:
+            cache_key = content_key(data, self.detection_max_dim if detection_max_dim is None else detection_max_dim)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                analysis = dict(cached, detection=dict(cached["detection"], cached=True),
+                                timings={"cache_lookup": (time.perf_counter() - started) * 1000})
+                return self._finish_analysis(analysis, session, timer, started)
+        
+        if gate is not None:
+            await gate.acquire(deadline)
+            if timer is not None:
+                timer.add("admission_wait", (time.perf_counter() - started) * 1000)
+            started = time.perf_counter()
+        try:
+            if self.executor.mode == "process":
+                analysis = await self.executor.run(_extract_face_features_from_bytes_job, data, search_regions,
+                                                   detection_max_dim, True, change_check)
+            else:
+                analysis = await self.executor.run(self.extract_face_features_from_bytes, data, search_regions,
+                                                   detection_max_dim, True, change_check)
+        finally:
+            if gate is not None:
+                gate.release()
+        if cache_key is not None:
+            analysis["detection"]["cached"] = False
+            self.result_cache.put(cache_key, dict(analysis, detection=dict(analysis["detection"])))
+        return self._finish_analysis(analysis, session, timer, started)
+
+    async def _run_in_process(self, frame: np.ndarray, search_regions: Optional[List[Region]],
+                              detection_max_dim: Optional[int], change_check: Optional[ChangeCheck]) -> Dict[str, Any]:
+        """Send a frame to a process worker through the shared ring when it fits, pickled otherwise"""
+        ring = self.frame_ring
+        if ring is None or not ring.fits(frame):
+            if ring is not None:
+                ring.oversized += 1
+            return await self.executor.run(_extract_face_features_job, frame, search_regions, detection_max_dim,
+                                           change_check)
+        
+        slot, ref = await ring.put(frame)
+        job = asyncio.ensure_future(self.executor.run(_extract_shared_frame_job, ref, search_regions,
+                                                      detection_max_dim, change_check))
+        # Recycle the slot only once the worker is done with it, even if we stop waiting
+        job.add_done_callback(lambda _: ring.release(slot))
+        return await asyncio.shield(job)
+
+    def _session_args(self, session: Optional[SessionState]) -> Tuple[Optional[List[Region]], Optional[ChangeCheck]]:
+        """Tracker search regions and change check for the session's next frame"""
+        if session is None:
+            return None, None
+        search_regions = session.tracker.search_regions() if session.tracker is not None else None
+        change_check = session.changes.check_args() if session.changes is not None else None
+        return search_regions, change_check
+
+    def _finish_analysis(self, analysis: Dict[str, Any], session: Optional[SessionState],
+                         timer: Optional[StageTimer], started: float) -> Tuple[List[HealthResult], Dict[str, Any]]:
+        """Apply a worker's analysis to the session
+
+        Unchanged frames reuse the session's previous results; their detection
+        details are the previous ones marked reused=True.
+        """
+        if timer is not None:
+            # Whatever the worker didn't spend computing was spent queued or shipping data to it
+            worker_ms = sum(analysis["timings"].values())
+            timer.merge(analysis["timings"])
+            timer.add("executor_wait", max(0.0, (time.perf_counter() - started) * 1000 - worker_ms))
+        changes = session.changes if session is not None else None
+        if analysis.get("unchanged"):
+            changes.record_reused()
+            return changes.results, dict(changes.detection, reused=True)
+        
+        observations = analysis["observations"]
+        detection = analysis["detection"]
+        if session is not None and session.tracker is not None:
+            session.tracker.update([o["face_coordinates"] for o in observations], detection["full_detection"],
+                                   analysis["frame_shape"])
+        metrics_started = time.perf_counter()
+        results = self.build_results(observations, session)
+        if timer is not None:
+            timer.add("health_metrics", (time.perf_counter() - metrics_started) * 1000)
+        if changes is not None:
+            detection["reused"] = False
+            changes.record_analyzed(analysis["signature"], analysis["signature_regions"], results, detection)
+        return results, detection
+
+# Process pool workers each hold their own analyzer
+_process_analyzer: Optional[LocalHealthAnalyzer] = None
+# Shared with the workers when they start (synchronization primitives can't be sent with a job)
+_process_warm_up_barrier: Optional[Any] = None
+
+# Seconds a warmed worker waits for the others before warm-up is declared failed
+WORKER_WARM_UP_TIMEOUT = 60.0
+
+def _init_process_worker(warm_up_barrier: Optional[Any] = None):
+    global _process_analyzer, _process_warm_up_barrier
+    _process_analyzer = LocalHealthAnalyzer()
+    _process_warm_up_barrier = warm_up_barrier
+
+def _warm_up_job() -> float:
+    return _process_analyzer.warm_up(_process_warm_up_barrier)
+
+def _extract_face_features_job(frame: np.ndarray,
+                               search_regions: Optional[List[Region]] = None,
+                               detection_max_dim: Optional[int] = None,
+                               change_check: Optional[ChangeCheck] = None) -> Dict[str, Any]:
+    return _process_analyzer.extract_face_features(frame, search_regions, detection_max_dim, change_check)
+
+def _extract_shared_frame_job(ref: FrameRef,
+                              search_regions: Optional[List[Region]] = None,
+                              detection_max_dim: Optional[int] = None,
+                              change_check: Optional[ChangeCheck] = None) -> Dict[str, Any]:
+    return _process_analyzer.extract_face_features(attach_frame(ref), search_regions, detection_max_dim, change_check)
+
+def _extract_face_features_from_bytes_job(data: bytes,
+                                          search_regions: Optional[List[Region]] = None,
+                                          detection_max_dim: Optional[int] = None,
+                                          emotions: bool = True,
+                                          change_check: Optional[ChangeCheck] = None) -> Dict[str, Any]:
+    return _process_analyzer.extract_face_features_from_bytes(data, search_regions, detection_max_dim, emotions,
+                                                              change_check)
+
+def detection_scale(shape: Tuple[int, ...], max_dim: int) -> float:
+    """Downscale factor that fits the longest side of an image into max_dim (never upscales)"""
+    longest = max(shape[:2])
+    if max_dim <= 0 or longest <= max_dim:
+        return 1.0
+    return max_dim / longest
+
+def scale_box(box: Tuple[int, int, int, int], factor: float) -> Tuple[int, int, int, int]:
+    x, y, w, h = box
+    return (int(round(x * factor)), int(round(y * factor)), int(round(w * factor)), int(round(h * factor)))
+
+def clip_box(box: Tuple[int, int, int, int], width: int, height: int) -> Tuple[int, int, int, int]:
+    x, y, w, h = box
+    x, y = max(0, min(x, width - 1)), max(0, min(y, height - 1))
+    return (x, y, min(w, width - x), min(h, height - y))
+
+# Prometheus metrics, served at /api/metrics
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.histogram("health_tracker_stage_seconds", "Time spent in each analysis pipeline stage", ["stage"])
+REQUEST_SECONDS = metrics.histogram("health_tracker_request_seconds", "End-to-end frame/upload handling time", ["endpoint"])
+FACES_PER_FRAME = metrics.histogram("health_tracker_faces_per_frame", "Faces detected per analyzed frame",
+                                    ["endpoint"], buckets=(0, 1, 2, 3, 5, 10))
+FRAMES = metrics.counter("health_tracker_frames_total", "Frames and uploads by outcome", ["endpoint", "outcome"])
+SHED = metrics.counter("health_tracker_shed_total", "Connections, uploads and frames refused by admission control",
+                       ["endpoint", "reason"])
+CAPTURE_ADJUSTMENTS = metrics.counter("health_tracker_capture_adjustments_total",
+                                      "Capture settings changes sent to scan clients", ["reason"])
+metrics.gauge("health_tracker_active_connections", "Open scan WebSocket connections",
+              lambda: len(manager.active_connections))
+metrics.gauge("health_tracker_dashboard_subscribers", "Open dashboard WebSocket connections",
+              lambda: hub.subscribers)
+metrics.gauge("health_tracker_sessions", "Scan sessions with analysis state", lambda: len(sessions))
+metrics.gauge("health_tracker_executor_queue_depth", "Analysis jobs waiting for a worker", lambda: executor.queue_depth)
+metrics.gauge("health_tracker_write_buffer_depth", "Readings waiting to be persisted", lambda: readings_buffer.depth)
+metrics.gauge("health_tracker_ready", "1 once the analyzer and its workers are warm", lambda: int(readiness["ready"]))
+metrics.gauge("health_tracker_warm_up_seconds", "Time from startup until the analyzer was warm",
+              lambda: (readiness["warm_up_ms"] or 0) / 1000)
+
+def observe_frame(endpoint: str, timer: StageTimer, faces: int, outcome: str = "processed"):
+    """Record a successfully handled frame's stage timings and face count"""
+    for stage, ms in timer.stages.items():
+        STAGE_SECONDS.observe(ms / 1000, stage=stage)
+    REQUEST_SECONDS.observe(timer.total_ms() / 1000, endpoint=endpoint)
+    FACES_PER_FRAME.observe(faces, endpoint=endpoint)
+    FRAMES.inc(endpoint=endpoint, outcome=outcome)
+
+def wants_timings(requested: bool = False) -> bool:
+    """Whether a response should carry its timing breakdown: on request, or sampled"""
+    return requested or (TIMING_SAMPLE_RATE > 0 and random.random() < TIMING_SAMPLE_RATE)
+
+# Global executor and analyzer instances; the analyzer is built and warmed after startup (see warm_up_analyzer)
+executor = AnalysisExecutor(ANALYSIS_EXECUTOR, max_workers=ANALYSIS_WORKERS)
+if executor.mode == "process":
+    executor.initializer = _init_process_worker
+    executor.initargs = (multiprocessing.Barrier(executor.max_workers),)
+frame_ring = SharedFrameRing(
+    FRAME_RING_SLOTS or 2 * executor.max_workers,
+    FRAME_RING_SLOT_MB * 1024 * 1024
+) if executor.mode == "process" else None
+analyzer: Optional[LocalHealthAnalyzer] = None
+analysis_gate = AnalysisGate(ANALYSIS_MAX_INFLIGHT or 2 * executor.max_workers, ANALYSIS_QUEUE_LIMIT,
+                             ADMISSION_RETRY_AFTER)
+bulk_gate = AnalysisGate(BULK_ANALYSIS_MAX_INFLIGHT or executor.max_workers, BULK_ANALYSIS_QUEUE_LIMIT,
+                         ADMISSION_RETRY_AFTER)
+scan_limit = ConcurrencyLimit("scan sessions", MAX_SCAN_CONNECTIONS, MAX_SCAN_CONNECTIONS_PER_CLIENT,
+                              ADMISSION_RETRY_AFTER)
+upload_limit = ConcurrencyLimit("uploads", MAX_UPLOADS, MAX_UPLOADS_PER_CLIENT, ADMISSION_RETRY_AFTER)
+result_cache = TTLCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+idempotent_responses = IdempotentResponses(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL)
+warm_up_task: Optional[asyncio.Task] = None
+readiness: Dict[str, Any] = {"ready": False, "warm_up_ms": None, "worker_warm_up_ms": [], "error": None}
+
+app.add_middleware(
+    UploadAdmissionMiddleware,
+    limit=upload_limit,
+    paths=["/api/analyze/image", "/api/analyze/batch", "/api/analyze/video"],
+    on_shed=lambda path, reason: SHED.inc(endpoint=path.rsplit("/", 1)[-1], reason=reason)
+)
+
+# Configure CORS (added last so it wraps everything, including admission rejections)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+def require_analyzer() -> LocalHealthAnalyzer:
+    if analyzer is None:
+        raise HTTPException(status_code=503, detail="Analyzer is warming up", headers={"Retry-After": "1"})
+    return analyzer
+
+rollups = RollupStore(store)
+
+readings_buffer = WriteBehindBuffer(
+    store,
+    mode=PERSISTENCE_MODE,
+    batch_size=PERSISTENCE_BATCH_SIZE,
+    flush_interval=PERSISTENCE_FLUSH_INTERVAL_MS / 1000,
+    max_buffer=PERSISTENCE_MAX_BUFFER,
+    on_flush=rollups.apply,
+    observe_flush=lambda seconds: STAGE_SECONDS.observe(seconds, stage="persist_flush")
+)
+
+def new_change_detector() -> Optional[FrameChangeDetector]:
+    return FrameChangeDetector(DEDUP_THRESHOLD, DEDUP_MAX_REUSE) if FRAME_DEDUP != "off" else None
+
+def start_recording(session: SessionState) -> Optional[SessionRecorder]:
+    """Recorder for a scan session's frames, with the settings a replay needs to reproduce its analysis"""
+    metadata = {
+        "session_id": session.session_id,
+        "worker": WORKER_ID,
+        "started_at": time.time(),
+        "settings": {
+            "FRAME_DEDUP": FRAME_DEDUP,
+            "DEDUP_THRESHOLD": DEDUP_THRESHOLD,
+            "DEDUP_MAX_REUSE": DEDUP_MAX_REUSE,
+            "FACE_TRACKING": FACE_TRACKING,
+            "FACE_REDETECT_INTERVAL": FACE_REDETECT_INTERVAL,
+            "FACE_TRACK_PADDING": FACE_TRACK_PADDING,
+            "DETECTION_MAX_DIM": DETECTION_MAX_DIM,
+            "REDUCED_DECODE": REDUCED_DECODE,
+            "SESSION_HISTORY_SIZE": SESSION_HISTORY_SIZE,
+        }
+    }
+    try:
+        os.makedirs(SCAN_RECORDING_DIR, exist_ok=True)
+        path = os.path.join(SCAN_RECORDING_DIR, f"{session.session_id}.scanrec")
+        return SessionRecorder(path, metadata, SCAN_RECORDING_MAX_MB * 1024 * 1024)
+    except OSError as e:
+        logger.error(f"Could not start recording scan session {session.session_id}: {e}")
+        return None
 
 # WebSocket connection manager
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, sessions: SessionRegistry):
+        # Scan sockets by session id
+        self.active_connections: Dict[str, WebSocket] = {}
+        self.sessions = sessions
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket) -> SessionState:
+        """Accept the socket and create the analysis state for its scan session"""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        tracker = FaceTracker(FACE_REDETECT_INTERVAL, FACE_TRACK_PADDING) if FACE_TRACKING else None
+        # Pinned: the socket's state must outlive idle gaps and upload churn
+        session = self.sessions.create(tracker=tracker, changes=new_change_detector(), pinned=True)
+        self.active_connections[session.session_id] = websocket
+        return session
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+    def disconnect(self, session: SessionState):
+        self.active_connections.pop(session.session_id, None)
+        self.sessions.remove(session.session_id)
 
-    async def send_analysis_result(self, result: Dict[str, Any], websocket: WebSocket):
+    async def send_analysis_result(self, result: Dict[str, Any], websocket: WebSocket, encoding: str = "json"):
         try:
-            await websocket.send_text(json.dumps(result))
+            payload = encode_message(result, encoding)
+            if isinstance(payload, bytes):
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
         except Exception as e:
             logger.error(f"Error sending websocket message: {e}")
 
-manager = ConnectionManager()
+sessions = SessionRegistry(MAX_SESSIONS, SESSION_IDLE_TIMEOUT, SESSION_HISTORY_SIZE)
+manager = ConnectionManager(sessions)
+hub = ResultHub(HUB_QUEUE_SIZE, HUB_MAX_SNAPSHOTS)
+broker = create_broker(BROKER_URL, BROKER_TIMEOUT)
+
+# Topic for uploads that don't belong to a session
+UPLOADS_TOPIC = "uploads"
+# Broker channel carrying results to every worker's hub
+RESULTS_CHANNEL = "health_results"
+
+def publish_readings(source: str, session_id: Optional[str], readings: List[Dict[str, Any]]):
+    """Push newly stored readings to the dashboards following their session, on every worker"""
+    if not readings:
+        return
+    topic = session_id or UPLOADS_TOPIC
+    broker.publish(RESULTS_CHANNEL, {"topic": topic, "message": {
+        "type": "health_results",
+        "source": source,
+        "session_id": topic,
+        "worker": WORKER_ID,
+        "timestamp": time.time(),
+        "results": readings
+    }})
+
+def deliver_results(envelope: Dict[str, Any]):
+    hub.publish(envelope["topic"], envelope["message"])
+
+def session_key(session_id: str, field: str) -> str:
+    return f"session:{session_id}:{field}"
+
+async def load_upload_session(session_id: str) -> SessionState:
+    """Session state for an upload, taking over its emotion history if another worker served it last
+
+    Scan sessions never move: their state lives with the worker holding the
+    socket. Upload sessions can land on any worker, so with a shared broker
+    the worker that last served one publishes its history for the next.
+    The id of an open scan session is refused (409): its face tracker and
+    change detector belong to the socket.
+    """
+    if sessions.is_pinned(session_id):
+        raise HTTPException(status_code=409, detail="session_id belongs to an active scan session")
+    session = sessions.get(session_id)
+    stale = session is None
+    if session is None:
+        session = sessions.create(session_id)
+    if broker.shared:
+        try:
+            owner = await broker.get(session_key(session_id, "owner"))
+            if owner is not None and (stale or owner.decode() != WORKER_ID):
+                history = await broker.get(session_key(session_id, "emotions"))
+                if history is not None:
+                    session.emotions.load_bytes(history)
+        except (ConnectionError, asyncio.TimeoutError, BrokerError) as e:
+            # Better a shorter history than a failed upload
+            logger.warning(f"Using local history for session {session_id}, broker request failed: {e!r}")
+    return session
+
+async def save_upload_session(session: SessionState):
+    if broker.shared:
+        try:
+            await broker.set(session_key(session.session_id, "emotions"), session.emotions.to_bytes(),
+                             ttl=SESSION_IDLE_TIMEOUT)
+            await broker.set(session_key(session.session_id, "owner"), WORKER_ID, ttl=SESSION_IDLE_TIMEOUT)
+        except (ConnectionError, asyncio.TimeoutError, BrokerError) as e:
+            logger.warning(f"Could not share history of session {session.session_id}: {e!r}")
+
+async def ensure_indexes():
+    """Create the indexes the read endpoints rely on"""
+    try:
+        await store.ensure_indexes()
+        logger.info("Database indexes ready")
+    except Exception as e:
+        logger.error(f"Index creation failed: {e}")
+
+async def warm_up_analyzer():
+    """Build the analyzer and warm every analysis worker; /api/ready reports ready once this is done"""
+    global analyzer
+    started = time.perf_counter()
+    try:
+        candidate = await asyncio.to_thread(lambda: LocalHealthAnalyzer(executor, frame_ring=frame_ring,
+                                                                          result_cache=result_cache,
+                                                                          seed=ANALYSIS_SEED))
+        # One job per worker: each job holds its worker at a barrier until all have warmed, so no worker can
+        # take two. Process workers build their own analyzer and get their barrier in the pool initializer.
+        if executor.mode == "process":
+            job = _warm_up_job
+        elif executor.mode == "thread":
+            barrier = threading.Barrier(executor.max_workers)
+            job = lambda: candidate.warm_up(barrier)
+        else:
+            job = candidate.warm_up
+        workers = executor.max_workers if executor.mode != "inline" else 1
+        worker_ms = await asyncio.gather(*(executor.run(job) for _ in range(workers)))
+        analyzer = candidate
+        readiness.update(
+            ready=True,
+            warm_up_ms=round((time.perf_counter() - started) * 1000, 2),
+            worker_warm_up_ms=[round(ms, 2) for ms in worker_ms]
+        )
+        logger.info(f"Analyzer ready after {readiness['warm_up_ms']} ms")
+    except Exception as e:
+        readiness["error"] = str(e)
+        logger.error(f"Analyzer warm-up failed: {e}")
+
+async def start_background_workers():
+    global warm_up_task
+    executor.start()
+    if frame_ring is not None:
+        frame_ring.start()
+    await store.start()
+    await broker.start()
+    await broker.subscribe(RESULTS_CHANNEL, deliver_results)
+    readings_buffer.start()
+    # Don't hold up startup on the database, history is only slower until the index exists
+    asyncio.create_task(ensure_indexes())
+    # Nor on loading models: the server accepts connections right away and /api/ready flips when warm
+    warm_up_task = asyncio.create_task(warm_up_analyzer())
+
+async def stop_background_workers():
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    await readings_buffer.close()
+    await store.close()
+    await broker.close()
+    executor.shutdown()
+    if frame_ring is not None:
+        frame_ring.close()
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "message": "Health Tracker API is running"}
+    return {
+        "status": "healthy",
+        "message": "Health Tracker API is running",
+        "analysis": dict(executor.stats(), frame_ring=frame_ring.stats() if frame_ring is not None else None),
+        "persistence": readings_buffer.stats(),
+        "storage": store.stats(),
+        "rollups": rollups.stats(),
+        "sessions": sessions.stats(),
+        "dashboards": hub.stats(),
+        "admission": {
+            "scan_sessions": scan_limit.stats(),
+            "uploads": upload_limit.stats(),
+            "analysis": analysis_gate.stats(),
+            "bulk_analysis": bulk_gate.stats()
+        },
+        "result_cache": result_cache.stats(),
+        "idempotency": idempotent_responses.stats(),
+        "broker": broker.stats(),
+        "worker": WORKER_ID,
+        "ready": readiness["ready"]
+    }
+
+@app.get("/api/ready")
+async def readiness_check():
+    """200 once the analyzer is loaded and warm on every worker, 503 until then"""
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Pipeline stage latencies, frame counters and queue gauges in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.post("/api/analyze/image")
-async def analyze_image(file: UploadFile = File(...)):
-    """Analyze uploaded image for health indicators"""
-    try:
-        # Read and process image
+async def analyze_image(file: UploadFile = File(...), detection_max_dim: Optional[int] = None,
+                        session_id: Optional[str] = None, timings: bool = False,
+                        idempotency_key: Optional[str] = Header(None)):
+    """Analyze uploaded image for health indicators
+
+    detection_max_dim overrides the configured detection resolution (0 = full resolution).
+    Passing a session_id makes consecutive uploads share emotion history.
+    timings=true adds a per-stage timing breakdown (ms) to the response.
+    Retries sent with the same Idempotency-Key header get the original response
+    back (marked with an Idempotent-Replayed header) and store no new readings.
+    """
+    analyzer = require_analyzer()
+    timer = StageTimer()
+    # Read and process image
+    with timer.stage("upload_read"):
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
+    session = await load_upload_session(session_id) if session_id else None
+    if idempotency_key:
+        try:
+            replay = await idempotent_responses.begin(idempotency_key,
+                                                      content_key(contents, detection_max_dim, session_id))
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if replay is not None:
+            return JSONResponse(content=replay, headers={"Idempotent-Replayed": "true"})
+    
+    replayable = None
+    try:
         # Perform analysis
-        results = await analyzer.analyze_frame(frame)
+        results, detection = await analyzer.analyze_image_bytes(contents, session, detection_max_dim, timer,
+                                                                gate=analysis_gate,
+                                                                deadline=ANALYSIS_DEADLINE_MS / 1000)
+        if session is not None:
+            await save_upload_session(session)
+        
+        # Store results in database (reused results are already stored)
+        readings = [asdict(result) for result in results]
+        # Kept for Idempotency-Key retries as they are now, before the store sees them
+        replay_readings = copy.deepcopy(readings) if idempotency_key else None
+        reused = detection.get("reused", False)
+        if not reused:
+            with timer.stage("persist_enqueue"):
+                await readings_buffer.write(readings)
+            publish_readings("upload", session_id, readings)
+        
+        outcome = "reused" if reused else "cached" if detection.get("cached") else "processed"
+        observe_frame("upload", timer, len(results), outcome)
+        response = {
+            "success": True,
+            "faces_detected": len(results),
+            "results": readings,
+            "detection": detection
+        }
+        if wants_timings(timings):
+            response["timings"] = timer.breakdown()
+        if idempotency_key:
+            replayable = dict(copy.deepcopy(dict(response, results=[])), results=replay_readings)
+        return JSONResponse(content=response)
+        
+    except Overloaded as e:
+        SHED.inc(endpoint="upload", reason=e.reason)
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except Exception as e:
+        FRAMES.inc(endpoint="upload", outcome="errored")
+        logger.error(f"Image analysis error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if idempotency_key:
+            idempotent_responses.finish(idempotency_key, replayable)
+
+def read_batch_images(files: List[UploadFile]) -> List[Tuple[str, bytes]]:
+    """(name, bytes) of every image in a batch upload, expanding zip archives (blocking)"""
+    images = []
+    for upload in files:
+        if zipfile.is_zipfile(upload.file):
+            upload.file.seek(0)
+            with zipfile.ZipFile(upload.file) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or not member.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                        continue
+                    if member.file_size > BATCH_MAX_IMAGE_BYTES:
+                        raise ValueError(f"{upload.filename}/{member.filename} exceeds {BATCH_MAX_IMAGE_BYTES} bytes")
+                    images.append((f"{upload.filename}/{member.filename}", archive.read(member)))
+                    if len(images) > BATCH_MAX_IMAGES:
+                        break
+        else:
+            upload.file.seek(0)
+            data = upload.file.read(BATCH_MAX_IMAGE_BYTES + 1)
+            if len(data) > BATCH_MAX_IMAGE_BYTES:
+                raise ValueError(f"{upload.filename} exceeds {BATCH_MAX_IMAGE_BYTES} bytes")
+            images.append((upload.filename, data))
+        if len(images) > BATCH_MAX_IMAGES:
+            raise ValueError(f"Batch exceeds {BATCH_MAX_IMAGES} images")
+    return images
+
+@app.post("/api/analyze/batch")
+async def analyze_batch(files: List[UploadFile] = File(...), detection_max_dim: Optional[int] = None):
+    """Analyze many images in one request, e.g. to re-process stored photos
+
+    Accepts multiple image files and/or zip archives of images. Images are
+    analyzed independently (no session history); images that fail to decode
+    are reported per item without failing the batch. All readings are
+    persisted with a single write.
+    """
+    analyzer = require_analyzer()
+    try:
+        images = await asyncio.to_thread(read_batch_images, files)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not images:
+        raise HTTPException(status_code=400, detail="No images in upload")
+    
+    started = time.perf_counter()
+    try:
+        outcomes = await analyzer.analyze_batch([data for _, data in images], detection_max_dim, bulk_gate)
+        
+        items = []
+        results = []
+        for (filename, _), outcome in zip(images, outcomes):
+            if isinstance(outcome, Overloaded):
+                FRAMES.inc(endpoint="batch", outcome="shed")
+                SHED.inc(endpoint="batch", reason=outcome.reason)
+                items.append({"filename": filename, "success": False, "error": str(outcome)})
+                continue
+            if isinstance(outcome, Exception):
+                FRAMES.inc(endpoint="batch", outcome="errored")
+                items.append({"filename": filename, "success": False, "error": str(outcome)})
+                continue
+            FRAMES.inc(endpoint="batch", outcome="processed")
+            FACES_PER_FRAME.observe(len(outcome), endpoint="batch")
+            results.extend(outcome)
+            items.append({
+                "filename": filename,
+                "success": True,
+                "faces_detected": len(outcome),
+                "results": [asdict(result) for result in outcome]
+            })
         
         # Store results in database
-        for result in results:
-            await db.health_readings.insert_one(asdict(result))
+        readings = [asdict(result) for result in results]
+        await readings_buffer.write(readings)
+        publish_readings("batch", None, readings)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="batch")
         
         return JSONResponse(content={
             "success": True,
+            "images": len(images),
+            "images_failed": sum(1 for item in items if not item["success"]),
             "faces_detected": len(results),
-            "results": [asdict(result) for result in results]
+            "items": items
         })
         
     except Exception as e:
-        logger.error(f"Image analysis error: {e}")
+        logger.error(f"Batch analysis error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def spool_video(source: BinaryIO, suffix: str) -> str:
+    """Copy an uploaded video to a named temp file VideoCapture can open (blocking); returns its path"""
+    copied = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as target:
+        try:
+            source.seek(0)
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                copied += len(chunk)
+                if copied > VIDEO_MAX_BYTES:
+                    raise ValueError(f"Video exceeds {VIDEO_MAX_BYTES} bytes")
+                target.write(chunk)
+        except Exception:
+            target.close()
+            os.unlink(target.name)
+            raise
+    return target.name
+
+async def stream_video_analysis(sampler: VideoFrameSampler, path: str, max_frames: int,
+                                detection_max_dim: Optional[int]) -> AsyncIterator[str]:
+    """NDJSON messages for a video analyzed frame by frame as one scan session
+
+    The next sampled frame is decoded while the current one is analyzed. The
+    sampler is only touched from its own reader thread, so it's released
+    there once any in-flight read has finished.
+    """
+    tracker = FaceTracker(FACE_REDETECT_INTERVAL, FACE_TRACK_PADDING) if FACE_TRACKING else None
+    session = SessionState(str(uuid.uuid4()), SESSION_HISTORY_SIZE, tracker, new_change_detector())
+    reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="video")
+    loop = asyncio.get_running_loop()
+    total = min(sampler.samples_estimate, max_frames) or None
+    processed = errored = faces = 0
+    
+    def message(payload: Dict[str, Any]) -> str:
+        return json.dumps(payload) + "\n"
+    
+    try:
+        yield message({
+            "type": "started",
+            "fps": sampler.fps,
+            "frame_count": sampler.frame_count,
+            "sample_step": sampler.step,
+            "frames_to_analyze": total
+        })
+        
+        next_read = loop.run_in_executor(reader, sampler.read)
+        while True:
+            sample = await next_read
+            if sample is None:
+                break
+            index, position, frame = sample
+            last = processed + errored + 1 >= max_frames
+            if not last:
+                next_read = loop.run_in_executor(reader, sampler.read)
+            
+            timer = StageTimer()
+            try:
+                results, detection = await analyzer.analyze(frame, session, detection_max_dim, timer, bulk_gate)
+                reused = detection.get("reused", False)
+                if not reused:
+                    readings = [asdict(result) for result in results]
+                    with timer.stage("persist_enqueue"):
+                        await readings_buffer.write(readings)
+                    publish_readings("video", session.session_id, readings)
+                observe_frame("video", timer, len(results), "reused" if reused else "processed")
+                processed += 1
+                faces += len(results)
+                progress = {"analyzed": processed + errored, "total": total}
+                if reused and FRAME_DEDUP == "suppress":
+                    yield message({
+                        "type": "frame_unchanged",
+                        "frame_index": index,
+                        "video_time": round(position, 3),
+                        "progress": progress
+                    })
+                else:
+                    yield message({
+                        "type": "frame",
+                        "frame_index": index,
+                        "video_time": round(position, 3),
+                        "faces_detected": len(results),
+                        "results": [asdict(result) for result in results],
+                        "detection": detection,
+                        "reused": reused,
+                        "progress": progress
+                    })
+            except Overloaded as e:
+                errored += 1
+                FRAMES.inc(endpoint="video", outcome="shed")
+                SHED.inc(endpoint="video", reason=e.reason)
+                yield message({"type": "error", "frame_index": index, "message": str(e)})
+            except Exception as e:
+                errored += 1
+                FRAMES.inc(endpoint="video", outcome="errored")
+                logger.error(f"Video frame analysis error: {e}")
+                yield message({"type": "error", "frame_index": index, "message": f"Processing failed: {str(e)}"})
+            
+            if last:
+                break
+        
+        completed = {
+            "type": "completed",
+            "frames_analyzed": processed,
+            "frames_failed": errored,
+            "faces_detected": faces
+        }
+        if session.tracker is not None:
+            completed["tracking"] = session.tracker.stats()
+        yield message(completed)
+    finally:
+        reader.submit(sampler.release)
+        reader.submit(os.unlink, path)
+        reader.shutdown(wait=False)
+
+@app.post("/api/analyze/video")
+async def analyze_video(file: UploadFile = File(...), sample_fps: float = VIDEO_SAMPLE_FPS,
+                        max_frames: int = VIDEO_MAX_FRAMES, detection_max_dim: Optional[int] = None):
+    """Analyze a recorded video, streaming NDJSON progress and per-frame results
+
+    The video is decoded incrementally and sampled at sample_fps frames per
+    second (0 = every frame), up to max_frames analyzed frames. Frames are
+    analyzed in order as one session, so emotion history and face tracking
+    carry over between them. Memory use doesn't depend on the video length.
+    """
+    require_analyzer()
+    max_frames = max(1, min(max_frames, VIDEO_MAX_FRAMES))
+    suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+    try:
+        path = await asyncio.to_thread(spool_video, file.file, suffix)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        sampler = await asyncio.to_thread(VideoFrameSampler, path, sample_fps)
+    except ValueError as e:
+        os.unlink(path)
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(stream_video_analysis(sampler, path, max_frames, detection_max_dim),
+                             media_type="application/x-ndjson")
+
 @app.get("/api/health/history")
-async def get_health_history(limit: int = 50):
-    """Get recent health readings"""
+async def get_health_history(limit: int = 50, before: Optional[str] = None, fields: Optional[str] = None):
+    """Get recent health readings, newest first
+
+    Pages are keyset-paginated on (timestamp, id): pass the returned
+    next_cursor as `before` to fetch the next page. `fields` is a
+    comma-separated list of reading fields to return.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    
+    projection = None
+    if fields:
+        requested = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = requested - set(HealthResult.__dataclass_fields__)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        # id and timestamp are always needed to build the cursor
+        projection = sorted(requested | {"id", "timestamp"})
+    
+    cursor = None
+    if before:
+        try:
+            before_timestamp, before_id = before.split(",", 1)
+            cursor = (float(before_timestamp), before_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="before must be '<timestamp>,<id>'")
+    
     try:
-        cursor = db.health_readings.find().sort("timestamp", -1).limit(limit)
-        readings = await cursor.to_list(length=limit)
+        readings = [
+            reading async for reading in
+            store.find(cursor=cursor, descending=True, limit=limit, fields=projection, batch_size=limit)
+        ]
         
-        # Convert ObjectId to string for JSON serialization
-        for reading in readings:
-            reading["_id"] = str(reading["_id"])
+        next_cursor = None
+        if len(readings) == limit:
+            next_cursor = f"{readings[-1]['timestamp']!r},{readings[-1]['id']}"
         
         return JSONResponse(content={
             "success": True,
-            "readings": readings
+            "readings": readings,
+            "next_cursor": next_cursor
         })
         
     except Exception as e:
         logger.error(f"History fetch error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/health/export")
+async def export_health_readings(format: str = "ndjson", start: Optional[float] = None, end: Optional[float] = None,
+                                 fields: Optional[str] = None, batch_size: int = EXPORT_BATCH_SIZE):
+    """Stream health readings in [start, end), oldest first, as NDJSON or CSV
+
+    Readings are read from the store batch_size at a time and each batch is
+    written out before the next is fetched, so exports of any size run in
+    constant memory. `fields` is a comma-separated list of reading fields.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    batch_size = max(1, min(batch_size, EXPORT_MAX_BATCH_SIZE))
+    
+    export_fields = list(HealthResult.__dataclass_fields__)
+    if fields:
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = set(requested) - set(export_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        export_fields = requested
+    
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    readings = store.find(start=start, end=end, fields=export_fields, batch_size=batch_size)
+    
+    async def stream():
+        try:
+            async for chunk in export_chunks(readings, format, export_fields, batch_size):
+                yield chunk
+        except Exception as e:
+            # Headers are already sent, so the export just ends early
+            logger.error(f"Export error: {e}")
+            raise
+    
+    return StreamingResponse(stream(), media_type=EXPORT_FORMATS[format], headers={
+        "Content-Disposition": f'attachment; filename="health_readings.{format}"'
+    })
+
+def aggregate_range(granularity: str, start: Optional[float], end: Optional[float]) -> Tuple[float, float]:
+    """Validate an aggregates request and fill in the default range (the last 60 buckets)"""
+    if granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"granularity must be one of {', '.join(GRANULARITIES)}")
+    size = GRANULARITIES[granularity]
+    end = end if end is not None else time.time()
+    start = start if start is not None else end - 60 * size
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start) / size > AGGREGATES_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range spans more than {AGGREGATES_MAX_BUCKETS} buckets")
+    return start, end
+
+@app.get("/api/health/aggregates")
+async def get_health_aggregates(granularity: str = "hour", start: Optional[float] = None,
+                                end: Optional[float] = None, source: str = "rollups"):
+    """Average stress, anxiety, depression and glucose per minute, hour or day
+
+    source=rollups reads the incrementally maintained rollup documents;
+    source=readings aggregates the raw readings for the range on demand.
+    """
+    start, end = aggregate_range(granularity, start, end)
+    if source not in ("rollups", "readings"):
+        raise HTTPException(status_code=400, detail="source must be 'rollups' or 'readings'")
+    
+    try:
+        if source == "rollups":
+            buckets = await rollups.query(granularity, start, end)
+        else:
+            buckets = await rollups.compute(granularity, start, end)
+        
+        return JSONResponse(content={
+            "success": True,
+            "granularity": granularity,
+            "bucket_seconds": GRANULARITIES[granularity],
+            "start": start,
+            "end": end,
+            "source": source,
+            "buckets": buckets
+        })
+        
+    except Exception as e:
+        logger.error(f"Aggregates fetch error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/health/aggregates/rebuild")
+async def rebuild_health_aggregates(granularity: str = "hour", start: Optional[float] = None,
+                                    end: Optional[float] = None):
+    """Recompute the rollups for a range from the raw readings (e.g. after a backfill)"""
+    start, end = aggregate_range(granularity, start, end)
+    
+    try:
+        rebuilt = await rollups.rebuild(granularity, start, end)
+        return JSONResponse(content={"success": True, "granularity": granularity, "buckets_rebuilt": rebuilt})
+        
+    except Exception as e:
+        logger.error(f"Aggregates rebuild error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.websocket("/api/ws/scan")
 async def websocket_scan(websocket: WebSocket):
-    """WebSocket endpoint for real-time health scanning"""
-    await manager.connect(websocket)
+    """WebSocket endpoint for real-time health scanning
+
+    Legacy clients send JSON text messages with a base64 data URL in 'frame'.
+    Clients may instead send a {"type": "hello"} message to negotiate binary
+    frames (fixed header + raw JPEG/WebP bytes, see protocol.py), an optional
+    msgpack encoding for result messages, "ready" credits for pacing,
+    per-stage timing breakdowns on every result ("timings": true), and
+    server-driven capture settings ("capture_control": true): the server
+    sends capture_settings messages (max_dim, jpeg_quality,
+    frame_interval_ms) that the client applies to its following frames.
+
+    Frames are received and analyzed by separate loops: only the newest
+    pending frame is analyzed, older ones are dropped and counted. Frames
+    that cannot start analysis within ANALYSIS_DEADLINE_MS are answered
+    with frame_shed. Connections over the scan limits are closed with 1013;
+    those opened while the server is busy run degraded (hello_ack carries
+    min_frame_interval_ms).
+    """
+    if analyzer is None:
+        await websocket.accept()
+        await websocket.send_text(json.dumps({"type": "error", "message": "Analyzer is warming up"}))
+        # 1013: try again later
+        await websocket.close(code=1013)
+        return
     
+    client = websocket.client.host if websocket.client else "unknown"
     try:
+        scan_limit.acquire(client)
+    except Overloaded as e:
+        SHED.inc(endpoint="scan", reason=e.reason)
+        await websocket.accept()
+        await websocket.send_text(json.dumps({
+            "type": "error",
+            "message": str(e),
+            "retry_after_ms": int(e.retry_after * 1000)
+        }))
+        await websocket.close(code=1013)
+        return
+    
+    try:
+        session = await manager.connect(websocket)
+    except Exception:
+        scan_limit.release(client)
+        raise
+    degraded = bool(DEGRADE_SCAN_CONNECTIONS) and scan_limit.active > DEGRADE_SCAN_CONNECTIONS
+    min_frame_interval_ms = DEGRADED_FRAME_INTERVAL_MS if degraded else 0
+    scheduler = LatestFrameScheduler()
+    recorder = start_recording(session) if SCAN_RECORDING_DIR else None
+    result_encoding = "json"
+    send_credits = False
+    send_timings = False
+    capture: Optional[CaptureController] = None
+    
+    async def process_frames():
         while True:
-            # Receive frame data from client
-            data = await websocket.receive_text()
-            frame_data = json.loads(data)
+            pending = await scheduler.next_frame()
+            if pending is None:
+                return
             
-            if 'frame' in frame_data:
-                try:
+            timer = StageTimer()
+            timer.add("frame_wait", max(0.0, (time.time() - pending.received_at) * 1000))
+            started = time.monotonic()
+            try:
+                if isinstance(pending.payload, str):
                     # Decode base64 image
-                    image_data = base64.b64decode(frame_data['frame'].split(',')[1])
-                    image = Image.open(io.BytesIO(image_data))
-                    frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                    
-                    # Perform analysis
-                    results = await analyzer.analyze_frame(frame)
-                    
-                    # Store results in database
-                    for result in results:
-                        await db.health_readings.insert_one(asdict(result))
-                    
-                    # Prepare response
+                    with timer.stage("base64_decode"):
+                        image_data = base64.b64decode(pending.payload.split(',')[1])
+                else:
+                    image_data = pending.payload
+                
+                # Perform analysis
+                sessions.touch(session)
+                deadline = ANALYSIS_DEADLINE_MS / 1000 - (time.time() - pending.received_at)
+                results, detection = await analyzer.analyze_image_bytes(image_data, session, timer=timer,
+                                                                        gate=analysis_gate, deadline=deadline)
+                reused = detection.get("reused", False)
+                
+                # Store results in database (reused results are already stored)
+                if not reused:
+                    readings = [asdict(result) for result in results]
+                    with timer.stage("persist_enqueue"):
+                        await readings_buffer.write(readings)
+                    publish_readings("scan", session.session_id, readings)
+                
+                scheduler.mark_processed()
+                outcome = "reused" if reused else "cached" if detection.get("cached") else "processed"
+                observe_frame("scan", timer, len(results), outcome)
+                
+                # Prepare response
+                if reused and FRAME_DEDUP == "suppress":
+                    response = {
+                        "type": "frame_unchanged",
+                        "session_id": session.session_id,
+                        "timestamp": time.time(),
+                        "frames": scheduler.stats()
+                    }
+                else:
                     response = {
                         "type": "analysis_result",
+                        "session_id": session.session_id,
                         "timestamp": time.time(),
                         "faces_detected": len(results),
-                        "results": [asdict(result) for result in results]
+                        "results": [asdict(result) for result in results],
+                        "frames": scheduler.stats(),
+                        "detection": detection
                     }
-                    
-                    await manager.send_analysis_result(response, websocket)
-                    
-                except Exception as e:
-                    logger.error(f"Frame processing error: {e}")
-                    await websocket.send_text(json.dumps({
+                if session.changes is not None:
+                    response["reused"] = reused
+                    response["dedup"] = session.changes.stats()
+                if session.tracker is not None:
+                    response["tracking"] = session.tracker.stats()
+                if capture is not None:
+                    response["capture"] = capture.stats()
+                if pending.sequence is not None:
+                    response["sequence"] = pending.sequence
+                if pending.client_timestamp is not None:
+                    response["client_timestamp"] = pending.client_timestamp
+                if wants_timings(send_timings):
+                    response["timings"] = timer.breakdown()
+                
+                send_started = time.perf_counter()
+                await manager.send_analysis_result(response, websocket, result_encoding)
+                STAGE_SECONDS.observe(time.perf_counter() - send_started, stage="ws_send")
+                
+                if capture is not None:
+                    adjustment = capture.observe(timer.total_ms(), executor.queue_depth, scheduler.dropped)
+                    if adjustment is not None:
+                        CAPTURE_ADJUSTMENTS.inc(reason=adjustment["reason"])
+                        await manager.send_analysis_result(adjustment, websocket, result_encoding)
+                
+            except Overloaded as e:
+                scheduler.mark_shed()
+                FRAMES.inc(endpoint="scan", outcome="shed")
+                SHED.inc(endpoint="scan", reason=e.reason)
+                shed = {
+                    "type": "frame_shed",
+                    "reason": e.reason,
+                    "retry_after_ms": int(e.retry_after * 1000),
+                    "frames": scheduler.stats()
+                }
+                if pending.sequence is not None:
+                    shed["sequence"] = pending.sequence
+                await manager.send_analysis_result(shed, websocket, result_encoding)
+            except Exception as e:
+                scheduler.mark_errored()
+                FRAMES.inc(endpoint="scan", outcome="errored")
+                logger.error(f"Frame processing error: {e}")
+                error = {
+                    "type": "error",
+                    "message": f"Processing failed: {str(e)}",
+                    "frames": scheduler.stats()
+                }
+                if pending.sequence is not None:
+                    error["sequence"] = pending.sequence
+                await manager.send_analysis_result(error, websocket, result_encoding)
+            
+            if send_credits:
+                await manager.send_analysis_result({"type": "ready", "credits": 1}, websocket, result_encoding)
+            
+            if degraded:
+                # Frames arriving meanwhile replace each other in the scheduler
+                await asyncio.sleep(max(0.0, min_frame_interval_ms / 1000 - (time.monotonic() - started)))
+    
+    def submit(frame: PendingFrame):
+        if recorder is not None:
+            recorder.record(frame)
+        if scheduler.submit(frame):
+            FRAMES.inc(endpoint="scan", outcome="dropped")
+    
+    processor = asyncio.create_task(process_frames())
+    
+    try:
+        while True:
+            # Receive frame data from client
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            
+            if message.get("bytes") is not None:
+                try:
+                    header, image_data = parse_binary_frame(message["bytes"])
+                except ValueError as e:
+                    scheduler.mark_errored()
+                    FRAMES.inc(endpoint="scan", outcome="errored")
+                    await manager.send_analysis_result({
                         "type": "error",
-                        "message": f"Processing failed: {str(e)}"
-                    }))
+                        "message": f"Invalid frame: {str(e)}"
+                    }, websocket, result_encoding)
+                    continue
+                submit(PendingFrame(image_data, header.sequence, header.timestamp))
+                continue
+            
+            frame_data = json.loads(message["text"])
+            
+            if frame_data.get("type") == "hello":
+                result_encoding = negotiate_result_encoding(frame_data.get("result_encoding"))
+                send_credits = bool(frame_data.get("credits"))
+                send_timings = bool(frame_data.get("timings"))
+                if ADAPTIVE_CAPTURE and frame_data.get("capture_control"):
+                    start_level = len(CAPTURE_LEVELS) - 1 if degraded else CAPTURE_START_LEVEL
+                    capture = CaptureController(CAPTURE_TARGET_MS, start_level=start_level)
+                await websocket.send_text(json.dumps(hello_ack(result_encoding, send_credits, capture is not None,
+                                                               min_frame_interval_ms)))
+                if capture is not None:
+                    await manager.send_analysis_result(capture.message("initial"), websocket, result_encoding)
+                if send_credits:
+                    await manager.send_analysis_result({"type": "ready", "credits": 1}, websocket, result_encoding)
+                continue
+            
+            if 'frame' in frame_data:
+                submit(PendingFrame(frame_data['frame'], frame_data.get('sequence'), frame_data.get('timestamp')))
             
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
-        logger.info("WebSocket client disconnected")
+        manager.disconnect(session)
+        logger.info(f"WebSocket client disconnected ({scheduler.stats()})")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
+        manager.disconnect(session)
+        await websocket.close(code=1000)
+    finally:
+        scan_limit.release(client)
+        if recorder is not None:
+            await asyncio.to_thread(recorder.close)
+            logger.info(f"Recorded scan session {session.session_id} ({recorder.stats()})")
+        scheduler.close()
+        processor.cancel()
+        try:
+            await processor
+        except (asyncio.CancelledError, Exception):
+            pass
+
+@app.websocket("/api/ws/dashboard")
+async def websocket_dashboard(websocket: WebSocket, session_id: Optional[str] = None):
+    """Push health results to dashboards as they are produced
+
+    Follows one scan session (session_id query parameter) or, by default,
+    every session. Clients can change what they follow by sending
+    {"type": "subscribe" | "unsubscribe", "session_id": ...} (a missing
+    session_id means all sessions). A snapshot of the latest result of each
+    followed session is sent on connect, and instead of the backlog if the
+    client falls behind; otherwise each result arrives as a health_results
+    message with the new readings.
+    """
+    await websocket.accept()
+    subscriber = hub.connect()
+    sender: Optional[asyncio.Task] = None
+    
+    async def send_messages():
+        while True:
+            message = await subscriber.next_message()
+            if message is None:
+                return
+            await websocket.send_text(json.dumps(message))
+    
+    try:
+        hub.subscribe(subscriber, session_id or ALL_SESSIONS)
+        await websocket.send_text(json.dumps(hub.snapshot(subscriber.topics)))
+        sender = asyncio.create_task(send_messages())
+        
+        while True:
+            request = json.loads(await websocket.receive_text())
+            topic = request.get("session_id") or ALL_SESSIONS
+            if request.get("type") == "subscribe":
+                hub.subscribe(subscriber, topic)
+            elif request.get("type") == "unsubscribe":
+                hub.unsubscribe(subscriber, topic)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Dashboard WebSocket error: {e}")
         await websocket.close(code=1000)
+    finally:
+        hub.disconnect(subscriber)
+        if sender is not None:
+            sender.cancel()
+            try:
+                await sender
+            except (asyncio.CancelledError, Exception):
+                pass
+
+def start_local_broker() -> str:
+    """Run a stand-in broker on a background thread of this (supervisor) process; returns its URL"""
+    path = os.path.join(tempfile.gettempdir(), f"health-broker-{os.getpid()}.sock")
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(BrokerServer().start(f"unix://{path}"))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    atexit.register(os.unlink, path)
+    return f"unix://{path}"
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
+    if API_WORKERS > 1:
+        if STORAGE_BACKEND == "memory":
+            raise SystemExit("STORAGE_BACKEND=memory keeps readings per process, use sqlite or mongo with API_WORKERS > 1")
+        if not BROKER_URL:
+            # Workers are separate processes and read the URL from the environment
+            os.environ["BROKER_URL"] = start_local_broker()
+        uvicorn.run("server:app", host="0.0.0.0", port=8001, workers=API_WORKERS,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
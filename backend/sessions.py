@@ -0,0 +1,168 @@
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+from dedup import FrameChangeDetector
+from tracking import FaceTracker
+
+logger = logging.getLogger(__name__)
+
+EMOTIONS = ('happy', 'sad', 'angry', 'fear', 'surprise', 'disgust', 'neutral')
+EMOTION_CODES = {emotion: code for code, emotion in enumerate(EMOTIONS)}
+NEUTRAL_CODE = EMOTION_CODES['neutral']
+
+
+def emotion_mask(emotions: Iterable[str]) -> np.ndarray:
+    """Boolean lookup table over emotion codes, e.g. for counting stress emotions"""
+    mask = np.zeros(len(EMOTIONS), dtype=bool)
+    for emotion in emotions:
+        mask[EMOTION_CODES[emotion]] = True
+    return mask
+
+
+class EmotionRing:
+    """Fixed-capacity ring buffer of emotion codes (one byte per entry)"""
+
+    __slots__ = ('_codes', '_next', '_count')
+
+    def __init__(self, capacity: int = 50):
+        if capacity < 1:
+            raise ValueError(f"Emotion history needs room for at least one entry, got {capacity}")
+        self._codes = np.zeros(capacity, dtype=np.uint8)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, emotion: str):
+        self._codes[self._next] = EMOTION_CODES.get(emotion, NEUTRAL_CODE)
+        self._next = (self._next + 1) % len(self._codes)
+        self._count = min(self._count + 1, len(self._codes))
+
+    def recent(self, n: int) -> np.ndarray:
+        """Codes of the last n emotions, oldest first"""
+        n = min(n, self._count)
+        indices = (self._next - n + np.arange(n)) % len(self._codes)
+        return self._codes[indices]
+
+    def to_bytes(self) -> bytes:
+        """Stored codes, oldest first (e.g. to hand the history to another worker)"""
+        return self.recent(self._count).tobytes()
+
+    def load_bytes(self, data: bytes):
+        """Replace the contents with codes from to_bytes(), keeping the newest that fit"""
+        codes = np.frombuffer(data, dtype=np.uint8)[-len(self._codes):]
+        self._codes[:len(codes)] = codes
+        self._count = len(codes)
+        self._next = len(codes) % len(self._codes)
+
+
+class SessionState:
+    """Analysis state belonging to one scan session (a WebSocket or an upload session_id)"""
+
+    __slots__ = ('session_id', 'emotions', 'tracker', 'changes', 'created_at', 'last_seen')
+
+    def __init__(self, session_id: str, history_size: int = 50, tracker: Optional[FaceTracker] = None,
+                 changes: Optional[FrameChangeDetector] = None):
+        self.session_id = session_id
+        self.emotions = EmotionRing(history_size)
+        self.tracker = tracker
+        self.changes = changes
+        self.created_at = time.time()
+        self.last_seen = self.created_at
+
+    def touch(self):
+        self.last_seen = time.time()
+
+
+class SessionRegistry:
+    """Bounded registry of session state with idle eviction.
+
+    Sessions are kept in least-recently-used order, so evicting idle sessions
+    only has to look at the front. When the registry is full the least
+    recently used session is evicted to make room. Pinned sessions (those of
+    open scan sockets) count towards the limit but are never evicted; they
+    stay until remove(). When only pinned sessions are left, create() goes
+    over the limit rather than fail a socket (the number of sockets has its
+    own limit), and counts and logs it.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 300.0, history_size: int = 50):
+        if history_size < 1:
+            raise ValueError(f"SESSION_HISTORY_SIZE must be at least 1, got {history_size}")
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = idle_timeout
+        self.history_size = history_size
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._pinned: Dict[str, SessionState] = {}
+        self.created = 0
+        self.evicted = 0
+        self.over_capacity = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions) + len(self._pinned)
+
+    def create(self, session_id: Optional[str] = None, tracker: Optional[FaceTracker] = None,
+               changes: Optional[FrameChangeDetector] = None, pinned: bool = False) -> SessionState:
+        self.evict_idle()
+        while self._sessions and len(self) >= self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+        if len(self) >= self.max_sessions:
+            self.over_capacity += 1
+            logger.warning(f"Session limit {self.max_sessions} exceeded, {len(self._pinned)} sessions are pinned "
+                           f"by open scan sockets")
+        session = SessionState(session_id or str(uuid.uuid4()), self.history_size, tracker, changes)
+        if pinned:
+            self._pinned[session.session_id] = session
+        else:
+            self._sessions[session.session_id] = session
+        self.created += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        session = self._pinned.get(session_id)
+        if session is not None:
+            session.touch()
+            return session
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.touch()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def is_pinned(self, session_id: str) -> bool:
+        return session_id in self._pinned
+
+    def touch(self, session: SessionState):
+        session.touch()
+        if session.session_id in self._sessions:
+            self._sessions.move_to_end(session.session_id)
+
+    def remove(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self._pinned.pop(session_id, None)
+
+    def evict_idle(self, now: Optional[float] = None):
+        now = now or time.time()
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": len(self),
+            "pinned": len(self._pinned),
+            "capacity": self.max_sessions,
+            "created": self.created,
+            "evicted": self.evicted,
+            "over_capacity": self.over_capacity,
+        }
@@ -0,0 +1,515 @@
+import asyncio
+import bisect
+import json
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKENDS = ("mongo", "memory", "sqlite")
+
+# Per-reading metrics summed by aggregate queries and rollups
+AGGREGATE_METRICS = ("stress_level", "anxiety_score", "depression_score", "glucose_simulation")
+
+# Readings are ordered (and paginated) on (timestamp, id)
+ReadingKey = Tuple[float, str]
+# (bucket start, reading count, per-metric sums)
+Bucket = Tuple[int, int, Dict[str, float]]
+
+
+def bucket_start(timestamp: float, size: int) -> int:
+    return int(timestamp // size) * size
+
+
+def project(reading: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return dict(reading)
+    return {field: reading[field] for field in fields if field in reading}
+
+
+def sum_buckets(readings, size: int) -> List[Bucket]:
+    """Per-bucket counts and metric sums over readings, ordered by bucket start"""
+    totals: Dict[int, List[Any]] = {}
+    for reading in readings:
+        total = totals.setdefault(bucket_start(reading["timestamp"], size), [0, dict.fromkeys(AGGREGATE_METRICS, 0.0)])
+        total[0] += 1
+        for metric in AGGREGATE_METRICS:
+            total[1][metric] += float(reading.get(metric) or 0.0)
+    return [(start, count, sums) for start, (count, sums) in sorted(totals.items())]
+
+
+class HealthStore(ABC):
+    """Storage for health readings and their time-bucket rollups.
+
+    Readings are append-only documents with at least `id` and `timestamp`.
+    Range queries return them ordered by (timestamp, id), optionally after
+    (ascending) or before (descending) a keyset cursor, and are read in
+    batches so callers can stream ranges of any size. Rollups are per
+    (granularity, bucket start) counts and metric sums maintained with
+    increments, see rollups.RollupStore.
+    """
+
+    name = ""
+
+    async def start(self):
+        """Open connections / files (call on the event loop before use)"""
+
+    async def ensure_indexes(self):
+        """Create whatever indexes range queries rely on; may be slow, run in the background"""
+
+    async def close(self):
+        """Release connections / files"""
+
+    @abstractmethod
+    async def insert_many(self, readings: List[Dict[str, Any]]):
+        """Store new readings"""
+
+    @abstractmethod
+    def find(self, start: Optional[float] = None, end: Optional[float] = None,
+             cursor: Optional[ReadingKey] = None, descending: bool = False,
+             limit: Optional[int] = None, fields: Optional[Sequence[str]] = None,
+             batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Readings with start <= timestamp < end, ordered by (timestamp, id)
+
+        `cursor` is the key of the last reading of the previous page: results
+        start after it (ascending) or before it (descending). `fields`
+        restricts the returned fields (all of them when None).
+        """
+
+    @abstractmethod
+    async def aggregate(self, size: int, start: float, end: float) -> List[Bucket]:
+        """Count and metric sums of readings in [start, end), per `size`-second bucket"""
+
+    @abstractmethod
+    async def increment_rollups(self, increments: Dict[Tuple[str, int], Tuple[int, Dict[str, float]]]):
+        """Add (count, sums) to each (granularity, bucket start) rollup, creating missing ones"""
+
+    @abstractmethod
+    async def find_rollups(self, granularity: str, start: float, end: float) -> List[Bucket]:
+        """Rollups of granularity with start <= bucket start < end, oldest first"""
+
+    @abstractmethod
+    async def replace_rollups(self, granularity: str, start: float, end: float, buckets: List[Bucket]):
+        """Replace every rollup of granularity in [start, end) with buckets"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class MemoryHealthStore(HealthStore):
+    """In-process store keeping the most recent `capacity` readings.
+
+    Readings sit in a list sorted on (timestamp, id), so range queries are
+    binary searches; readings arrive roughly in time order, which keeps
+    inserts at (or near) the end. Once over capacity the oldest readings
+    are evicted by moving the start of the live range forward; evicted
+    entries are only cut from the front of the lists once there are
+    `capacity` of them, so eviction costs O(1) per reading amortized (at
+    the price of up to twice the memory). Rollups are kept for the life of
+    the process and are not affected by eviction. Nothing survives a restart.
+    """
+
+    name = "memory"
+
+    def __init__(self, capacity: int = 100000):
+        self.capacity = max(1, capacity)
+        self._keys: List[ReadingKey] = []
+        self._readings: List[Dict[str, Any]] = []
+        # Index of the oldest live reading; everything before it has been evicted
+        self._start = 0
+        self._rollups: Dict[Tuple[str, int], List[Any]] = {}
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._keys) - self._start
+
+    async def insert_many(self, readings: List[Dict[str, Any]]):
+        for reading in readings:
+            key = (reading["timestamp"], reading["id"])
+            if not len(self) or key >= self._keys[-1]:
+                self._keys.append(key)
+                self._readings.append(dict(reading))
+            else:
+                index = bisect.bisect_right(self._keys, key, self._start)
+                self._keys.insert(index, key)
+                self._readings.insert(index, dict(reading))
+        overflow = len(self) - self.capacity
+        if overflow > 0:
+            self._start += overflow
+            self.evicted += overflow
+        if self._start >= self.capacity:
+            del self._keys[:self._start]
+            del self._readings[:self._start]
+            self._start = 0
+
+    def _page(self, lower: Optional[Tuple], lower_inclusive: bool, upper: Optional[Tuple],
+              descending: bool, count: int) -> List[Dict[str, Any]]:
+        keys, start = self._keys, self._start
+        if lower is None:
+            lo = start
+        elif lower_inclusive:
+            lo = bisect.bisect_left(keys, lower, start)
+        else:
+            lo = bisect.bisect_right(keys, lower, start)
+        hi = bisect.bisect_left(keys, upper, start) if upper is not None else len(keys)
+        if descending:
+            return self._readings[max(lo, hi - count):hi][::-1]
+        return self._readings[lo:min(hi, lo + count)]
+
+    async def find(self, start=None, end=None, cursor=None, descending=False, limit=None, fields=None,
+                   batch_size=1000):
+        # Bounds are compared against (timestamp, id) keys; (t,) sorts before any key with timestamp t
+        lower = (start,) if start is not None else None
+        lower_inclusive = True
+        upper = (end,) if end is not None else None
+        if cursor is not None:
+            cursor = tuple(cursor)
+            if descending:
+                upper = min(upper, cursor) if upper is not None else cursor
+            elif lower is None or cursor >= lower:
+                lower, lower_inclusive = cursor, False
+
+        remaining = limit if limit is not None else float("inf")
+        while remaining > 0:
+            # Positions are looked up again for every batch, so concurrent inserts and evictions are safe
+            page = self._page(lower, lower_inclusive, upper, descending, int(min(batch_size, remaining)))
+            if not page:
+                return
+            for reading in page:
+                yield project(reading, fields)
+            remaining -= len(page)
+            last = (page[-1]["timestamp"], page[-1]["id"])
+            if descending:
+                upper = last
+            else:
+                lower, lower_inclusive = last, False
+            await asyncio.sleep(0)
+
+    async def aggregate(self, size, start, end):
+        lo = bisect.bisect_left(self._keys, (start,), self._start)
+        hi = bisect.bisect_left(self._keys, (end,), self._start)
+        return sum_buckets(self._readings[lo:hi], size)
+
+    async def increment_rollups(self, increments):
+        for key, (count, sums) in increments.items():
+            rollup = self._rollups.setdefault(key, [0, dict.fromkeys(AGGREGATE_METRICS, 0.0)])
+            rollup[0] += count
+            for metric, value in sums.items():
+                rollup[1][metric] = rollup[1].get(metric, 0.0) + value
+
+    async def find_rollups(self, granularity, start, end):
+        return sorted(
+            (bucket, count, dict(sums))
+            for (rollup_granularity, bucket), (count, sums) in self._rollups.items()
+            if rollup_granularity == granularity and start <= bucket < end
+        )
+
+    async def replace_rollups(self, granularity, start, end, buckets):
+        for key in [key for key in self._rollups if key[0] == granularity and start <= key[1] < end]:
+            del self._rollups[key]
+        for bucket, count, sums in buckets:
+            self._rollups[(granularity, bucket)] = [count, dict(sums)]
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "readings": len(self),
+            "capacity": self.capacity,
+            "evicted": self.evicted,
+            "rollups": len(self._rollups),
+        }
+
+
+class SqliteHealthStore(HealthStore):
+    """Embedded store in a local SQLite file in WAL mode.
+
+    Readings are appended to a table keyed on id with an index on
+    (timestamp, id); each reading is kept as JSON alongside the columns
+    queries filter and aggregate on. All SQLite calls run on a single
+    dedicated thread that owns the connection, so they never block the
+    event loop and never contend with each other.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = "health_tracker.db"):
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._thread: Optional[ThreadPoolExecutor] = None
+
+    async def _call(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._thread, function, *args)
+
+    async def start(self):
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+            await self._call(self._open)
+            logger.info(f"SQLite store opened at {self.path}")
+
+    def _open(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only risks the last transactions on power loss, never corruption
+        connection.execute("PRAGMA synchronous=NORMAL")
+        metric_columns = ", ".join(f"{metric} REAL" for metric in AGGREGATE_METRICS)
+        connection.executescript(f"""
+            CREATE TABLE IF NOT EXISTS readings (
+                id TEXT PRIMARY KEY, timestamp REAL NOT NULL, {metric_columns}, document TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS readings_timestamp_id ON readings (timestamp, id);
+            CREATE TABLE IF NOT EXISTS rollups (
+                granularity TEXT NOT NULL, start INTEGER NOT NULL, count INTEGER NOT NULL, {metric_columns},
+                PRIMARY KEY (granularity, start)
+            );
+        """)
+        connection.commit()
+        self._connection = connection
+
+    async def close(self):
+        if self._thread is None:
+            return
+        await self._call(self._connection.close)
+        self._thread.shutdown()
+        self._thread = None
+
+    async def insert_many(self, readings):
+        columns = ", ".join(("id", "timestamp") + AGGREGATE_METRICS + ("document",))
+        placeholders = ", ".join("?" * (len(AGGREGATE_METRICS) + 3))
+        rows = [
+            (reading["id"], reading["timestamp"]) + tuple(reading.get(metric) for metric in AGGREGATE_METRICS)
+            + (json.dumps(reading, default=str),)
+            for reading in readings
+        ]
+
+        def insert():
+            with self._connection:
+                self._connection.executemany(
+                    f"INSERT OR IGNORE INTO readings ({columns}) VALUES ({placeholders})", rows
+                )
+
+        await self._call(insert)
+
+    def _page(self, start, end, after: Optional[ReadingKey], descending: bool, count: int) -> List[str]:
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+        if after is not None:
+            op = "<" if descending else ">"
+            conditions.append(f"(timestamp {op} ? OR (timestamp = ? AND id {op} ?))")
+            params.extend((after[0], after[0], after[1]))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        direction = "DESC" if descending else "ASC"
+        rows = self._connection.execute(
+            f"SELECT document FROM readings {where} ORDER BY timestamp {direction}, id {direction} LIMIT ?",
+            params + [count]
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    async def find(self, start=None, end=None, cursor=None, descending=False, limit=None, fields=None,
+                   batch_size=1000):
+        remaining = limit if limit is not None else float("inf")
+        after = tuple(cursor) if cursor is not None else None
+        while remaining > 0:
+            # Each batch is its own keyset query, so no SQLite cursor is held open between batches
+            page = await self._call(self._page, start, end, after, descending, int(min(batch_size, remaining)))
+            if not page:
+                return
+            for document in page:
+                reading = json.loads(document)
+                yield project(reading, fields)
+            remaining -= len(page)
+            after = (reading["timestamp"], reading["id"])
+
+    async def aggregate(self, size, start, end):
+        sums = ", ".join(f"SUM({metric})" for metric in AGGREGATE_METRICS)
+
+        def query():
+            return self._connection.execute(
+                f"SELECT CAST(timestamp / ? AS INTEGER) * ? AS bucket, COUNT(*), {sums} FROM readings "
+                "WHERE timestamp >= ? AND timestamp < ? GROUP BY bucket ORDER BY bucket",
+                (size, size, start, end)
+            ).fetchall()
+
+        return [self._bucket(row) for row in await self._call(query)]
+
+    @staticmethod
+    def _bucket(row) -> Bucket:
+        return (int(row[0]), row[1], {metric: float(row[i] or 0.0) for i, metric in enumerate(AGGREGATE_METRICS, 2)})
+
+    async def increment_rollups(self, increments):
+        columns = ", ".join(AGGREGATE_METRICS)
+        placeholders = ", ".join("?" * (len(AGGREGATE_METRICS) + 3))
+        updates = ", ".join(f"{column} = {column} + excluded.{column}" for column in ("count",) + AGGREGATE_METRICS)
+        rows = [
+            (granularity, start, count) + tuple(sums.get(metric, 0.0) for metric in AGGREGATE_METRICS)
+            for (granularity, start), (count, sums) in increments.items()
+        ]
+
+        def upsert():
+            with self._connection:
+                self._connection.executemany(
+                    f"INSERT INTO rollups (granularity, start, count, {columns}) VALUES ({placeholders}) "
+                    f"ON CONFLICT (granularity, start) DO UPDATE SET {updates}",
+                    rows
+                )
+
+        await self._call(upsert)
+
+    async def find_rollups(self, granularity, start, end):
+        columns = ", ".join(AGGREGATE_METRICS)
+
+        def query():
+            return self._connection.execute(
+                f"SELECT start, count, {columns} FROM rollups "
+                "WHERE granularity = ? AND start >= ? AND start < ? ORDER BY start",
+                (granularity, start, end)
+            ).fetchall()
+
+        return [self._bucket(row) for row in await self._call(query)]
+
+    async def replace_rollups(self, granularity, start, end, buckets):
+        columns = ", ".join(AGGREGATE_METRICS)
+        placeholders = ", ".join("?" * (len(AGGREGATE_METRICS) + 3))
+        rows = [
+            (granularity, bucket, count) + tuple(sums.get(metric, 0.0) for metric in AGGREGATE_METRICS)
+            for bucket, count, sums in buckets
+        ]
+
+        def replace():
+            with self._connection:
+                self._connection.execute(
+                    "DELETE FROM rollups WHERE granularity = ? AND start >= ? AND start < ?", (granularity, start, end)
+                )
+                self._connection.executemany(
+                    f"INSERT INTO rollups (granularity, start, count, {columns}) VALUES ({placeholders})", rows
+                )
+
+        await self._call(replace)
+
+    def stats(self):
+        return {"backend": self.name, "path": self.path}
+
+
+class MongoHealthStore(HealthStore):
+    """Readings and rollups in MongoDB collections through Motor"""
+
+    name = "mongo"
+
+    def __init__(self, url: str, database: str = "health_tracker"):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        self.client = AsyncIOMotorClient(url)
+        self.db = self.client[database]
+        self.readings = self.db.health_readings
+        self.rollups = self.db.health_rollups
+
+    async def ensure_indexes(self):
+        await self.readings.create_index([("timestamp", -1), ("id", -1)], name="timestamp_id")
+        await self.rollups.create_index([("granularity", 1), ("start", 1)], name="granularity_start")
+
+    async def close(self):
+        self.client.close()
+
+    async def insert_many(self, readings):
+        # pymongo sets _id on the documents it inserts; the readings are also in responses and hub messages
+        await self.readings.insert_many([dict(reading) for reading in readings], ordered=False)
+
+    async def find(self, start=None, end=None, cursor=None, descending=False, limit=None, fields=None,
+                   batch_size=1000):
+        conditions: List[Dict[str, Any]] = []
+        if start is not None or end is not None:
+            timestamp: Dict[str, float] = {}
+            if start is not None:
+                timestamp["$gte"] = start
+            if end is not None:
+                timestamp["$lt"] = end
+            conditions.append({"timestamp": timestamp})
+        if cursor is not None:
+            op = "$lt" if descending else "$gt"
+            conditions.append({"$or": [
+                {"timestamp": {op: cursor[0]}},
+                {"timestamp": cursor[0], "id": {op: cursor[1]}}
+            ]})
+        query = conditions[0] if len(conditions) == 1 else {"$and": conditions} if conditions else {}
+
+        projection = {"_id": 0}
+        if fields is not None:
+            projection.update({field: 1 for field in fields})
+        direction = -1 if descending else 1
+        results = self.readings.find(query, projection).sort([("timestamp", direction), ("id", direction)])
+        if limit is not None:
+            results = results.limit(limit)
+        async for reading in results.batch_size(batch_size):
+            yield reading
+
+    async def aggregate(self, size, start, end):
+        group: Dict[str, Any] = {
+            "_id": {"$subtract": ["$timestamp", {"$mod": ["$timestamp", size]}]},
+            "count": {"$sum": 1},
+        }
+        group.update({metric: {"$sum": f"${metric}"} for metric in AGGREGATE_METRICS})
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+            {"$group": group},
+            {"$sort": {"_id": 1}},
+        ]
+        buckets = []
+        async for doc in self.readings.aggregate(pipeline):
+            sums = {metric: float(doc.get(metric) or 0.0) for metric in AGGREGATE_METRICS}
+            buckets.append((int(doc["_id"]), doc["count"], sums))
+        return buckets
+
+    async def increment_rollups(self, increments):
+        from pymongo import UpdateOne
+
+        operations = []
+        for (granularity, start), (count, sums) in increments.items():
+            inc = {"count": count}
+            inc.update({f"sums.{metric}": value for metric, value in sums.items()})
+            operations.append(UpdateOne(
+                {"_id": f"{granularity}:{start}"},
+                {"$inc": inc, "$setOnInsert": {"granularity": granularity, "start": start}},
+                upsert=True
+            ))
+        if operations:
+            await self.rollups.bulk_write(operations, ordered=False)
+
+    async def find_rollups(self, granularity, start, end):
+        results = self.rollups.find(
+            {"granularity": granularity, "start": {"$gte": start, "$lt": end}},
+            {"_id": 0, "start": 1, "count": 1, "sums": 1}
+        ).sort("start", 1)
+        return [(doc["start"], doc["count"], doc.get("sums", {})) async for doc in results]
+
+    async def replace_rollups(self, granularity, start, end, buckets):
+        from pymongo import ReplaceOne
+
+        operations = [
+            ReplaceOne(
+                {"_id": f"{granularity}:{bucket}"},
+                {"granularity": granularity, "start": bucket, "count": count, "sums": sums},
+                upsert=True
+            )
+            for bucket, count, sums in buckets
+        ]
+        await self.rollups.delete_many({"granularity": granularity, "start": {"$gte": start, "$lt": end}})
+        if operations:
+            await self.rollups.bulk_write(operations, ordered=False)
+
+
+def create_store(backend: str, mongo_url: str = "", sqlite_path: str = "health_tracker.db",
+                 memory_capacity: int = 100000) -> HealthStore:
+    if backend == "mongo":
+        return MongoHealthStore(mongo_url)
+    if backend == "memory":
+        return MemoryHealthStore(memory_capacity)
+    if backend == "sqlite":
+        return SqliteHealthStore(sqlite_path)
+    raise ValueError(f"Unknown storage backend '{backend}', expected one of {STORAGE_BACKENDS}")
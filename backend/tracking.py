@@ -0,0 +1,67 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+Box = Tuple[int, int, int, int]
+# Box as fractions of the frame width/height, independent of frame resolution
+Region = Tuple[float, float, float, float]
+
+
+class FaceTracker:
+    """Per-session face track used to limit detection to where faces were last seen.
+
+    Between full-frame detections, detection runs only inside each previous
+    face box grown by `padding` (a fraction of the box size). A full detection
+    is forced every `redetect_interval` frames, and whenever a tracked face is
+    not found again inside its search region.
+
+    Regions are kept relative to the frame size so the track survives the
+    client changing its capture resolution.
+    """
+
+    def __init__(self, redetect_interval: int = 10, padding: float = 0.5):
+        self.redetect_interval = max(1, redetect_interval)
+        self.padding = padding
+        self.regions: List[Region] = []
+        self.frames_since_full = 0
+        self.full_detections = 0
+        self.tracked_detections = 0
+
+    def search_regions(self) -> Optional[List[Region]]:
+        """Relative regions to search in the next frame, or None for full-frame detection"""
+        if not self.regions or self.frames_since_full >= self.redetect_interval:
+            return None
+
+        regions = []
+        for x, y, w, h in self.regions:
+            x0 = max(0.0, x - w * self.padding)
+            y0 = max(0.0, y - h * self.padding)
+            x1 = min(1.0, x + w * (1 + self.padding))
+            y1 = min(1.0, y + h * (1 + self.padding))
+            if x1 > x0 and y1 > y0:
+                regions.append((x0, y0, x1 - x0, y1 - y0))
+        return regions or None
+
+    def update(self, boxes: List[Box], full_detection: bool, frame_shape: Sequence[int]):
+        """Record the faces (pixel boxes) found in the latest frame"""
+        frame_h, frame_w = frame_shape[:2]
+        self.regions = [(x / frame_w, y / frame_h, w / frame_w, h / frame_h) for x, y, w, h in boxes]
+        if full_detection:
+            self.frames_since_full = 0
+            self.full_detections += 1
+        else:
+            self.frames_since_full += 1
+            self.tracked_detections += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_faces": len(self.regions),
+            "full_detections": self.full_detections,
+            "tracked_detections": self.tracked_detections,
+        }
+
+
+def region_to_box(region: Region, width: int, height: int) -> Box:
+    """Pixel box for a relative region in an image of the given size"""
+    x, y, w, h = region
+    x0, y0 = int(x * width), int(y * height)
+    x1, y1 = min(width, int(round((x + w) * width))), min(height, int(round((y + h) * height)))
+    return (x0, y0, max(0, x1 - x0), max(0, y1 - y0))
@@ -11,6 +11,36 @@ import './App.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
+// Only the fields the recent-scans list renders
+const HISTORY_FIELDS = 'id,timestamp,emotion,glucose_simulation,stress_level,anxiety_score';
+const HISTORY_SIZE = 5;
+
+// Newest readings first, without duplicates (a pushed reading may already be in the fetched page)
+const mergeReadings = (current, incoming) => {
+  const byId = new Map([...current, ...incoming].map(reading => [reading.id, reading]));
+  return [...byId.values()].sort((a, b) => b.timestamp - a.timestamp).slice(0, HISTORY_SIZE);
+};
+
+// Binary frame header: version u8, format u8, reserved u16, sequence u32, timestamp u64 (big-endian)
+const FRAME_PROTOCOL_VERSION = 1;
+const FRAME_FORMAT_JPEG = 0;
+const FRAME_HEADER_SIZE = 16;
+
+// Capture settings until the server sends its own (capture_settings messages)
+const DEFAULT_CAPTURE_SETTINGS = { maxDim: 640, jpegQuality: 0.8, frameIntervalMs: 250 };
+
+const buildBinaryFrame = (imageBuffer, sequence, timestamp) => {
+  const message = new Uint8Array(FRAME_HEADER_SIZE + imageBuffer.byteLength);
+  const header = new DataView(message.buffer, 0, FRAME_HEADER_SIZE);
+  header.setUint8(0, FRAME_PROTOCOL_VERSION);
+  header.setUint8(1, FRAME_FORMAT_JPEG);
+  header.setUint16(2, 0);
+  header.setUint32(4, sequence);
+  header.setBigUint64(8, BigInt(timestamp));
+  message.set(new Uint8Array(imageBuffer), FRAME_HEADER_SIZE);
+  return message.buffer;
+};
+
 function App() {
   const [scanMode, setScanMode] = useState('face'); // 'face' or 'finger'
   const [isScanning, setIsScanning] = useState(false);
@@ -24,21 +54,40 @@ function App() {
   const videoRef = useRef(null);
   const canvasRef = useRef(null);
   const streamRef = useRef(null);
+  const binaryFramesRef = useRef(false);
+  const frameSequenceRef = useRef(0);
+  const captureSettingsRef = useRef(DEFAULT_CAPTURE_SETTINGS);
 
   // Fetch health history
   const fetchHealthHistory = useCallback(async () => {
     try {
-      const response = await axios.get(`${BACKEND_URL}/api/health/history`);
+      const response = await axios.get(`${BACKEND_URL}/api/health/history`, {
+        params: { limit: HISTORY_SIZE, fields: HISTORY_FIELDS }
+      });
       if (response.data.success) {
-        setHealthHistory(response.data.readings);
+        setHealthHistory(current => mergeReadings(current, response.data.readings));
       }
     } catch (error) {
       console.error('Error fetching health history:', error);
     }
   }, []);
 
+  // Load the recent readings once, then have new ones pushed by the dashboard feed
   useEffect(() => {
     fetchHealthHistory();
+    
+    const feed = new WebSocket(`${BACKEND_URL.replace('http', 'ws')}/api/ws/dashboard`);
+    feed.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+      if (data.type === 'health_results') {
+        setHealthHistory(current => mergeReadings(current, data.results));
+      } else if (data.type === 'snapshot') {
+        setHealthHistory(current => mergeReadings(current, data.latest.flatMap(message => message.results)));
+      }
+    };
+    feed.onerror = (error) => console.error('Dashboard feed error:', error);
+    
+    return () => feed.close();
   }, [fetchHealthHistory]);
 
   // Start camera
@@ -106,19 +155,39 @@ function App() {
       // Create WebSocket connection
       const websocket = new WebSocket(`${BACKEND_URL.replace('http', 'ws')}/api/ws/scan`);
       
+      binaryFramesRef.current = false;
+      frameSequenceRef.current = 0;
+      captureSettingsRef.current = DEFAULT_CAPTURE_SETTINGS;
+      
       websocket.onopen = () => {
         console.log('WebSocket connected');
         setWs(websocket);
+        // Ask for binary frames and capture settings; older servers ignore this and keep the JSON path
+        websocket.send(JSON.stringify({ type: 'hello', result_encoding: 'json', capture_control: true }));
       };
       
       websocket.onmessage = (event) => {
         const data = JSON.parse(event.data);
-        if (data.type === 'analysis_result' && data.results.length > 0) {
+        if (data.type === 'hello_ack') {
+          binaryFramesRef.current = Boolean(data.binary_frames);
+        } else if (data.type === 'capture_settings') {
+          // Applied from the next captured frame on
+          captureSettingsRef.current = {
+            maxDim: data.max_dim,
+            jpegQuality: data.jpeg_quality,
+            frameIntervalMs: data.frame_interval_ms
+          };
+        } else if (data.type === 'analysis_result' && data.results.length > 0) {
           setScanResults(data.results[0]);
           setIsScanning(false);
           setScanProgress(100);
           setAnalysisPhase('Scan complete!');
-          fetchHealthHistory();
+        } else if (data.type === 'analysis_result' || data.type === 'frame_unchanged') {
+          // No face yet: try again at the pace the server asked for
+          setTimeout(() => captureAndSendFrame(websocket), captureSettingsRef.current.frameIntervalMs);
+        } else if (data.type === 'frame_shed') {
+          // Server too busy for this frame: back off as long as it asked
+          setTimeout(() => captureAndSendFrame(websocket), data.retry_after_ms);
         }
       };
       
@@ -138,7 +207,7 @@ function App() {
       setIsScanning(false);
       setAnalysisPhase('Scan failed');
     }
-  }, [startCamera, simulateScanProgress, fetchHealthHistory]);
+  }, [startCamera, simulateScanProgress]);
 
   // Capture frame and send for analysis
   const captureAndSendFrame = useCallback((websocket) => {
@@ -146,13 +215,26 @@ function App() {
 
     const canvas = canvasRef.current;
     const context = canvas.getContext('2d');
+    const { maxDim, jpegQuality } = captureSettingsRef.current;
+    const { videoWidth, videoHeight } = videoRef.current;
+    const scale = Math.min(1, maxDim / Math.max(videoWidth, videoHeight));
+    
+    canvas.width = Math.round(videoWidth * scale);
+    canvas.height = Math.round(videoHeight * scale);
     
-    canvas.width = videoRef.current.videoWidth;
-    canvas.height = videoRef.current.videoHeight;
+    context.drawImage(videoRef.current, 0, 0, canvas.width, canvas.height);
     
-    context.drawImage(videoRef.current, 0, 0);
+    if (binaryFramesRef.current) {
+      canvas.toBlob(async (blob) => {
+        if (!blob || !websocket || websocket.readyState !== WebSocket.OPEN) return;
+        const imageBuffer = await blob.arrayBuffer();
+        frameSequenceRef.current += 1;
+        websocket.send(buildBinaryFrame(imageBuffer, frameSequenceRef.current, Date.now()));
+      }, 'image/jpeg', jpegQuality);
+      return;
+    }
     
-    const dataURL = canvas.toDataURL('image/jpeg', 0.8);
+    const dataURL = canvas.toDataURL('image/jpeg', jpegQuality);
     
     if (websocket && websocket.readyState === WebSocket.OPEN) {
       websocket.send(JSON.stringify({
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from admission import AnalysisGate, Overloaded
+
+
+async def settle():
+    """Let woken tasks run (wait_for adds a few loop iterations)"""
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_admits_up_to_capacity_without_waiting():
+    async def run():
+        gate = AnalysisGate(capacity=2, max_waiting=0)
+        await gate.acquire()
+        await gate.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await gate.acquire()
+        assert shed.value.reason == "queue_full"
+        assert shed.value.status_code == 503
+        return gate.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["running"], stats["admitted"], stats["shed"]) == (2, 2, {"queue_full": 1})
+
+
+def test_waiters_get_released_slots_in_arrival_order():
+    async def run():
+        gate = AnalysisGate(capacity=1, max_waiting=2)
+        await gate.acquire()
+        order = []
+
+        async def wait(name):
+            await gate.acquire(timeout=1)
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        assert gate.waiting == 2
+        gate.release()
+        await settle()
+        assert order == ["first"]
+        gate.release()
+        await asyncio.gather(*waiters)
+        assert order == ["first", "second"]
+        gate.release()
+        return gate.running
+
+    assert asyncio.run(run()) == 0
+
+
+def test_waiting_past_the_deadline_is_shed():
+    async def run():
+        gate = AnalysisGate(capacity=1, max_waiting=1)
+        await gate.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await gate.acquire(timeout=0.01)
+        assert shed.value.reason == "deadline"
+        with pytest.raises(Overloaded):
+            await gate.acquire(timeout=0)
+        return gate
+
+    gate = asyncio.run(run())
+    assert gate.waiting == 0
+    assert gate.stats()["shed"] == {"deadline": 2}
+
+
+def test_cancelled_waiter_passes_its_slot_on():
+    async def run():
+        gate = AnalysisGate(capacity=1, max_waiting=2)
+        await gate.acquire()
+        cancelled = asyncio.create_task(gate.acquire())
+        admitted = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        # The slot is handed to the first waiter, which goes away before it runs
+        gate.release()
+        cancelled.cancel()
+        await asyncio.wait_for(admitted, 1)
+        return gate.running, gate.waiting
+
+    assert asyncio.run(run()) == (1, 0)
+
+
+def test_overloaded_carries_retry_after():
+    async def run():
+        gate = AnalysisGate(capacity=1, max_waiting=0, retry_after=3)
+        await gate.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await gate.acquire()
+        return shed.value.headers
+
+    assert asyncio.run(run())["Retry-After"] == "3"
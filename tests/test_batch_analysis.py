@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+from server import LocalHealthAnalyzer  # noqa: E402
+from sessions import EMOTIONS  # noqa: E402
+
+# Brightness on and around every band edge, plus an empty face region (NaN)
+BRIGHTNESS = [0.0, 40.0, 79.9, 80.0, 80.1, 120.0, 149.9, 150.0, 150.1, 200.0, 255.0, np.nan]
+METRICS = ("stress_level", "anxiety_score", "depression_score", "glucose_simulation")
+
+
+def face(brightness: float) -> np.ndarray:
+    if np.isnan(brightness):
+        return np.zeros((0, 0), dtype=np.uint8)
+    return np.full((20, 20), brightness)
+
+
+def scalar_results(seed: int):
+    analyzer = LocalHealthAnalyzer(seed=seed)
+    results = []
+    for brightness in BRIGHTNESS:
+        emotion = analyzer.simulate_emotion_analysis(face(brightness))
+        metrics = analyzer.calculate_health_metrics(emotion)
+        recommendations = analyzer.generate_recommendations(metrics, emotion["dominant_emotion"])
+        results.append((emotion, metrics, recommendations))
+    return results
+
+
+def batch_results(seed: int):
+    analyzer = LocalHealthAnalyzer(seed=seed)
+    codes, confidence, scores = analyzer.simulate_emotion_analysis_batch(np.array(BRIGHTNESS))
+    metrics = analyzer.calculate_health_metrics_batch(codes, scores)
+    recommendations = analyzer.generate_recommendations_batch(metrics, codes)
+    return codes, confidence, metrics, recommendations
+
+
+def test_emotions_match_the_scalar_version():
+    codes, confidence, _, _ = batch_results(seed=0)
+    for i, (emotion, _, _) in enumerate(scalar_results(seed=0)):
+        assert EMOTIONS[codes[i]] == emotion["dominant_emotion"], BRIGHTNESS[i]
+        assert confidence[i] == pytest.approx(emotion["confidence"]), BRIGHTNESS[i]
+
+
+def test_metrics_match_the_scalar_version():
+    _, _, metrics, _ = batch_results(seed=3)
+    for i, (_, expected, _) in enumerate(scalar_results(seed=3)):
+        for name in METRICS:
+            assert metrics[name][i] == pytest.approx(expected[name]), (BRIGHTNESS[i], name)
+
+
+def test_recommendations_match_the_scalar_version():
+    _, _, _, recommendations = batch_results(seed=5)
+    assert recommendations == [expected for _, _, expected in scalar_results(seed=5)]
+
+
+def test_recommendations_are_separate_lists():
+    _, _, _, recommendations = batch_results(seed=0)
+    recommendations[0].append("changed")
+    assert all("changed" not in r for r in recommendations[1:])
@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+
+from broker import BrokerError, BrokerServer, SocketBroker, encode_command, read_reply
+
+
+async def wait_until(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def run_with_broker(tmp_path, scenario):
+    """Run scenario(server, broker, url) against a BrokerServer on a temporary unix socket"""
+    url = f"unix://{tmp_path}/broker.sock"
+
+    async def run():
+        server = BrokerServer()
+        await server.start(url)
+        broker = SocketBroker(url, timeout=0.5, retry_interval=0.01)
+        await broker.start()
+        try:
+            return await scenario(server, broker, url)
+        finally:
+            await broker.close()
+            await server.close()
+
+    return asyncio.run(run())
+
+
+def test_resp_round_trip():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_command("SET", "k", b"\r\nbinary", 5) + b"+OK\r\n-ERR bad\r\n:3\r\n$-1\r\n")
+        reader.feed_eof()
+        return [await read_reply(reader) for _ in range(5)]
+
+    command, ok, error, number, missing = asyncio.run(run())
+    assert command == [b"SET", b"k", b"\r\nbinary", b"5"]
+    assert (ok, number, missing) == ("OK", 3, None)
+    assert isinstance(error, BrokerError) and str(error) == "ERR bad"
+
+
+def test_get_and_set_with_expiry(tmp_path):
+    async def scenario(server, broker, url):
+        assert await broker.get("missing") is None
+        await broker.set("key", "value")
+        await broker.set("short", b"\x00\x01", ttl=0.05)
+        assert await broker.get("key") == b"value"
+        assert await broker.get("short") == b"\x00\x01"
+        await asyncio.sleep(0.1)
+        return await broker.get("short"), await broker.get("key")
+
+    assert run_with_broker(tmp_path, scenario) == (None, b"value")
+
+
+def test_publish_reaches_subscribers_of_the_channel(tmp_path):
+    async def scenario(server, broker, url):
+        other = SocketBroker(url)
+        await other.start()
+        received, ignored = [], []
+        await other.subscribe("results", received.append)
+        await other.subscribe("elsewhere", ignored.append)
+        await wait_until(lambda: server._subscribers.get(b"elsewhere"))
+        broker.publish("results", {"topic": "s", "n": 1})
+        await wait_until(lambda: received)
+        await other.close()
+        return received, ignored
+
+    assert run_with_broker(tmp_path, scenario) == ([{"topic": "s", "n": 1}], [])
+
+
+def test_error_replies_raise_broker_error(tmp_path):
+    async def scenario(server, broker, url):
+        with pytest.raises(BrokerError, match="unknown command"):
+            await broker._call("NOPE")
+        # The connection is still usable
+        await broker.set("key", "value")
+        return await broker.get("key")
+
+    assert run_with_broker(tmp_path, scenario) == b"value"
+
+
+def test_reconnects_and_resubscribes_after_losing_the_broker(tmp_path):
+    async def scenario(server, broker, url):
+        received = []
+        await broker.subscribe("results", received.append)
+        await wait_until(lambda: server._subscribers.get(b"results"))
+
+        await server.close()
+        await wait_until(lambda: not broker.stats()["connected"])
+        # While the broker is down commands fail immediately instead of hanging
+        with pytest.raises(ConnectionError):
+            await broker.get("key")
+        broker.publish("results", {"n": 0})
+
+        restarted = BrokerServer()
+        await restarted.start(url)
+        try:
+            await wait_until(lambda: broker.stats()["connected"])
+            await wait_until(lambda: restarted._subscribers.get(b"results"))
+            await broker.set("key", "value")
+            broker.publish("results", {"n": 1})
+            await wait_until(lambda: received)
+            return received, await broker.get("key"), broker.stats()
+        finally:
+            await broker.close()
+            await restarted.close()
+
+    received, value, stats = run_with_broker(tmp_path, scenario)
+    assert received == [{"n": 1}]
+    assert value == b"value"
+    assert stats["reconnects"] == 2
+    assert stats["failed"] >= 2
@@ -0,0 +1,54 @@
+import numpy as np
+
+from dedup import FULL_FRAME, FrameChangeDetector, is_unchanged, reference_signature, signature_distance
+
+
+def gray_frame(value: int = 100, height: int = 120, width: int = 160) -> np.ndarray:
+    return np.full((height, width), value, dtype=np.uint8)
+
+
+def detector_with_reference(frame: np.ndarray, boxes=(), threshold: float = 3.0, max_reuse: int = 30):
+    detector = FrameChangeDetector(threshold, max_reuse)
+    signature, regions = reference_signature(frame, list(boxes), frame.shape[:2])
+    detector.record_analyzed(signature, regions, ["result"], {"faces": len(boxes)})
+    return detector
+
+
+def test_reference_covers_the_frame_and_each_face():
+    signature, regions = reference_signature(gray_frame(), [(40, 30, 40, 60)], (120, 160))
+    assert regions[0] == FULL_FRAME
+    assert regions[1] == (0.25, 0.25, 0.25, 0.5)
+    assert signature.shape == (2, 16, 16)
+
+
+def test_first_frame_is_always_analyzed():
+    assert is_unchanged(gray_frame(), FrameChangeDetector().check_args()) is False
+
+
+def test_small_changes_are_unchanged_and_large_ones_are_not():
+    detector = detector_with_reference(gray_frame(100))
+    assert is_unchanged(gray_frame(102), detector.check_args())
+    assert not is_unchanged(gray_frame(110), detector.check_args())
+
+
+def test_a_change_inside_a_face_registers_when_the_frame_barely_changes():
+    frame = gray_frame(100)
+    face = (70, 50, 20, 20)
+    changed = frame.copy()
+    changed[50:70, 70:90] = 140
+    # Over the whole frame the change averages out below the threshold
+    assert signature_distance(*(reference_signature(f, [], (120, 160))[0] for f in (frame, changed))) < 3.0
+    assert not is_unchanged(changed, detector_with_reference(frame, [face]).check_args())
+
+
+def test_analysis_is_forced_after_max_reuse():
+    detector = detector_with_reference(gray_frame(), max_reuse=2)
+    for _ in range(2):
+        assert is_unchanged(gray_frame(), detector.check_args())
+        detector.record_reused()
+    assert detector.check_args()[0] is None
+    assert detector.stats() == {"checked": 3, "reused": 2, "skip_rate": round(2 / 3, 4)}
+
+
+def test_signatures_of_different_shapes_never_match():
+    assert signature_distance(np.zeros((1, 16, 16)), np.zeros((2, 16, 16))) == float("inf")
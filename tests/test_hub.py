@@ -0,0 +1,64 @@
+import asyncio
+
+from hub import ALL_SESSIONS, ResultHub
+
+
+def message(session: str, n: int):
+    return {"type": "health_results", "session_id": session, "n": n}
+
+
+def test_messages_reach_topic_and_all_sessions_subscribers_only():
+    async def run():
+        hub = ResultHub()
+        follower, everyone, other = hub.connect(), hub.connect(), hub.connect()
+        hub.subscribe(follower, "a")
+        hub.subscribe(everyone, ALL_SESSIONS)
+        hub.subscribe(other, "b")
+        hub.publish("a", message("a", 1))
+        assert await follower.next_message() == message("a", 1)
+        assert await everyone.next_message() == message("a", 1)
+        hub.publish("b", message("b", 2))
+        assert await other.next_message() == message("b", 2)
+
+    asyncio.run(run())
+
+
+def test_slow_subscriber_gets_a_snapshot_instead_of_its_backlog():
+    async def run():
+        hub = ResultHub(max_queue=2)
+        subscriber = hub.connect()
+        hub.subscribe(subscriber, "a")
+        hub.subscribe(subscriber, "b")
+        for n in range(5):
+            hub.publish("a", message("a", n))
+        hub.publish("b", message("b", 0))
+        hub.publish("c", message("c", 0))
+        snapshot = await subscriber.next_message()
+        # Both queued messages, the one that overflowed and the three after it
+        assert snapshot == {"type": "snapshot", "latest": [message("a", 4), message("b", 0)], "skipped": 6}
+        assert subscriber.lagged is False
+
+    asyncio.run(run())
+
+
+def test_snapshots_keep_the_most_recently_active_sessions():
+    hub = ResultHub(max_snapshots=2)
+    for session in ("a", "b", "a", "c"):
+        hub.publish(session, message(session, 0))
+    assert [m["session_id"] for m in hub.snapshot({ALL_SESSIONS})["latest"]] == ["a", "c"]
+
+
+def test_disconnect_releases_the_subscriber():
+    async def run():
+        hub = ResultHub()
+        subscriber = hub.connect()
+        hub.subscribe(subscriber, "a")
+        waiter = asyncio.create_task(subscriber.next_message())
+        await asyncio.sleep(0)
+        hub.disconnect(subscriber)
+        assert await asyncio.wait_for(waiter, 1) is None
+        hub.publish("a", message("a", 1))
+        assert hub.stats()["subscribers"] == 0
+        assert hub.stats()["topics"] == 0
+
+    asyncio.run(run())
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from persistence import WriteBehindBuffer
+
+
+class RecordingStore:
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    async def insert_many(self, readings):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.batches.append(list(readings))
+
+
+def test_flushes_full_batches_and_drains_on_close():
+    async def run():
+        store = RecordingStore()
+        buffer = WriteBehindBuffer(store, batch_size=2, flush_interval=10)
+        await buffer.write([{"id": i} for i in range(5)])
+        await buffer.close()
+        return store, buffer
+
+    store, buffer = asyncio.run(run())
+    assert [len(batch) for batch in store.batches] == [2, 2, 1]
+    assert [doc["id"] for batch in store.batches for doc in batch] == list(range(5))
+    assert buffer.written == 5
+    assert buffer.depth == 0
+
+
+def test_partial_batch_is_flushed_after_the_interval():
+    async def run():
+        store = RecordingStore()
+        buffer = WriteBehindBuffer(store, batch_size=100, flush_interval=0.01)
+        await buffer.write([{"id": 1}])
+        for _ in range(100):
+            if store.batches:
+                break
+            await asyncio.sleep(0.01)
+        flushed = list(store.batches)
+        await buffer.close()
+        return flushed
+
+    assert asyncio.run(run()) == [[{"id": 1}]]
+
+
+def test_async_mode_drops_what_does_not_fit():
+    async def run():
+        store = RecordingStore()
+        buffer = WriteBehindBuffer(store, batch_size=2, flush_interval=10, max_buffer=3)
+        await buffer.write([{"id": i} for i in range(5)])
+        dropped = buffer.dropped
+        await buffer.close()
+        return store, dropped
+
+    store, dropped = asyncio.run(run())
+    assert dropped == 2
+    assert sum(len(batch) for batch in store.batches) == 3
+
+
+def test_ack_mode_waits_for_the_insert():
+    async def run():
+        store = RecordingStore()
+        buffer = WriteBehindBuffer(store, mode="ack", batch_size=10, flush_interval=0.01)
+        await buffer.write([{"id": 1}, {"id": 2}])
+        committed = sum(len(batch) for batch in store.batches)
+        await buffer.close()
+        return committed
+
+    assert asyncio.run(run()) == 2
+
+
+def test_ack_mode_raises_when_the_insert_fails():
+    async def run():
+        buffer = WriteBehindBuffer(RecordingStore(fail=True), mode="ack", batch_size=1)
+        with pytest.raises(RuntimeError, match="unavailable"):
+            await buffer.write([{"id": 1}])
+        await buffer.close()
+        return buffer.failed
+
+    assert asyncio.run(run()) == 1
+
+
+def test_on_flush_sees_every_inserted_batch():
+    async def run():
+        flushed = []
+
+        async def on_flush(documents):
+            flushed.append(len(documents))
+
+        buffer = WriteBehindBuffer(RecordingStore(), batch_size=3, flush_interval=10, on_flush=on_flush)
+        await buffer.write([{"id": i} for i in range(4)])
+        await buffer.close()
+        return flushed
+
+    assert asyncio.run(run()) == [3, 1]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        WriteBehindBuffer(RecordingStore(), mode="sync")
+
+
+def test_writes_after_close_are_rejected_until_restarted():
+    async def run():
+        store = RecordingStore()
+        buffer = WriteBehindBuffer(store, batch_size=10, flush_interval=0.01)
+        await buffer.write([{"id": 1}])
+        await buffer.close()
+        await buffer.write([{"id": 2}, {"id": 3}])
+        assert buffer._task is None
+        assert buffer.stats()["rejected"] == 2
+
+        acked = WriteBehindBuffer(store, mode="ack")
+        await acked.close()
+        with pytest.raises(RuntimeError, match="closed"):
+            await acked.write([{"id": 4}])
+
+        buffer.start()
+        await buffer.write([{"id": 5}])
+        await buffer.close()
+        return [doc["id"] for batch in store.batches for doc in batch]
+
+    assert asyncio.run(run()) == [1, 5]
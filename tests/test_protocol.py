@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from protocol import (FRAME_HEADER, PROTOCOL_VERSION, encode_message, hello_ack, msgpack,
+                      negotiate_result_encoding, pack_binary_frame, parse_binary_frame)
+
+
+def test_binary_frame_round_trip():
+    data = pack_binary_frame(b"\xff\xd8image", sequence=42, timestamp=1700000000123, fmt="webp")
+    header, payload = parse_binary_frame(data)
+    assert payload == b"\xff\xd8image"
+    assert (header.version, header.format, header.sequence, header.timestamp) == (
+        PROTOCOL_VERSION, "webp", 42, 1700000000123)
+
+
+def test_binary_frame_without_payload_is_rejected():
+    with pytest.raises(ValueError, match="too short"):
+        parse_binary_frame(pack_binary_frame(b"", 1, 0))
+
+
+def test_binary_frame_with_unknown_version_or_format_is_rejected():
+    with pytest.raises(ValueError, match="version"):
+        parse_binary_frame(FRAME_HEADER.pack(PROTOCOL_VERSION + 1, 0, 0, 1, 0) + b"x")
+    with pytest.raises(ValueError, match="format"):
+        parse_binary_frame(FRAME_HEADER.pack(PROTOCOL_VERSION, 99, 0, 1, 0) + b"x")
+
+
+def test_result_encoding_falls_back_to_json():
+    assert negotiate_result_encoding(None) == "json"
+    assert negotiate_result_encoding("cbor") == "json"
+    assert negotiate_result_encoding("msgpack") == ("msgpack" if msgpack is not None else "json")
+
+
+def test_hello_ack_reports_degraded_sessions():
+    assert hello_ack("json")["degraded"] is False
+    ack = hello_ack("json", credits=True, min_frame_interval_ms=1000)
+    assert ack["degraded"] is True
+    assert ack["min_frame_interval_ms"] == 1000
+    assert ack["credits"] is True
+
+
+def test_encode_message():
+    message = {"type": "analysis_result", "results": [{"emotion": "happy"}]}
+    assert json.loads(encode_message(message)) == message
+    if msgpack is not None:
+        assert msgpack.unpackb(encode_message(message, "msgpack"), raw=False) == message
@@ -0,0 +1,80 @@
+import math
+
+import pytest
+
+from recording import Recording, SessionRecorder
+from scheduler import PendingFrame
+
+
+def record(path, frames, metadata=None, max_bytes=0):
+    recorder = SessionRecorder(str(path), metadata or {"session_id": "s"}, max_bytes)
+    for frame in frames:
+        recorder.record(frame)
+    recorder.close()
+    return recorder
+
+
+def read(path):
+    """Metadata and (payload, received_at, sequence, client_timestamp) of every frame, copied out of the mapping"""
+    recording = Recording(str(path))
+    try:
+        frames = [(frame.payload if isinstance(frame.payload, str) else bytes(frame.payload),
+                   frame.received_at, frame.sequence, frame.client_timestamp) for frame in recording]
+        return recording.metadata, frames, recording.duration
+    finally:
+        recording.close()
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "s.scanrec"
+    frames = [
+        PendingFrame(b"\xff\xd8jpeg", sequence=1, client_timestamp=1700000000123, received_at=10.0),
+        PendingFrame("data:image/jpeg;base64,AAAA", sequence=None, client_timestamp=None, received_at=10.5),
+        PendingFrame(b"", sequence=3, client_timestamp=12.25, received_at=11.0),
+    ]
+    recorder = record(path, frames, {"session_id": "s", "settings": {"FRAME_DEDUP": "off"}})
+    assert recorder.stats()["frames"] == 3
+    assert recorder.stats()["bytes"] == path.stat().st_size
+
+    metadata, replayed, duration = read(path)
+    assert metadata == {"session_id": "s", "settings": {"FRAME_DEDUP": "off"}}
+    assert replayed == [
+        (b"\xff\xd8jpeg", 10.0, 1, 1700000000123),
+        ("data:image/jpeg;base64,AAAA", 10.5, None, None),
+        (b"", 11.0, 3, 12.25),
+    ]
+    assert duration == 1.0
+
+
+@pytest.mark.parametrize("sequence, timestamp", [("7", "now"), (1.5, math.inf), (2 ** 64, None), (True, False)])
+def test_client_fields_that_do_not_fit_are_stored_as_missing(tmp_path, sequence, timestamp):
+    path = tmp_path / "s.scanrec"
+    record(path, [PendingFrame(b"x", sequence=sequence, client_timestamp=timestamp)])
+    _, [(_, _, stored_sequence, stored_timestamp)], _ = read(path)
+    assert stored_sequence is None
+    assert stored_timestamp is None or stored_timestamp == timestamp
+
+
+def test_torn_last_record_is_ignored(tmp_path):
+    path = tmp_path / "s.scanrec"
+    record(path, [PendingFrame(b"a" * 100, sequence=i) for i in range(3)])
+    with open(path, "r+b") as f:
+        f.truncate(path.stat().st_size - 10)
+    _, frames, _ = read(path)
+    assert [sequence for _, _, sequence, _ in frames] == [0, 1]
+
+
+def test_frames_past_the_size_cap_are_skipped(tmp_path):
+    path = tmp_path / "s.scanrec"
+    recorder = record(path, [PendingFrame(b"a" * 100) for _ in range(10)], max_bytes=400)
+    assert recorder.stats()["skipped"] > 0
+    assert path.stat().st_size <= 400
+    _, frames, _ = read(path)
+    assert len(frames) == recorder.stats()["frames"]
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "not.scanrec"
+    path.write_bytes(b"JFIF" + b"\0" * 20)
+    with pytest.raises(ValueError):
+        Recording(str(path))
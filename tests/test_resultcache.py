@@ -0,0 +1,155 @@
+import asyncio
+import os
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+import resultcache  # noqa: E402
+from resultcache import IdempotencyConflict, IdempotentResponses, TTLCache, content_key  # noqa: E402
+
+
+def test_content_key_depends_on_bytes_and_params():
+    assert content_key(b"image", 640) == content_key(b"image", 640)
+    assert content_key(b"image", 640) != content_key(b"image", 320)
+    assert content_key(b"image", None) != content_key(b"other", None)
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resultcache.time, "monotonic", lambda: now[0])
+    cache = TTLCache(max_entries=10, ttl=5)
+    cache.put("a", 1)
+    now[0] += 4.9
+    assert cache.get("a") == 1
+    now[0] += 0.1
+    assert cache.get("a") is None
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats()["evicted"] == 1
+
+
+def test_zero_entries_disables_the_cache():
+    cache = TTLCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_retry_gets_the_stored_response():
+    async def run():
+        responses = IdempotentResponses()
+        assert await responses.begin("key", "image") is None
+        responses.finish("key", {"results": [1]})
+        return await responses.begin("key", "image"), responses.stats()
+
+    replay, stats = asyncio.run(run())
+    assert replay == {"results": [1]}
+    assert stats["replayed"] == 1 and stats["inflight"] == 0
+
+
+def test_retry_waits_for_the_original_in_flight():
+    async def run():
+        responses = IdempotentResponses()
+        assert await responses.begin("key", "image") is None
+        retry = asyncio.create_task(responses.begin("key", "image"))
+        await asyncio.sleep(0.01)
+        assert not retry.done()
+        responses.finish("key", {"results": [1]})
+        return await asyncio.wait_for(retry, 1)
+
+    assert asyncio.run(run()) == {"results": [1]}
+
+
+def test_retry_of_a_failed_request_runs_again():
+    async def run():
+        responses = IdempotentResponses()
+        await responses.begin("key", "image")
+        retry = asyncio.create_task(responses.begin("key", "image"))
+        await asyncio.sleep(0)
+        responses.finish("key", None)
+        # The waiting retry now owns the key and has to finish it
+        assert await asyncio.wait_for(retry, 1) is None
+        responses.finish("key", {"results": [2]})
+        return await responses.begin("key", "image")
+
+    assert asyncio.run(run()) == {"results": [2]}
+
+
+def test_key_reused_for_a_different_request_conflicts():
+    async def run():
+        responses = IdempotentResponses()
+        await responses.begin("key", "image")
+        with pytest.raises(IdempotencyConflict):
+            await responses.begin("key", "other image")
+        responses.finish("key", {"results": []})
+        with pytest.raises(IdempotencyConflict):
+            await responses.begin("key", "other image")
+        return responses.stats()["conflicts"]
+
+    assert asyncio.run(run()) == 2
+
+
+@pytest.fixture
+def client(monkeypatch):
+    import server
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(server.LocalHealthAnalyzer, "_detect_multiscale", lambda self, gray: [(10, 10, 50, 50)])
+    with TestClient(server.app) as client:
+        deadline = time.monotonic() + 10
+        while client.get("/api/ready").status_code != 200:
+            assert time.monotonic() < deadline, "analyzer did not warm up"
+            time.sleep(0.02)
+        yield client
+
+
+def jpeg(value: int) -> bytes:
+    return cv2.imencode(".jpg", np.full((120, 160, 3), value, dtype=np.uint8))[1].tobytes()
+
+
+def upload(client, image: bytes, key: str):
+    return client.post("/api/analyze/image", files={"file": ("face.jpg", image, "image/jpeg")},
+                       headers={"Idempotency-Key": key})
+
+
+def test_replayed_response_is_unaffected_by_persistence(client, monkeypatch):
+    import server
+
+    # Like Mongo's insert_many, which adds an _id to every document it is given
+    async def insert_many(readings):
+        for reading in readings:
+            reading["_id"] = object()
+            reading["emotion"] = "changed by the store"
+    monkeypatch.setattr(server.readings_buffer.store, "insert_many", insert_many)
+
+    written = server.readings_buffer.written
+    first = upload(client, jpeg(120), "replay-key")
+    assert first.status_code == 200
+    deadline = time.monotonic() + 5
+    while server.readings_buffer.written == written:
+        assert time.monotonic() < deadline, "readings were not flushed"
+        time.sleep(0.01)
+
+    retry = upload(client, jpeg(120), "replay-key")
+    assert retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+
+
+def test_key_reused_with_a_different_image_is_rejected(client):
+    assert upload(client, jpeg(120), "conflict-key").status_code == 200
+    response = upload(client, jpeg(200), "conflict-key")
+    assert response.status_code == 422
@@ -0,0 +1,61 @@
+import asyncio
+
+from scheduler import LatestFrameScheduler, PendingFrame
+
+
+def test_newest_frame_wins_and_replaced_frames_are_dropped():
+    async def run():
+        scheduler = LatestFrameScheduler()
+        assert scheduler.submit(PendingFrame(b"1", sequence=1)) is False
+        assert scheduler.submit(PendingFrame(b"2", sequence=2)) is True
+        assert scheduler.submit(PendingFrame(b"3", sequence=3)) is True
+        frame = await scheduler.next_frame()
+        assert frame.sequence == 3
+        assert scheduler.stats()["received"] == 3
+        assert scheduler.stats()["dropped"] == 2
+
+    asyncio.run(run())
+
+
+def test_next_frame_waits_for_a_submission():
+    async def run():
+        scheduler = LatestFrameScheduler()
+        waiter = asyncio.create_task(scheduler.next_frame())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        scheduler.submit(PendingFrame("data:image/jpeg;base64,", sequence=7))
+        frame = await asyncio.wait_for(waiter, 1)
+        assert frame.sequence == 7
+
+    asyncio.run(run())
+
+
+def test_close_wakes_the_consumer():
+    async def run():
+        scheduler = LatestFrameScheduler()
+        waiter = asyncio.create_task(scheduler.next_frame())
+        await asyncio.sleep(0)
+        scheduler.close()
+        assert await asyncio.wait_for(waiter, 1) is None
+
+    asyncio.run(run())
+
+
+def test_pending_frame_is_still_delivered_after_close():
+    async def run():
+        scheduler = LatestFrameScheduler()
+        scheduler.submit(PendingFrame(b"last"))
+        scheduler.close()
+        assert (await scheduler.next_frame()).payload == b"last"
+        assert await scheduler.next_frame() is None
+
+    asyncio.run(run())
+
+
+def test_outcome_counters():
+    scheduler = LatestFrameScheduler()
+    scheduler.mark_processed()
+    scheduler.mark_errored()
+    scheduler.mark_shed()
+    stats = scheduler.stats()
+    assert (stats["processed"], stats["errored"], stats["shed"]) == (1, 1, 1)
@@ -0,0 +1,86 @@
+import pytest
+
+from sessions import EMOTION_CODES, EmotionRing, SessionRegistry
+
+
+def test_ring_keeps_the_newest_entries_oldest_first():
+    ring = EmotionRing(3)
+    for emotion in ("happy", "sad", "angry", "fear"):
+        ring.append(emotion)
+    assert len(ring) == 3
+    assert ring.recent(3).tolist() == [EMOTION_CODES[e] for e in ("sad", "angry", "fear")]
+    assert ring.recent(10).tolist() == ring.recent(3).tolist()
+    assert ring.recent(1).tolist() == [EMOTION_CODES["fear"]]
+
+
+def test_unknown_emotions_count_as_neutral():
+    ring = EmotionRing(2)
+    ring.append("bored")
+    assert ring.recent(1).tolist() == [EMOTION_CODES["neutral"]]
+
+
+def test_ring_bytes_round_trip():
+    ring = EmotionRing(4)
+    for emotion in ("happy", "sad", "angry", "fear", "surprise"):
+        ring.append(emotion)
+    copy = EmotionRing(4)
+    copy.load_bytes(ring.to_bytes())
+    assert copy.recent(4).tolist() == ring.recent(4).tolist()
+    copy.append("disgust")
+    assert copy.recent(2).tolist() == [EMOTION_CODES["surprise"], EMOTION_CODES["disgust"]]
+
+
+def test_smaller_ring_keeps_the_newest_loaded_entries():
+    ring = EmotionRing(5)
+    for emotion in ("happy", "sad", "angry"):
+        ring.append(emotion)
+    small = EmotionRing(2)
+    small.load_bytes(ring.to_bytes())
+    assert small.recent(2).tolist() == [EMOTION_CODES["sad"], EMOTION_CODES["angry"]]
+
+
+def test_ring_needs_capacity():
+    with pytest.raises(ValueError):
+        EmotionRing(0)
+    with pytest.raises(ValueError):
+        SessionRegistry(history_size=0)
+
+
+def test_least_recently_used_session_is_evicted_at_the_limit():
+    registry = SessionRegistry(max_sessions=2)
+    a = registry.create("a")
+    registry.create("b")
+    registry.get(a.session_id)
+    registry.create("c")
+    assert registry.get("b") is None
+    assert registry.get("a") is a and registry.get("c") is not None
+    assert registry.stats()["evicted"] == 1
+
+
+def test_idle_sessions_are_evicted():
+    registry = SessionRegistry(idle_timeout=60)
+    session = registry.create("idle")
+    registry.evict_idle(now=session.last_seen + 61)
+    assert registry.get("idle") is None
+
+
+def test_pinned_sessions_survive_eviction_until_removed():
+    registry = SessionRegistry(max_sessions=2, idle_timeout=60)
+    scan = registry.create("scan", pinned=True)
+    registry.create("upload-1")
+    registry.create("upload-2")
+    registry.evict_idle(now=scan.last_seen + 3600)
+    assert registry.get("scan") is scan
+    assert registry.is_pinned("scan")
+    assert registry.get("upload-1") is None
+    registry.remove("scan")
+    assert registry.get("scan") is None
+    assert len(registry) == 0
+
+
+def test_going_over_the_limit_with_pinned_sessions_is_counted():
+    registry = SessionRegistry(max_sessions=1)
+    registry.create("scan-1", pinned=True)
+    registry.create("scan-2", pinned=True)
+    stats = registry.stats()
+    assert (stats["active"], stats["pinned"], stats["over_capacity"]) == (2, 2, 1)
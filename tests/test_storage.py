@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from storage import MemoryHealthStore, SqliteHealthStore
+
+# Timestamps repeat so pages have to break ties on id
+READINGS = [{"id": f"r{i:02d}", "timestamp": 1000.0 + i // 3, "stress_level": i / 100} for i in range(20)]
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryHealthStore()
+    return SqliteHealthStore(str(tmp_path / "health.db"))
+
+
+def run_with(store, scenario):
+    async def run():
+        await store.start()
+        await store.ensure_indexes()
+        try:
+            # Out of order, so stores can't rely on arrival order
+            await store.insert_many(READINGS[10:])
+            await store.insert_many(READINGS[:10])
+            return await scenario()
+        finally:
+            await store.close()
+
+    return asyncio.run(run())
+
+
+async def collect(iterator):
+    return [reading async for reading in iterator]
+
+
+async def paginate(store, page_size, **query):
+    """Walk a query page by page with keyset cursors, like the readings endpoints"""
+    pages, cursor = [], None
+    while True:
+        page = await collect(store.find(cursor=cursor, limit=page_size, **query))
+        if not page:
+            return pages
+        pages.append([reading["id"] for reading in page])
+        cursor = (page[-1]["timestamp"], page[-1]["id"])
+
+
+def test_find_orders_on_timestamp_then_id(store):
+    readings = run_with(store, lambda: collect(store.find(batch_size=4)))
+    assert [reading["id"] for reading in readings] == [reading["id"] for reading in READINGS]
+    assert readings[5] == READINGS[5]
+
+
+def test_ascending_pages_cover_every_reading_once(store):
+    pages = run_with(store, lambda: paginate(store, 7, batch_size=3))
+    assert [len(page) for page in pages] == [7, 7, 6]
+    assert sum(pages, []) == [reading["id"] for reading in READINGS]
+
+
+def test_descending_pages_cover_every_reading_once(store):
+    pages = run_with(store, lambda: paginate(store, 6, descending=True))
+    assert sum(pages, []) == [reading["id"] for reading in reversed(READINGS)]
+
+
+def test_pages_stay_inside_the_time_range(store):
+    pages = run_with(store, lambda: paginate(store, 2, start=1001.0, end=1003.0))
+    # Timestamps 1001 and 1002 are readings 3 to 8
+    assert sum(pages, []) == [f"r{i:02d}" for i in range(3, 9)]
+
+
+def test_cursor_inside_a_tie_resumes_after_it(store):
+    async def scenario():
+        return await collect(store.find(cursor=(1001.0, "r04"), limit=3))
+
+    assert [reading["id"] for reading in run_with(store, scenario)] == ["r05", "r06", "r07"]
+
+
+def test_fields_restricts_the_returned_fields(store):
+    readings = run_with(store, lambda: collect(store.find(limit=2, fields=["id", "stress_level"])))
+    assert readings == [{"id": "r00", "stress_level": 0.0}, {"id": "r01", "stress_level": 0.01}]
+
+
+def test_memory_store_evicts_the_oldest_readings():
+    store = MemoryHealthStore(capacity=5)
+    readings = run_with(store, lambda: collect(store.find()))
+    assert [reading["id"] for reading in readings] == [f"r{i:02d}" for i in range(15, 20)]
+    assert store.stats()["evicted"] == 15
+
+
+def test_memory_store_queries_only_see_live_readings_across_compaction():
+    async def run():
+        store = MemoryHealthStore(capacity=4)
+        await store.start()
+        seen = []
+        # Flushes of three readings: evictions move the live range, and every few flushes the lists are compacted
+        for flush in range(7):
+            batch = [{"id": f"f{flush}-{i}", "timestamp": float(flush * 3 + i),
+                      "stress_level": 1.0} for i in range(3)]
+            await store.insert_many(batch)
+            seen.extend(batch)
+            live = [reading["id"] for reading in seen[-4:]]
+            assert [r["id"] async for r in store.find()] == live
+            assert [r["id"] async for r in store.find(descending=True, limit=2)] == live[::-1][:2]
+            assert sum(count for _, count, _ in await store.aggregate(100, 0, 100)) == len(live)
+            assert len(store) == len(live)
+        # An old reading that arrives late is evicted straight away
+        await store.insert_many([{"id": "late", "timestamp": 0.5}])
+        return [r["id"] async for r in store.find()], store.stats()
+
+    ids, stats = asyncio.run(run())
+    assert ids == ["f5-2", "f6-0", "f6-1", "f6-2"]
+    assert stats["readings"] == 4
+    assert stats["evicted"] == 7 * 3 + 1 - 4